@@ -1,9 +1,19 @@
 """暴露给前端的 PyWebView API"""
 
+import functools
+import json
+import os
 import subprocess
 import traceback
 import config_manager as cm
 import env_manager as ev
+import profile_sync
+from clients import is_own_write
+from file_watcher import FileWatcher
+from jobs import JobManager
+from model_catalog import cache_key, catalog, normalize_url
+from profiler import profiler
+from usage_index import UNATTRIBUTED, indexer as usage_indexer
 
 
 # 最低版本要求（根据官方文档和已知问题设定）
@@ -63,10 +73,10 @@ def _check_version(command: str, min_version: str) -> tuple[bool, str, str]:
         return False, "检测失败", str(e)
 
 
-def _safe_call(func, *args, error_return=None):
-    """包装调用，捕获异常返回友好提示而不是原始 traceback"""
+def _safe_call(func, *args, error_return=None, **kwargs):
+    """包装调用，捕获异常返回友好提示而不是原始 traceback；性能采样模式下同时记录 profile"""
     try:
-        return func(*args)
+        return profiler.call(func, *args, **kwargs)
     except Exception as e:
         traceback.print_exc()  # 服务端日志保留完整堆栈
         if error_return == "dict":
@@ -77,9 +87,69 @@ def _safe_call(func, *args, error_return=None):
 class Api:
     """PyWebView API — 前端通过 window.pywebview.api.xxx() 调用"""
 
+    def __init__(self):
+        # 下划线属性不会暴露给前端
+        self._window = None
+        self._watcher = None
+        self._vendor_digests: dict[str, str] = {}
+        self._jobs = JobManager()
+        # list_models 的后台刷新：同一端点未完成时不重复排队，不占用用户发起的任务的线程
+        self._model_refreshes = JobManager()
+        if os.environ.get("CODEPIVOT_PROFILE", "").lower() in ("1", "true", "yes", "on") or (
+            cm.get_settings().get("profile", False)
+        ):
+            profiler.set_enabled(True)
+
+    def _attach_window(self, window) -> None:
+        """窗口启动后调用：开始监听客户端配置文件与 config.json，变更时推送给前端"""
+        self._window = window
+        self._vendor_digests = cm.vendor_digests()
+        self._watcher = FileWatcher(cm.watched_paths(), self._on_files_changed)
+        self._watcher.start()
+        _safe_call(cm.prestage_vendors, cm.VENDOR_META)
+
+    def _on_files_changed(self, changed: set) -> None:
+        """文件监听回调：计算受影响的厂家并推送 configFilesChanged 事件（本应用自己的写入不推送）"""
+        watched = cm.watched_paths()
+        vendors = set()
+        for path in changed:
+            if is_own_write(path):
+                if path == cm.CONFIG_PATH:
+                    # 基线跟上自身的保存，之后的外部修改只推送真正被改动的厂家
+                    self._vendor_digests = cm.vendor_digests()
+                continue
+            if path == cm.CONFIG_PATH:
+                # config.json 变化时只推送配置段真正改变的厂家
+                digests = cm.vendor_digests()
+                vendors.update(
+                    vk for vk, d in digests.items() if self._vendor_digests.get(vk) != d
+                )
+                self._vendor_digests = digests
+            else:
+                vendors.update(watched.get(path, ()))
+        if not vendors:
+            return
+        # 客户端文件被外部修改后，已预生成的切换产物失效，重新生成
+        _safe_call(cm.prestage_vendors, vendors)
+        if not self._window:
+            return
+        event = {
+            "vendors": sorted(vendors),
+            "files": sorted(str(p) for p in changed),
+        }
+        try:
+            self._window.evaluate_js(
+                f"window.onConfigFilesChanged && window.onConfigFilesChanged({json.dumps(event)})"
+            )
+        except Exception:
+            traceback.print_exc()
+
     def get_vendors(self) -> dict:
         return _safe_call(cm.get_vendors)
 
+    def get_vendor(self, vendor: str) -> dict | None:
+        return _safe_call(cm.get_vendor, vendor)
+
     def save_vendor_config(self, vendor: str, config_data: dict) -> dict:
         return _safe_call(cm.save_vendor_config, vendor, config_data)
 
@@ -88,17 +158,30 @@ class Api:
 
     def switch_vendor_config(self, vendor: str, config_id: str) -> dict:
         """切换配置并同时部署到环境变量"""
+        return self._switch_impl(vendor, config_id)
+
+    def _switch_impl(
+        self, vendor: str, config_id: str, progress=None, cancelled=None
+    ) -> dict:
+        """切换的实际实现，同步调用与后台任务共用"""
         # 1. 先切换配置文件
         result = _safe_call(
-            cm.switch_vendor_config, vendor, config_id, error_return="dict"
+            cm.switch_vendor_config,
+            vendor,
+            config_id,
+            progress=progress,
+            cancelled=cancelled,
+            error_return="dict",
         )
 
-        # 2. 如果配置文件切换成功，同时部署到环境变量
-        if result.get("success"):
+        # 2. 如果配置文件切换成功，同时部署到环境变量（已取消则跳过）
+        if result.get("success") and not (cancelled and cancelled()):
             try:
                 cfg = cm.get_current_config(vendor)
                 if cfg and cfg.get("id") == config_id:
-                    env_result = ev.deploy_to_env_vars(vendor, cfg)
+                    env_result = ev.deploy_to_env_vars(
+                        vendor, cfg, progress=progress, cancelled=cancelled
+                    )
                     result["env_deploy"] = env_result
             except Exception as e:
                 # 环境变量部署失败不影响配置文件切换的成功状态
@@ -107,20 +190,55 @@ class Api:
                     "message": f"环境变量部署失败: {e}",
                     "set_vars": [],
                     "failed_vars": [],
+                    "unchanged_vars": [],
                 }
 
         return result
 
+    def search_configs(self, query: str, limit: int = 20, vendor: str | None = None) -> list:
+        """搜索配置（前缀/模糊匹配，按相关度排序），结果不含 api_key"""
+        return _safe_call(cm.search_configs, query, limit, vendor)
+
     def detect_clients(self) -> dict:
         return _safe_call(cm.detect_clients)
 
+    def set_write_behind(self, enabled: bool, interval: float | None = None) -> dict:
+        """开关 config.json 延迟合并写入（频繁保存时合并为每个间隔一次写盘）"""
+        return _safe_call(cm.set_write_behind, enabled, interval)
+
+    def set_prestage(self, enabled: bool) -> dict:
+        """开关切换产物预生成"""
+        return _safe_call(cm.set_prestage, enabled)
+
+    def prestage_stats(self) -> dict:
+        """预生成产物数量与命中统计"""
+        return _safe_call(cm.prestage_stats)
+
+    def set_profiling(self, enabled: bool) -> dict:
+        """开关性能采样模式（cProfile + tracemalloc，输出到 ~/.ai-switcher/profiles）"""
+        return profiler.set_enabled(enabled)
+
+    def profiling_summary(self) -> dict:
+        """最慢调用与内存峰值最大调用的滚动汇总"""
+        return profiler.summary()
+
+    def lock_stats(self) -> dict:
+        """config.json 跨进程读写锁的等待时间与持有者"""
+        return _safe_call(cm.lock_stats)
+
+    def live_configs(self) -> dict:
+        """各客户端实际生效的配置及是否被外部改动（漂移）"""
+        return _safe_call(cm.live_config_report)
+
     def deploy_to_env_vars(self, vendor: str, config_id: str) -> dict:
         """将配置部署到系统环境变量"""
         return _safe_call(
             self._deploy_to_env_vars_impl, vendor, config_id, error_return="dict"
         )
 
-    def _deploy_to_env_vars_impl(self, vendor: str, config_id: str) -> dict:
+    def _deploy_to_env_vars_impl(
+        self, vendor: str, config_id: str, progress=None, cancelled=None
+    ) -> dict:
         """部署环境变量的实际实现"""
         cfg = cm.get_current_config(vendor)
         if not cfg or cfg.get("id") != config_id:
@@ -129,8 +247,11 @@ class Api:
                 "message": "请先切换到此配置",
                 "set_vars": [],
                 "failed_vars": [],
+                "unchanged_vars": [],
             }
-        return ev.deploy_to_env_vars(vendor, cfg)
+        return ev.deploy_to_env_vars(
+            vendor, cfg, progress=progress, cancelled=cancelled
+        )
 
     def env_vars_status(self, vendor: str) -> dict:
         """获取环境变量状态"""
@@ -140,8 +261,117 @@ class Api:
         """清除环境变量"""
         return _safe_call(ev.remove_env_vars, vendor, error_return="dict")
 
+    def refresh_env_state(self) -> None:
+        """丢弃环境变量快照并重新读取（在其他程序中修改过环境变量后调用）"""
+        _safe_call(ev.refresh_env_state)
+
+    def list_models(self, vendor: str, api_url: str, api_key: str) -> dict:
+        """
+        立即返回缓存的模型列表；缓存过期时在后台刷新，完成后推送 onModelsUpdated 事件
+
+        Returns:
+            dict: {"models", "fetched_at", "stale", "error", "refreshing"}
+        """
+        try:
+            result = catalog.cached(vendor, api_url, api_key)
+        except Exception as e:
+            # 读取缓存失败不影响编辑：返回空列表，模型字段仍可手动填写
+            traceback.print_exc()
+            return {"models": [], "fetched_at": None, "stale": False, "error": str(e), "refreshing": False}
+        result["refreshing"] = False
+        if result["stale"]:
+            try:
+                self._model_refreshes.submit(
+                    "refresh_model",
+                    cache_key(vendor, api_url, api_key),
+                    self._refresh_models_async,
+                    vendor,
+                    api_url,
+                    api_key,
+                )
+                result["refreshing"] = True
+            except RuntimeError:
+                # 刷新队列已满：返回缓存，下次调用再刷新
+                pass
+        return result
+
+    def _refresh_models_async(
+        self, vendor: str, api_url: str, api_key: str, progress=None, cancelled=None
+    ) -> None:
+        try:
+            result = catalog.fetch(vendor, api_url, api_key)
+        except Exception:
+            traceback.print_exc()
+            return
+        if not self._window:
+            return
+        event = {"vendor": vendor, "api_url": normalize_url(api_url), **result}
+        try:
+            self._window.evaluate_js(
+                f"window.onModelsUpdated && window.onModelsUpdated({json.dumps(event, ensure_ascii=False)})"
+            )
+        except Exception:
+            traceback.print_exc()
+
+    def _refresh_models_impl(self, force: bool = True, progress=None, cancelled=None) -> dict:
+        """并发刷新所有已保存配置的模型列表（后台任务 refresh_models）"""
+        targets = [
+            (vk, c.get("api_url", ""), c.get("api_key", ""))
+            for vk, v in cm.get_vendors().items()
+            for c in v["configs"]
+        ]
+        results = catalog.fetch_many(targets, force=force, progress=progress)
+        return {
+            "endpoints": len(results),
+            "models": sum(len(r["models"]) for r in results.values()),
+            "errors": sorted({r["error"] for r in results.values() if r["error"]}),
+        }
+
+    def usage_totals(self, vendor: str | None = None) -> dict:
+        """
+        各配置的累计 token 用量（读取已保存的索引，不扫描日志；刷新用后台任务 index_usage）
+
+        Returns:
+            dict: {"updated_at", "vendors": {vendor: [{config_id, name, input, output, ...}]}}
+        """
+        return _safe_call(self._usage_totals_impl, vendor)
+
+    def _usage_totals_impl(self, vendor: str | None = None) -> dict:
+        totals = usage_indexer.totals(vendor)
+        vendors = cm.get_vendors()
+        result = {}
+        for vk, by_config in totals.items():
+            names = {c["id"]: c.get("name", "") for c in vendors.get(vk, {}).get("configs", [])}
+            result[vk] = sorted(
+                (
+                    {"config_id": cid, "name": names.get(cid, ""), "deleted": cid not in names and cid != UNATTRIBUTED, **counts}
+                    for cid, counts in by_config.items()
+                ),
+                key=lambda r: -(r["input"] + r["output"] + r["cache_read"] + r["cache_write"]),
+            )
+        return {"updated_at": usage_indexer.updated_at(), "vendors": result}
+
+    def _index_usage_impl(self, progress=None, cancelled=None) -> dict:
+        """增量读取客户端会话日志（后台任务 index_usage）"""
+        return usage_indexer.update(progress=progress, cancelled=cancelled)
+
+    def sync_profiles(self, directory: str | None = None) -> dict:
+        """与共享目录同步配置；拉取到的改动经 config.json 监听推送给前端"""
+        return _safe_call(self._sync_profiles_impl, directory)
+
+    def _sync_profiles_impl(self, directory: str | None = None, progress=None, cancelled=None) -> dict:
+        """同步的实际实现（后台任务 sync_profiles）；未指定目录时使用 settings.sync_dir"""
+        directory = directory or cm.get_settings().get("sync_dir")
+        if not directory:
+            raise ValueError("未指定同步目录（可在 config.json 的 settings.sync_dir 中设置）")
+        return profile_sync.sync(directory, progress=progress, cancelled=cancelled)
+
     def check_vendor_versions(self) -> dict:
         """检测各厂商 CLI 版本兼容性（并行执行）"""
+        return self._check_versions_impl()
+
+    def _check_versions_impl(self, progress=None, cancelled=None) -> dict:
+        """版本检测的实际实现，每完成一个厂商上报一次进度"""
         from concurrent.futures import ThreadPoolExecutor, as_completed
 
         results = {}
@@ -153,7 +383,8 @@ class Api:
         ]
 
         # 使用线程池并行检测版本，避免顺序执行阻塞
-        with ThreadPoolExecutor(max_workers=4) as executor:
+        executor = ThreadPoolExecutor(max_workers=4)
+        try:
             future_to_vendor = {
                 executor.submit(_check_version, cmd, MIN_VERSIONS[vendor]): vendor
                 for vendor, cmd in vendors
@@ -165,9 +396,83 @@ class Api:
                     results[vendor] = future.result()
                 except Exception as e:
                     results[vendor] = (False, "检测失败", str(e))
+                if progress:
+                    progress({"stage": "version", "vendor": vendor, "status": "done"})
+                if cancelled and cancelled():
+                    break
+        finally:
+            # 取消时不等待仍在运行的检测进程
+            executor.shutdown(wait=not (cancelled and cancelled()), cancel_futures=True)
 
         return results
 
     def get_min_versions(self) -> dict:
         """获取推荐的最低版本要求"""
         return MIN_VERSIONS
+
+    # ── 后台任务 ──────────────────────────
+
+    # 可作为后台任务启动的操作 → 实现方法（需接受 progress/cancelled 关键字参数）
+    _JOB_KINDS = {
+        "switch": "_switch_impl",
+        "deploy_env": "_deploy_to_env_vars_impl",
+        "check_versions": "_check_versions_impl",
+        "refresh_models": "_refresh_models_impl",
+        "index_usage": "_index_usage_impl",
+        "sync_profiles": "_sync_profiles_impl",
+    }
+
+    def start_job(self, kind: str, args: list | None = None) -> dict:
+        """
+        在后台启动长耗时操作，立即返回任务 id
+
+        参数完全相同的任务仍在运行时不会重复排队，而是返回已有任务（joined=True）。
+        """
+        return _safe_call(self._start_job_impl, kind, args or [])
+
+    def _start_job_impl(self, kind: str, args: list) -> dict:
+        impl = self._JOB_KINDS.get(kind)
+        if not impl:
+            raise ValueError(f"未知任务类型: {kind}")
+        key = f"{kind}:{json.dumps(args, ensure_ascii=False)}"
+        # 后台任务同样纳入性能采样
+        func = functools.partial(profiler.call, getattr(self, impl))
+        job, joined = self._jobs.submit(kind, key, func, *args)
+        return {"job_id": job.id, "joined": joined}
+
+    def job_status(self, job_id: str, since: int = 0) -> dict | None:
+        """任务状态及 since 之后的新进度事件"""
+        job = self._jobs.get(job_id)
+        return job.snapshot(since) if job else None
+
+    def cancel_job(self, job_id: str) -> bool:
+        """请求取消任务，任务在下一个安全点停止"""
+        return self._jobs.cancel(job_id)
+
+    def batch(self, calls: list) -> list:
+        """
+        批量执行多个 API 调用，减少前端桥接往返次数
+
+        Args:
+            calls: [{"method": "get_vendors", "args": [...]}, ...]，按顺序执行
+
+        Returns:
+            list: 与 calls 一一对应的 {"ok": bool, "result": ..., "error": str}
+        """
+        results = []
+        # 同一批次共享一份配置快照，批次内的写入对后续调用可见
+        with cm.snapshot():
+            for call in calls or []:
+                if not isinstance(call, dict):
+                    call = {}
+                method = call.get("method") or ""
+                args = call.get("args") or []
+                func = getattr(self, method, None)
+                if method.startswith("_") or method == "batch" or not callable(func):
+                    results.append({"ok": False, "error": f"未知方法: {method}"})
+                    continue
+                try:
+                    results.append({"ok": True, "result": func(*args)})
+                except Exception as e:
+                    results.append({"ok": False, "error": str(e)})
+        return results
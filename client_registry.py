@@ -0,0 +1,197 @@
+"""
+客户端注册表 — 按清单登记客户端，切换或检测到对应厂家时才导入并实例化
+
+登记项统一为 "厂家.客户端标识" → "模块:类名"，来源依次为：
+    1. 内置清单 BUILTIN_CLIENTS
+    2. 用户清单 ~/.ai-switcher/clients.json（同样的键值格式；值也可以写成
+       {"class": "模块:类名", "config_paths": ["~/.cursor/settings.json"]}，声明需要监听的文件）
+    3. 已安装包的 entry points，组名 codepivot.clients，例如
+           [project.entry-points."codepivot.clients"]
+           claude.cursor = "codepivot_cursor:CursorClient"
+
+新增客户端不再需要修改 clients.py / config_manager.py；
+外部来源在第一次需要客户端列表时才扫描，import 本模块本身几乎没有开销。
+"""
+
+import importlib
+import json
+import threading
+from pathlib import Path
+
+ENTRY_POINT_GROUP = "codepivot.clients"
+USER_MANIFEST = Path.home() / ".ai-switcher" / "clients.json"
+
+BUILTIN_CLIENTS = {
+    "claude.claude_cli": "clients:ClaudeCliClient",
+    "claude.vscode": "clients:VSCodePluginClient",
+    "codex.codex": "clients:CodexClient",
+    "gemini.gemini": "clients:GeminiClient",
+    "opencode.opencode": "clients:OpenCodeClient",
+}
+
+
+class ClientRegistry:
+    """客户端标识 → 惰性实例；同一标识只实例化一次"""
+
+    def __init__(self, builtin: dict[str, str] | None = None):
+        self._builtin = dict(BUILTIN_CLIENTS if builtin is None else builtin)
+        self._specs: dict[str, tuple[str, object]] | None = None  # key → (厂家, "模块:类名" 或 EntryPoint)
+        self._declared: dict[str, list[str]] = {}  # 清单中声明的配置文件路径
+        self._instances: dict[str, object] = {}
+        self._lock = threading.RLock()
+
+    def keys_for(self, vendor: str) -> list[str]:
+        """某厂家的客户端标识（按登记顺序，不导入客户端模块）"""
+        return [key for key, (vk, _) in self._discover().items() if vk == vendor]
+
+    def keys(self) -> list[str]:
+        return list(self._discover())
+
+    def get(self, key: str):
+        """返回客户端实例，首次访问时才导入其模块；未登记或加载失败返回 None"""
+        instance = self._instances.get(key)
+        if instance is not None:
+            return instance
+        with self._lock:
+            if key in self._instances:
+                return self._instances[key]
+            spec = self._discover().get(key)
+            if spec is None:
+                return None
+            try:
+                instance = self._load(spec[1])()
+            except Exception as e:
+                print(f"[警告] 加载客户端 {key} 失败: {e}")
+                return None
+            self._instances[key] = instance
+            return instance
+
+    def create(self, key: str, **kwargs):
+        """新建一个独立实例（例如指向其他主目录），不进入缓存；未登记时抛出 KeyError"""
+        spec = self._discover().get(key)
+        if spec is None:
+            raise KeyError(f"未登记的客户端: {key}")
+        return self._load(spec[1])(**kwargs)
+
+    def config_paths(self, key: str) -> list[Path]:
+        """
+        客户端的配置文件路径（用于文件监听），不会为此导入插件
+
+        内置或已实例化的客户端直接取其 config_paths；其余插件取清单中声明的路径，未声明时为空。
+        """
+        spec = self._discover().get(key)
+        if spec is None:
+            return []
+        declared = self._declared.get(key)
+        if declared is not None:
+            return [Path(p).expanduser() for p in declared]
+        if key in self._instances or spec[1] == self._builtin.get(f"{spec[0]}.{key}"):
+            client = self.get(key)
+            return list(client.config_paths) if client else []
+        return []
+
+    def items(self):
+        """所有可加载的 (标识, 实例)，会导入全部客户端"""
+        for key in self.keys():
+            client = self.get(key)
+            if client is not None:
+                yield key, client
+
+    def loaded(self) -> list[str]:
+        """已实例化的客户端标识（用于确认惰性加载是否生效）"""
+        return list(self._instances)
+
+    def register(self, name: str, target, config_paths: list[str] | None = None) -> None:
+        """运行时登记客户端，name 为 "厂家.标识"，target 为 "模块:类名" 或类"""
+        vendor, key = _split_name(name)
+        with self._lock:
+            self._discover()[key] = (vendor, target)
+            self._instances.pop(key, None)
+            self._set_declared(key, config_paths)
+
+    # ── 内部 ──────────────────────────────
+
+    def _discover(self) -> dict[str, tuple[str, object]]:
+        if self._specs is not None:
+            return self._specs
+        with self._lock:
+            if self._specs is None:
+                specs: dict[str, tuple[str, object]] = {}
+                sources = [
+                    [(name, target, None) for name, target in self._builtin.items()],
+                    _read_manifest(),
+                    [(name, ep, None) for name, ep in _entry_points()],
+                ]
+                for source in sources:
+                    for name, target, paths in source:
+                        try:
+                            vendor, key = _split_name(name)
+                        except ValueError as e:
+                            print(f"[警告] {e}")
+                            continue
+                        # 同名时后登记的覆盖先登记的，便于插件替换内置实现
+                        specs[key] = (vendor, target)
+                        self._set_declared(key, paths)
+                self._specs = specs
+        return self._specs
+
+    def _set_declared(self, key: str, paths: list[str] | None) -> None:
+        if paths is None:
+            self._declared.pop(key, None)
+        else:
+            self._declared[key] = list(paths)
+
+    @staticmethod
+    def _load(target):
+        if isinstance(target, type):
+            return target
+        if hasattr(target, "load"):  # importlib.metadata.EntryPoint
+            return target.load()
+        module_name, _, attr = str(target).partition(":")
+        return getattr(importlib.import_module(module_name), attr)
+
+
+def _split_name(name: str) -> tuple[str, str]:
+    vendor, sep, key = name.partition(".")
+    if not sep or not vendor or not key:
+        raise ValueError(f"客户端登记名应为 厂家.标识: {name}")
+    return vendor, key
+
+
+def _read_manifest() -> list[tuple[str, str, list[str] | None]]:
+    """用户清单 → [(登记名, "模块:类名", 声明的配置文件路径或 None)]"""
+    try:
+        data = json.loads(USER_MANIFEST.read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return []
+    except (OSError, ValueError) as e:
+        print(f"[警告] 读取客户端清单失败: {e}")
+        return []
+    if not isinstance(data, dict):
+        return []
+    entries = []
+    for name, value in data.items():
+        if isinstance(value, str):
+            entries.append((name, value, None))
+        elif isinstance(value, dict) and isinstance(value.get("class"), str):
+            paths = value.get("config_paths")
+            if paths is not None and not (
+                isinstance(paths, list) and all(isinstance(p, str) for p in paths)
+            ):
+                print(f"[警告] 客户端 {name} 的 config_paths 应为字符串列表，已忽略")
+                paths = None
+            entries.append((name, value["class"], paths))
+    return entries
+
+
+def _entry_points() -> list[tuple[str, object]]:
+    try:
+        from importlib.metadata import entry_points
+
+        return [(ep.name, ep) for ep in entry_points(group=ENTRY_POINT_GROUP)]
+    except Exception as e:
+        print(f"[警告] 扫描客户端插件失败: {e}")
+        return []
+
+
+registry = ClientRegistry()
@@ -8,6 +8,10 @@ from abc import ABC, abstractmethod
 from datetime import datetime
 from pathlib import Path
 
+from config_models import CodexConfig, OpenCodeConfig, VendorConfig
+from jsonc_editor import get_member, set_member
+from toml_editor import TomlEditor, parse_string, toml_string
+
 # 备份根目录
 BACKUP_DIR = Path.home() / ".ai-switcher" / "backups"
 MAX_BACKUPS = 10
@@ -38,13 +42,55 @@ def _atomic_write_text(path: Path, content: str) -> None:
         raise
 
 
+# 本进程最后一次写入各文件后的签名 (inode, 大小, mtime)，文件监听据此区分自身写入与外部修改
+_own_writes: dict[Path, tuple | None] = {}
+
+
+def _file_signature(path: Path) -> tuple | None:
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+def _record_own_write(path: Path) -> None:
+    """记录本进程刚写入（或删除）的被监听文件"""
+    _own_writes[Path(path)] = _file_signature(path)
+
+
+def is_own_write(path: Path) -> bool:
+    """文件当前状态是否正是本进程最后一次写入的结果（之后被外部改动过则签名不同）"""
+    path = Path(path)
+    return path in _own_writes and _own_writes[path] == _file_signature(path)
+
+
+def _dump_json(data: dict) -> str:
+    return json.dumps(data, indent=2, ensure_ascii=False)
+
+
 def _atomic_write_json(path: Path, data: dict) -> None:
     """原子写入 JSON 文件"""
-    _atomic_write_text(path, json.dumps(data, indent=2, ensure_ascii=False))
+    _atomic_write_text(path, _dump_json(data))
 
 
 class ClientBase(ABC):
-    """客户端配置写入基类"""
+    """
+    客户端配置写入基类
+
+    Args:
+        home: 用户主目录，默认为当前用户；批量部署到多个用户目录时传入目标目录
+    """
+
+    def __init__(self, home: Path | str | None = None):
+        self.home = Path(home) if home is not None else Path.home()
+
+    @property
+    def backup_dir(self) -> Path:
+        """备份目录：当前用户用全局 BACKUP_DIR，其他主目录备份到各自目录下"""
+        if self.home == Path.home():
+            return BACKUP_DIR
+        return self.home / ".ai-switcher" / "backups"
 
     @property
     @abstractmethod
@@ -58,13 +104,13 @@ class ClientBase(ABC):
 
     def backup(self) -> list[str]:
         """备份当前配置文件，返回备份路径列表"""
-        BACKUP_DIR.mkdir(parents=True, exist_ok=True)
+        self.backup_dir.mkdir(parents=True, exist_ok=True)
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         backed_up = []
         for path in self.config_paths:
             if path.exists():
                 backup_name = f"{self.display_name}_{path.stem}_{timestamp}{path.suffix}"
-                backup_path = BACKUP_DIR / backup_name
+                backup_path = self.backup_dir / backup_name
                 shutil.copy2(path, backup_path)
                 backed_up.append(str(backup_path))
         self._cleanup_old_backups()
@@ -72,29 +118,101 @@ class ClientBase(ABC):
 
     def _cleanup_old_backups(self):
         """保留最近 MAX_BACKUPS 份备份"""
-        if not BACKUP_DIR.exists():
+        if not self.backup_dir.exists():
             return
         backups = sorted(
-            BACKUP_DIR.glob(f"{self.display_name}_*"),
+            self.backup_dir.glob(f"{self.display_name}_*"),
             key=lambda p: p.stat().st_mtime,
             reverse=True,
         )
         for old in backups[MAX_BACKUPS:]:
             old.unlink(missing_ok=True)
 
+    def build_data(self, config: VendorConfig) -> dict:
+        """
+        把厂家下保存的配置转换为 apply() 需要的数据，字段不同的客户端覆盖此方法
+
+        config 是已补齐默认值的配置模型（见 config_models），直接读取属性即可。
+        """
+        return {
+            "api_url": config.api_url,
+            "api_key": config.api_key,
+            "model": config.model,
+        }
+
     @abstractmethod
+    def render(self, profile_data: dict) -> dict[Path, str]:
+        """
+        基于现有文件内容合并出写入后的完整内容，不写盘
+
+        Returns:
+            dict: 目标路径 → 新内容（按写入顺序）
+        """
+
     def apply(self, profile_data: dict) -> None:
         """应用配置"""
+        self.write(self.render(profile_data))
+
+    def write(self, rendered: dict[Path, str]) -> None:
+        """按顺序原子写入各文件（内容未变的跳过），中途失败时恢复已写入的文件"""
+        written: list[tuple[Path, bytes | None]] = []
+        try:
+            for path, content in rendered.items():
+                old = path.read_bytes() if path.exists() else None
+                if old is not None and old.decode("utf-8", errors="replace") == content:
+                    continue
+                _atomic_write_text(path, content)
+                _record_own_write(path)
+                written.append((path, old))
+        except Exception:
+            for path, old in reversed(written):
+                if old is not None:
+                    _atomic_write_text(path, old.decode("utf-8"))
+                elif path.exists():
+                    path.unlink()
+                _record_own_write(path)
+            raise
 
     @abstractmethod
     def detect(self) -> bool:
         """检测客户端是否安装（配置目录是否存在）"""
 
+    def read_live(self) -> list[dict]:
+        """
+        读取客户端当前实际生效的连接参数（按 config_paths 的 mtime 缓存）
+
+        Returns:
+            list: 候选 [{"api_url", "api_key", "model"}]，文件缺失或无法解析时为空
+        """
+        signature = []
+        for path in self.config_paths:
+            try:
+                st = path.stat()
+                signature.append((st.st_mtime_ns, st.st_size))
+            except OSError:
+                signature.append(None)
+        signature = tuple(signature)
+        cached = getattr(self, "_live_cache", None)
+        if cached and cached[0] == signature:
+            return cached[1]
+        try:
+            live = self._extract_live()
+        except (OSError, ValueError, UnicodeDecodeError, AttributeError, TypeError):
+            live = []
+        self._live_cache = (signature, live)
+        return live
+
+    def _extract_live(self) -> list[dict]:
+        """从配置文件中提取连接参数，子类按各自格式实现"""
+        return []
+
 
 class ClaudeCliClient(ClientBase):
     """Claude Code CLI 配置写入（合并式更新，保留用户现有设置）"""
 
-    _path = Path.home() / ".claude" / "settings.json"
+    @property
+    def _path(self) -> Path:
+        return self.home / ".claude" / "settings.json"
 
     @property
     def config_paths(self) -> list[Path]:
@@ -104,7 +222,7 @@ class ClaudeCliClient(ClientBase):
     def display_name(self) -> str:
         return "claude_cli"
 
-    def apply(self, profile_data: dict) -> None:
+    def render(self, profile_data: dict) -> dict[Path, str]:
         api_key = profile_data.get("api_key", "")
         api_url = profile_data.get("api_url", "")
         model = profile_data.get("model", "claude-opus-4-6")
@@ -127,8 +245,19 @@ class ClaudeCliClient(ClientBase):
         env["ANTHROPIC_DEFAULT_OPUS_MODEL"] = model
         existing["model"] = "opus"
 
-        self._path.parent.mkdir(parents=True, exist_ok=True)
-        _atomic_write_json(self._path, existing)
+        return {self._path: _dump_json(existing)}
+
+    def _extract_live(self) -> list[dict]:
+        if not self._path.exists():
+            return []
+        env = json.loads(self._path.read_text(encoding="utf-8")).get("env", {})
+        return [
+            {
+                "api_url": env.get("ANTHROPIC_BASE_URL", ""),
+                "api_key": env.get("ANTHROPIC_AUTH_TOKEN", ""),
+                "model": env.get("ANTHROPIC_MODEL", ""),
+            }
+        ]
 
     def detect(self) -> bool:
         return self._path.parent.exists()
@@ -137,7 +266,9 @@ class ClaudeCliClient(ClientBase):
 class VSCodePluginClient(ClientBase):
     """VSCode 插件配置写入（外科式更新）"""
 
-    _path = Path.home() / "AppData" / "Roaming" / "Code" / "User" / "settings.json"
+    @property
+    def _path(self) -> Path:
+        return self.home / "AppData" / "Roaming" / "Code" / "User" / "settings.json"
 
     @property
     def config_paths(self) -> list[Path]:
@@ -147,22 +278,10 @@ class VSCodePluginClient(ClientBase):
     def display_name(self) -> str:
         return "vscode"
 
-    def apply(self, profile_data: dict) -> None:
+    def render(self, profile_data: dict) -> dict[Path, str]:
         api_url = profile_data.get("api_url", "")
         api_key = profile_data.get("api_key", "")
 
-        # 读取现有配置（容忍 JSONC 格式：解析失败时保留原文件，只更新目标字段）
-        existing = {}
-        if self._path.exists():
-            raw = self._path.read_text(encoding="utf-8")
-            try:
-                existing = json.loads(raw)
-            except (json.JSONDecodeError, UnicodeDecodeError):
-                # VSCode settings.json 可能含注释，无法解析时跳过，不覆盖原文件
-                raise RuntimeError(
-                    f"VSCode settings.json 格式异常（可能含注释），请手动编辑: {self._path}"
-                )
-
         # 只替换 claudeCode.environmentVariables
         env_vars = [
             {"name": "ANTHROPIC_BASE_URL", "value": api_url},
@@ -170,9 +289,33 @@ class VSCodePluginClient(ClientBase):
         ]
         if profile_data.get("model"):
             env_vars.append({"name": "ANTHROPIC_MODEL", "value": profile_data["model"]})
-        existing["claudeCode.environmentVariables"] = env_vars
-        self._path.parent.mkdir(parents=True, exist_ok=True)
-        _atomic_write_json(self._path, existing)
+
+        # settings.json 通常含注释和尾随逗号（JSONC），只改写目标键的值范围，其余原样保留
+        original = ""
+        if self._path.exists():
+            original = self._path.read_text(encoding="utf-8")
+        try:
+            updated = set_member(original, "claudeCode.environmentVariables", env_vars)
+        except ValueError as e:
+            raise RuntimeError(
+                f"VSCode settings.json 格式异常（{e}），请手动编辑: {self._path}"
+            )
+        return {self._path: updated}
+
+    def _extract_live(self) -> list[dict]:
+        if not self._path.exists():
+            return []
+        items = get_member(
+            self._path.read_text(encoding="utf-8"), "claudeCode.environmentVariables"
+        )
+        env = {item.get("name"): item.get("value", "") for item in items or []}
+        return [
+            {
+                "api_url": env.get("ANTHROPIC_BASE_URL", ""),
+                "api_key": env.get("ANTHROPIC_AUTH_TOKEN", ""),
+                "model": env.get("ANTHROPIC_MODEL", ""),
+            }
+        ]
 
     def detect(self) -> bool:
         return self._path.parent.exists()
@@ -181,8 +324,13 @@ class VSCodePluginClient(ClientBase):
 class CodexClient(ClientBase):
     """Codex 配置写入（两个文件，合并更新保留用户设置）"""
 
-    _auth_path = Path.home() / ".codex" / "auth.json"
-    _config_path = Path.home() / ".codex" / "config.toml"
+    @property
+    def _auth_path(self) -> Path:
+        return self.home / ".codex" / "auth.json"
+
+    @property
+    def _config_path(self) -> Path:
+        return self.home / ".codex" / "config.toml"
 
     @property
     def config_paths(self) -> list[Path]:
@@ -192,83 +340,59 @@ class CodexClient(ClientBase):
     def display_name(self) -> str:
         return "codex"
 
-    def _parse_toml(self) -> dict[str, dict[str, str]]:
-        """解析简单 TOML 为 {section: {key: raw_value}}，顶层 section 名为空字符串"""
-        sections: dict[str, dict[str, str]] = {"": {}}
-        if not self._config_path.exists():
-            return sections
-        current = ""
-        for line in self._config_path.read_text(encoding="utf-8").splitlines():
-            stripped = line.strip()
-            if not stripped or stripped.startswith("#"):
-                continue
-            if stripped.startswith("["):
-                current = stripped.strip("[]").strip()
-                sections.setdefault(current, {})
-                continue
-            if "=" in stripped:
-                key, _, val = stripped.partition("=")
-                sections.setdefault(current, {})[key.strip()] = val.strip()
-        return sections
-
-    def _write_toml(self, sections: dict[str, dict[str, str]]) -> None:
-        """将 sections 写回 TOML"""
-        lines = []
-        for k, v in sections.get("", {}).items():
-            lines.append(f"{k} = {v}")
-        for name, data in sections.items():
-            if name == "":
-                continue
-            lines.append("")
-            lines.append(f"[{name}]")
-            for k, v in data.items():
-                lines.append(f"{k} = {v}")
-        _atomic_write_text(self._config_path, "\n".join(lines) + "\n")
-
-    def apply(self, profile_data: dict) -> None:
-        self._auth_path.parent.mkdir(parents=True, exist_ok=True)
-
-        # 保存旧 auth.json 用于回滚
-        old_auth_bytes = None
-        if self._auth_path.exists():
-            old_auth_bytes = self._auth_path.read_bytes()
+    def build_data(self, config: CodexConfig) -> dict:
+        return {
+            "api_key": config.api_key,
+            "base_url": config.api_url,
+            "model": config.model,
+            "provider_name": config.provider_name,
+            "reasoning_effort": config.reasoning_effort,
+        }
 
+    def render(self, profile_data: dict) -> dict[Path, str]:
         # auth.json
         auth = {"OPENAI_API_KEY": profile_data.get("api_key", "")}
-        _atomic_write_json(self._auth_path, auth)
 
         # config.toml — 读取已有配置，合并更新
-        try:
-            provider_name = profile_data.get("provider_name", "custom")
-            model = profile_data.get("model", "gpt-5.3-codex")
-            effort = profile_data.get("reasoning_effort", "high")
-            base_url = profile_data.get("base_url", "")
-
-            sections = self._parse_toml()
-
-            # 更新顶层（只改我们管理的字段，保留其余）
-            top = sections.setdefault("", {})
-            top["model_provider"] = f'"{provider_name}"'
-            top["model"] = f'"{model}"'
-            top["model_reasoning_effort"] = f'"{effort}"'
-            top.setdefault("disable_response_storage", "true")
-
-            # 更新 provider section（保留已有的额外设置）
-            # 注意：Codex CLI 最新版仅支持 responses API，不需要 wire_api 字段
-            sec_name = f"model_providers.{provider_name}"
-            sec = sections.setdefault(sec_name, {})
-            sec["name"] = f'"{provider_name}"'
-            sec["requires_openai_auth"] = "true"
-            sec["base_url"] = f'"{base_url}"'
-
-            self._write_toml(sections)
-        except Exception:
-            # config.toml 写入失败，回滚 auth.json
-            if old_auth_bytes is not None:
-                _atomic_write_text(self._auth_path, old_auth_bytes.decode("utf-8"))
-            elif self._auth_path.exists():
-                self._auth_path.unlink()
-            raise
+        provider_name = profile_data.get("provider_name", "custom")
+        model = profile_data.get("model", "gpt-5.3-codex")
+        effort = profile_data.get("reasoning_effort", "high")
+        base_url = profile_data.get("base_url", "")
+
+        original = ""
+        if self._config_path.exists():
+            original = self._config_path.read_text(encoding="utf-8")
+        editor = TomlEditor(original)
+
+        # 更新顶层（只改我们管理的字段，其余内容原样保留）
+        editor.set((), "model_provider", toml_string(provider_name))
+        editor.set((), "model", toml_string(model))
+        editor.set((), "model_reasoning_effort", toml_string(effort))
+        editor.setdefault((), "disable_response_storage", "true")
+
+        # 更新 provider section（保留已有的额外设置）
+        # 注意：Codex CLI 最新版仅支持 responses API，不需要 wire_api 字段
+        sec = ("model_providers", provider_name)
+        editor.set(sec, "name", toml_string(provider_name))
+        editor.set(sec, "requires_openai_auth", "true")
+        editor.set(sec, "base_url", toml_string(base_url))
+
+        # 先写 auth.json；config.toml 写入失败时 write() 会回滚 auth.json
+        return {self._auth_path: _dump_json(auth), self._config_path: editor.render()}
+
+    def _extract_live(self) -> list[dict]:
+        if not self._auth_path.exists() or not self._config_path.exists():
+            return []
+        auth = json.loads(self._auth_path.read_text(encoding="utf-8"))
+        editor = TomlEditor(self._config_path.read_text(encoding="utf-8"))
+        provider = parse_string(editor.get((), "model_provider"))
+        return [
+            {
+                "api_url": parse_string(editor.get(("model_providers", provider), "base_url")),
+                "api_key": auth.get("OPENAI_API_KEY", ""),
+                "model": parse_string(editor.get((), "model")),
+            }
+        ]
 
     def detect(self) -> bool:
         return self._auth_path.parent.exists()
@@ -277,8 +401,13 @@ class CodexClient(ClientBase):
 class GeminiClient(ClientBase):
     """Gemini CLI 配置写入（.env + settings.json）"""
 
-    _env_path = Path.home() / ".gemini" / ".env"
-    _settings_path = Path.home() / ".gemini" / "settings.json"
+    @property
+    def _env_path(self) -> Path:
+        return self.home / ".gemini" / ".env"
+
+    @property
+    def _settings_path(self) -> Path:
+        return self.home / ".gemini" / "settings.json"
 
     @property
     def config_paths(self) -> list[Path]:
@@ -288,9 +417,14 @@ class GeminiClient(ClientBase):
     def display_name(self) -> str:
         return "gemini"
 
-    def apply(self, profile_data: dict) -> None:
-        self._env_path.parent.mkdir(parents=True, exist_ok=True)
+    def build_data(self, config: VendorConfig) -> dict:
+        return {
+            "api_key": config.api_key,
+            "base_url": config.api_url,
+            "model": config.model,
+        }
 
+    def render(self, profile_data: dict) -> dict[Path, str]:
         # 构建环境变量
         env_vars: dict[str, str] = {}
         if profile_data.get("api_key"):
@@ -303,9 +437,9 @@ class GeminiClient(ClientBase):
         for k, v in profile_data.get("extra_env", {}).items():
             env_vars[k] = v
 
-        # 写入 .env 文件
+        # .env 文件
         lines = [f"{k}={v}" for k, v in sorted(env_vars.items())]
-        _atomic_write_text(self._env_path, "\n".join(lines) + "\n")
+        env_text = "\n".join(lines) + "\n"
 
         # 写入 settings.json — 支持 v2 新格式（2025-09-10后）
         # v2 格式使用分层结构，旧格式已弃用但.env文件方式仍然有效
@@ -336,7 +470,23 @@ class GeminiClient(ClientBase):
             auth = security.setdefault("auth", {})
             auth["selectedType"] = "gemini-api-key"
 
-        _atomic_write_json(self._settings_path, existing)
+        return {self._env_path: env_text, self._settings_path: _dump_json(existing)}
+
+    def _extract_live(self) -> list[dict]:
+        if not self._env_path.exists():
+            return []
+        env = {}
+        for line in self._env_path.read_text(encoding="utf-8").splitlines():
+            key, sep, val = line.partition("=")
+            if sep:
+                env[key.strip()] = val.strip()
+        return [
+            {
+                "api_url": env.get("GOOGLE_GEMINI_BASE_URL", ""),
+                "api_key": env.get("GEMINI_API_KEY", ""),
+                "model": env.get("GEMINI_MODEL", ""),
+            }
+        ]
 
     def detect(self) -> bool:
         return self._env_path.parent.exists()
@@ -345,7 +495,9 @@ class GeminiClient(ClientBase):
 class OpenCodeClient(ClientBase):
     """OpenCode 配置写入（外科式更新）"""
 
-    _path = Path.home() / ".config" / "opencode" / "opencode.json"
+    @property
+    def _path(self) -> Path:
+        return self.home / ".config" / "opencode" / "opencode.json"
 
     @property
     def config_paths(self) -> list[Path]:
@@ -355,7 +507,25 @@ class OpenCodeClient(ClientBase):
     def display_name(self) -> str:
         return "opencode"
 
-    def apply(self, profile_data: dict) -> None:
+    def build_data(self, config: OpenCodeConfig) -> dict:
+        model_name = config.model_name or config.model
+        # 防止空 model_name 导致 OpenCode 配置中出现空 key
+        models = {}
+        if model_name:
+            models[model_name] = {
+                "name": config.display_name or model_name,
+                "limit": {"context": config.context_limit, "output": config.output_limit},
+            }
+        return {
+            "api_key": config.api_key,
+            "base_url": config.api_url,
+            "provider_id": config.provider_id,
+            "npm": config.npm,
+            "display_name": config.display_name,
+            "models": models,
+        }
+
+    def render(self, profile_data: dict) -> dict[Path, str]:
         # 读取现有配置
         existing = {}
         if self._path.exists():
@@ -403,18 +573,26 @@ class OpenCodeClient(ClientBase):
 
         existing["provider"][provider_id] = entry
 
-        self._path.parent.mkdir(parents=True, exist_ok=True)
-        _atomic_write_json(self._path, existing)
+        return {self._path: _dump_json(existing)}
+
+    def _extract_live(self) -> list[dict]:
+        # OpenCode 同时保留多个 provider，每个 provider 下的每个模型都是候选
+        if not self._path.exists():
+            return []
+        providers = json.loads(self._path.read_text(encoding="utf-8")).get("provider", {})
+        live = []
+        for entry in providers.values():
+            options = entry.get("options", {})
+            for model_name in entry.get("models", {}):
+                live.append(
+                    {
+                        "api_url": options.get("baseURL", ""),
+                        "api_key": options.get("apiKey", ""),
+                        "model": model_name,
+                    }
+                )
+        return live
 
     def detect(self) -> bool:
         return self._path.parent.exists()
 
-
-# 客户端实例注册
-ALL_CLIENTS = {
-    "claude_cli": ClaudeCliClient(),
-    "vscode": VSCodePluginClient(),
-    "codex": CodexClient(),
-    "gemini": GeminiClient(),
-    "opencode": OpenCodeClient(),
-}
@@ -1,17 +1,43 @@
 """Vendor-based 配置管理与 config.json 读写"""
 
+import atexit
+import hashlib
 import json
+import os
 import shutil
 import sys
 import threading
+import time
 import uuid
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
 
-from clients import ALL_CLIENTS, _atomic_write_json
+import config_models
+import env_manager as ev
+from client_registry import registry
+from clients import _atomic_write_json, _record_own_write
+from file_lock import RWFileLock
+from fingerprint_index import FingerprintIndex
+from search_index import SearchIndex
+from switch_stager import SwitchStager
+import usage_index
 
-# 全局锁，防止并发写入配置文件
-_config_lock = threading.Lock()
+# 跨进程读写锁（锁文件与 config.json 同目录）：读者并行，写者排他，GUI 与 set_env_helper 同时运行也安全
+_config_lock = RWFileLock(lambda: CONFIG_PATH.with_name(CONFIG_PATH.name + ".lock"))
+
+# 批量调用期间共享的配置快照（按线程隔离）
+_snapshot = threading.local()
+
+# 连接参数指纹索引，用于识别各客户端实际生效的配置
+_fingerprints = FingerprintIndex()
+
+# 配置搜索倒排索引（名称、主机名、模型、provider）
+_search = SearchIndex()
+
+# 切换产物预生成（可选）
+_stager = SwitchStager()
+atexit.register(_stager.close)
 
 
 def _get_app_dir() -> Path:
@@ -23,14 +49,7 @@ def _get_app_dir() -> Path:
 
 CONFIG_PATH = _get_app_dir() / "config.json"
 
-# 三个固定厂家及其映射的客户端
-VENDOR_CLIENTS = {
-    "claude": ["claude_cli", "vscode"],
-    "codex": ["codex"],
-    "gemini": ["gemini"],
-    "opencode": ["opencode"],
-}
-
+# 固定厂家；各厂家映射的客户端由 client_registry 登记，见 vendor_clients()
 VENDOR_META = {
     "claude": {
         "display_name": "Claude",
@@ -59,6 +78,8 @@ VENDOR_META = {
 }
 
 DEFAULT_CONFIG = {
+    # 每次保存递增的版本号，切换时用于检测读取之后是否有其他写入（比较并交换）
+    "generation": 0,
     "vendors": {
         "claude": {"configs": [], "current_config_id": None},
         "codex": {"configs": [], "current_config_id": None},
@@ -72,22 +93,60 @@ DEFAULT_CONFIG = {
 }
 
 
+def _config_signature() -> tuple | None:
+    """config.json 的文件签名，用于判断是否被外部修改"""
+    try:
+        st = CONFIG_PATH.stat()
+    except OSError:
+        return None
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+# 已解析并规范化的 config.json，按 (路径, 文件签名) 缓存；文件未变时读取只需浅拷贝
+_parsed: tuple | None = None
+
+
+def _copy_doc(data: dict) -> dict:
+    """
+    复制配置文档中会被修改的层级（厂家段与配置列表）
+
+    单个配置 dict 在各副本间共享：修改配置一律整条替换（见 _apply_save），不原地改写。
+    """
+    doc = dict(data)
+    doc["vendors"] = {
+        vk: {**v, "configs": list(v.get("configs", []))} for vk, v in data.get("vendors", {}).items()
+    }
+    doc["settings"] = dict(data.get("settings", {}))
+    return doc
+
+
+def _remember_parsed(data: dict, signature) -> None:
+    global _parsed
+    _parsed = (CONFIG_PATH, signature, _copy_doc(data)) if signature else None
+
+
 def _load_unlocked() -> dict:
-    """加载配置（内部使用，调用方需持有 _config_lock）"""
-    if not CONFIG_PATH.exists():
+    """加载配置（内部使用，调用方需持有 _config_lock 的读锁或写锁）"""
+    signature = _config_signature()
+    if signature is None:
         return json.loads(json.dumps(DEFAULT_CONFIG))
+    cached = _parsed
+    if cached is not None and cached[0] == CONFIG_PATH and cached[1] == signature:
+        return _copy_doc(cached[2])
     try:
         data = json.loads(CONFIG_PATH.read_text(encoding="utf-8"))
         # 兼容旧格式：自动迁移
         if "profiles" in data and "vendors" not in data:
             data = _migrate_from_profiles(data)
             _atomic_write_json(CONFIG_PATH, data)
-        # 确保三个厂家都存在
+            _record_own_write(CONFIG_PATH)
+            signature = _config_signature()
+        # 确保各厂家都存在，并校验、补齐每个配置的字段（只在文件变化后做一次）
         vendors = data.setdefault("vendors", {})
-        for vk in VENDOR_CLIENTS:
+        for vk in VENDOR_META:
             if vk not in vendors:
                 vendors[vk] = {"configs": [], "current_config_id": None}
-        return data
+            vendors[vk]["configs"] = config_models.normalize_configs(vk, vendors[vk].get("configs", []))
     except (json.JSONDecodeError, UnicodeDecodeError):
         # 配置文件损坏，备份后回退到默认配置
         _backup_corrupt_config()
@@ -96,14 +155,45 @@ def _load_unlocked() -> dict:
         # 其他错误，记录后返回默认配置
         print(f"[错误] 加载配置失败: {e}")
         return json.loads(json.dumps(DEFAULT_CONFIG))
+    _remember_parsed(data, signature)
+    return data
 
 
 def _load() -> dict:
-    """加载配置（线程安全，仅用于只读场景）"""
-    with _config_lock:
+    """
+    加载配置（线程安全，仅用于只读场景）
+
+    处于 snapshot() 内时直接复用快照；延迟写入尚未落盘时返回内存中最新文档的副本。
+    """
+    data = getattr(_snapshot, "data", None)
+    if data is not None:
+        return data
+    wb_doc = _wb_copy()
+    if wb_doc is not None:
+        return wb_doc
+    with _config_lock.read():
         return _load_unlocked()
 
 
+@contextmanager
+def snapshot():
+    """在当前线程内共享同一份配置快照，批量读取时只解析一次 config.json"""
+    if getattr(_snapshot, "data", None) is not None:
+        # 嵌套调用直接复用外层快照
+        yield _snapshot.data
+        return
+    wb_doc = _wb_copy()
+    if wb_doc is not None:
+        _snapshot.data = wb_doc
+    else:
+        with _config_lock.read():
+            _snapshot.data = _load_unlocked()
+    try:
+        yield _snapshot.data
+    finally:
+        _snapshot.data = None
+
+
 def _backup_corrupt_config() -> None:
     """备份损坏的 config.json 以便恢复"""
     if not CONFIG_PATH.exists():
@@ -117,14 +207,60 @@ def _backup_corrupt_config() -> None:
 
 
 def _save_unlocked(data: dict) -> None:
-    """保存配置（内部使用，调用方需持有 _config_lock）"""
+    """保存配置并递增版本号（内部使用，调用方需持有 _config_lock 的写锁）"""
+    data["generation"] = data.get("generation", 0) + 1
     _atomic_write_json(CONFIG_PATH, data)
+    _record_own_write(CONFIG_PATH)
+    _remember_parsed(data, _config_signature())
+    # 快照内的写入立即对后续读取可见
+    if getattr(_snapshot, "data", None) is not None:
+        _snapshot.data = data
 
 
 def _save(data: dict) -> None:
     """保存配置（线程安全，仅用于独立保存场景）"""
-    with _config_lock:
+    with _config_lock.write():
+        _save_unlocked(data)
+
+
+# 比较并交换提交的冲突次数（lock_stats 中报告）
+_cas_stats = {"commits": 0, "conflicts": 0, "rebased": 0}
+
+
+def read_versioned() -> tuple[dict, tuple | None]:
+    """读取配置及其文件签名；二者在同一个读锁内取得，签名即该文档的版本凭据"""
+    with _config_lock.read():
+        return _load_unlocked(), _config_signature()
+
+
+def _commit_if_unchanged(data: dict, signature, mutate) -> tuple | None:
+    """
+    比较并交换：读取之后没有其他写入时才提交 mutate 的修改
+
+    文件签名未变时直接在已解析的 data 上修改并写出（不再解析）；
+    签名变了则在写锁内重新解析，改为在最新文档上修改，不会覆盖其间的其他写入。
+    其他写入未必与本次修改相关（例如另一厂家的保存），所以不直接判为冲突。
+
+    调用约定：mutate 必须在收到的文档上重新校验自己依赖的全部前提（不能假定它就是 data），
+    前提不成立时返回 False，此时才算冲突。不满足这一约定的修改不要使用本函数。
+
+    Returns:
+        (提交后的文档, 写入前签名, 写入后签名)；冲突时返回 None，调用方重新读取后重试
+    """
+    with _config_lock.write():
+        before = _config_signature()
+        if before != signature:
+            latest = _load_unlocked()
+            if latest.get("generation", 0) != data.get("generation", 0):
+                # 前提仍成立就直接提交；否则在高频写入下重读重试可能一直追不上
+                _cas_stats["rebased"] += 1
+            data = latest
+        if mutate(data) is False:
+            _cas_stats["conflicts"] += 1
+            return None
         _save_unlocked(data)
+        _cas_stats["commits"] += 1
+        return data, before, _config_signature()
 
 
 def _migrate_from_profiles(old_data: dict) -> dict:
@@ -168,20 +304,66 @@ def _migrate_from_profiles(old_data: dict) -> dict:
 # ── 读取 ──────────────────────────────────────────
 
 
+def _vendor_view(data: dict, vk: str) -> dict:
+    """组装单个厂家的前端视图 {meta, configs, current_config_id}"""
+    vendor_data = data.get("vendors", {}).get(
+        vk, {"configs": [], "current_config_id": None}
+    )
+    return {
+        **VENDOR_META[vk],
+        "configs": vendor_data.get("configs", []),
+        "current_config_id": vendor_data.get("current_config_id"),
+    }
+
+
 def get_vendors() -> dict:
     """返回 {vendor_key: {meta, configs, current_config_id}}"""
     data = _load()
-    result = {}
-    for vk, meta in VENDOR_META.items():
-        vendor_data = data.get("vendors", {}).get(
-            vk, {"configs": [], "current_config_id": None}
-        )
-        result[vk] = {
-            **meta,
-            "configs": vendor_data.get("configs", []),
-            "current_config_id": vendor_data.get("current_config_id"),
-        }
-    return result
+    return {vk: _vendor_view(data, vk) for vk in VENDOR_META}
+
+
+def get_vendor(vendor: str) -> dict | None:
+    """返回单个厂家的视图，用于局部刷新"""
+    if vendor not in VENDOR_META:
+        return None
+    return _vendor_view(_load(), vendor)
+
+
+def get_settings() -> dict:
+    """返回 config.json 的 settings 段（副本，修改不会写回）"""
+    return dict(_load().get("settings", {}))
+
+
+def vendor_digests() -> dict[str, str]:
+    """每个厂家配置段的摘要，用于判断 config.json 被外部修改时哪些厂家发生了变化"""
+    data = _load()
+    return {
+        vk: hashlib.sha1(
+            json.dumps(
+                data.get("vendors", {}).get(vk), sort_keys=True, ensure_ascii=False
+            ).encode("utf-8")
+        ).hexdigest()
+        for vk in VENDOR_META
+    }
+
+
+def vendor_clients(vendor: str) -> list[str]:
+    """厂家映射的客户端标识（来自客户端注册表，不会导入客户端模块）"""
+    return registry.keys_for(vendor)
+
+
+def watched_paths() -> dict[Path, set[str]]:
+    """
+    需要监听的文件 → 受影响的厂家（config.json 影响全部厂家，由摘要再细分）
+
+    插件客户端的路径取自清单声明（见 client_registry），监听不会导入或实例化插件。
+    """
+    paths: dict[Path, set[str]] = {CONFIG_PATH: set(VENDOR_META)}
+    for vk in VENDOR_META:
+        for key in vendor_clients(vk):
+            for path in registry.config_paths(key):
+                paths.setdefault(path, set()).add(vk)
+    return paths
 
 
 def get_current_config(vendor: str) -> dict | None:
@@ -203,84 +385,378 @@ def get_current_config(vendor: str) -> dict | None:
 # ── CRUD ──────────────────────────────────────────
 
 
-def save_vendor_config(vendor: str, config_data: dict) -> dict:
-    """保存/新增某厂家下的一个模型配置（原子读写，防止并发丢失）"""
-    if vendor not in VENDOR_CLIENTS:
-        raise ValueError(f"未知厂家: {vendor}")
+def _apply_save(data: dict, vendor: str, config_data: dict) -> bool:
+    """在配置文档上执行保存（按 id 替换或追加），返回是否有改动"""
+    vendor_data = data["vendors"].setdefault(
+        vendor, {"configs": [], "current_config_id": None}
+    )
+    configs = vendor_data.setdefault("configs", [])
+    entry = dict(config_data)
+    for i, c in enumerate(configs):
+        if c["id"] == entry["id"]:
+            configs[i] = entry
+            break
+    else:
+        configs.append(entry)
+    return True
 
-    with _config_lock:
-        data = _load_unlocked()
-        vendor_data = data["vendors"].setdefault(
-            vendor, {"configs": [], "current_config_id": None}
-        )
-        configs = vendor_data.setdefault("configs", [])
 
-        if config_data.get("id"):
-            for i, c in enumerate(configs):
-                if c["id"] == config_data["id"]:
-                    configs[i] = config_data
-                    break
-            else:
-                configs.append(config_data)
+def _apply_delete(data: dict, vendor: str, config_id: str) -> bool:
+    """在配置文档上执行删除，返回是否找到并删除"""
+    vendor_data = data.get("vendors", {}).get(vendor)
+    if not vendor_data:
+        return False
+
+    configs = vendor_data.get("configs", [])
+    new_configs = [c for c in configs if c["id"] != config_id]
+    if len(new_configs) == len(configs):
+        return False
+
+    vendor_data["configs"] = new_configs
+    if vendor_data.get("current_config_id") == config_id:
+        vendor_data["current_config_id"] = None
+    return True
+
+
+def _apply_batch(data: dict, changes: list[tuple[str, str, dict | None]]) -> None:
+    """批量保存/删除（按 id 建一次位置索引，改动数量大时不必逐条扫描配置列表）"""
+    vendors = data.setdefault("vendors", {})
+    deleted: dict[str, set] = {}
+    positions: dict[str, dict] = {}
+    for vendor, config_id, config in changes:
+        vendor_data = vendors.setdefault(vendor, {"configs": [], "current_config_id": None})
+        configs = vendor_data.setdefault("configs", [])
+        if vendor not in positions:
+            positions[vendor] = {c["id"]: i for i, c in enumerate(configs)}
+        index = positions[vendor]
+        if config is None:
+            if config_id in index:
+                deleted.setdefault(vendor, set()).add(config_id)
+                if vendor_data.get("current_config_id") == config_id:
+                    vendor_data["current_config_id"] = None
+        elif config_id in index:
+            configs[index[config_id]] = dict(config)
+            deleted.get(vendor, set()).discard(config_id)
         else:
-            config_data["id"] = str(uuid.uuid4())
-            configs.append(config_data)
+            index[config_id] = len(configs)
+            configs.append(dict(config))
+    for vendor, ids in deleted.items():
+        if ids:
+            vendors[vendor]["configs"] = [c for c in vendors[vendor]["configs"] if c["id"] not in ids]
+
+
+def _current_id(data: dict, vendor: str) -> str | None:
+    return data.get("vendors", {}).get(vendor, {}).get("current_config_id")
+
+
+def _write_current_script(vendor: str, config: dict) -> None:
+    """写出 current.* 终端环境变量脚本；写入失败不影响配置本身的保存或切换"""
+    try:
+        ev.write_env_scripts(vendor, config, current=True)
+    except (OSError, ValueError) as e:
+        print(f"[警告] 生成环境变量脚本失败: {e}")
+
+
+def _refresh_env_scripts(vendor: str, config: dict, data: dict) -> None:
+    """
+    配置内容变化后刷新终端环境变量脚本
 
+    只重写当前配置的 current.*；该配置已生成的 <id>.* 直接删除，
+    下次在终端加载时再按需生成（见 shell_env.find_snippet），批量同步时不必逐个写出。
+    """
+    ev.remove_env_scripts(vendor, config["id"])
+    if config["id"] == _current_id(data, vendor):
+        _write_current_script(vendor, config)
+
+
+def save_vendor_config(vendor: str, config_data: dict) -> dict:
+    """保存/新增某厂家下的一个模型配置（原子读写，防止并发丢失）"""
+    if vendor not in VENDOR_META:
+        raise ValueError(f"未知厂家: {vendor}")
+    if not config_data.get("id"):
+        config_data["id"] = str(uuid.uuid4())
+    elif not config_models.is_safe_id(config_data["id"]):
+        raise ValueError("配置 id 只能包含字母、数字、- 和 _")
+    config_data = config_models.normalize(vendor, {**config_data, "updated_at": time.time()})
+
+    if _write_behind_active():
+        _enqueue_write(_apply_save, vendor, config_data)
+        _fingerprints.upsert(vendor, config_data)
+        _search.upsert(vendor, config_data)
+        _refresh_env_scripts(vendor, config_data, _load())
+        _schedule_stage(vendor, config_data)
+        return config_data
+
+    with _config_lock.write():
+        before = _config_signature()
+        data = _load_unlocked()
+        _apply_save(data, vendor, config_data)
         _save_unlocked(data)
+        after = _config_signature()
+        _fingerprints.upsert(vendor, config_data, before, after)
+        _search.upsert(vendor, config_data, before, after)
+    _refresh_env_scripts(vendor, config_data, data)
+    _schedule_stage(vendor, config_data)
     return config_data
 
 
 def delete_vendor_config(vendor: str, config_id: str) -> bool:
     """删除某厂家下的一个模型配置（原子读写，防止并发丢失）"""
-    with _config_lock:
+    if _write_behind_active():
+        was_current = _current_id(_load(), vendor) == config_id
+        if not _enqueue_write(_apply_delete, vendor, config_id):
+            return False
+        _fingerprints.remove(vendor, config_id)
+        _search.remove(vendor, config_id)
+        ev.remove_env_scripts(vendor, config_id, current=was_current)
+        _stager.drop(config_id)
+        return True
+
+    with _config_lock.write():
+        before = _config_signature()
         data = _load_unlocked()
-        vendor_data = data.get("vendors", {}).get(vendor)
-        if not vendor_data:
+        was_current = _current_id(data, vendor) == config_id
+        if not _apply_delete(data, vendor, config_id):
             return False
+        _save_unlocked(data)
+        after = _config_signature()
+        _fingerprints.remove(vendor, config_id, before, after)
+        _search.remove(vendor, config_id, before, after)
+    ev.remove_env_scripts(vendor, config_id, current=was_current)
+    _stager.drop(config_id)
+    return True
 
-        configs = vendor_data.get("configs", [])
-        new_configs = [c for c in configs if c["id"] != config_id]
-        if len(new_configs) == len(configs):
-            return False
 
-        vendor_data["configs"] = new_configs
-        if vendor_data.get("current_config_id") == config_id:
-            vendor_data["current_config_id"] = None
+def apply_synced(changes: list[tuple[str, str, dict | None]], expected: dict) -> bool:
+    """
+    一次原子提交写入同步得到的配置（见 profile_sync）
 
-        _save_unlocked(data)
+    Args:
+        changes: [(厂家, 配置 id, 新内容；None 表示删除)]
+        expected: {(厂家, 配置 id): 本地内容哈希或 None}，规划同步时看到的本地状态
+
+    Returns:
+        False 表示本地在此期间被修改（前提不成立），调用方应重新规划
+    """
+    if not changes:
+        return True
+    flush()
+
+    was_current: set[tuple[str, str]] = set()  # 被删除的配置中原本是当前配置的
+
+    # mutate 可能在其他写入之后的最新文档上调用（见 _commit_if_unchanged），
+    # 因此逐条重新校验规划时看到的本地状态，不能只依赖读取时的文档
+    def mutate(doc: dict) -> bool:
+        by_id = {
+            (vk, c["id"]): c for vk, v in doc.get("vendors", {}).items() for c in v.get("configs", [])
+        }
+        for key, digest in expected.items():
+            current = by_id.get(key)
+            if (config_models.content_hash(current) if current else None) != digest:
+                return False
+        was_current.clear()
+        was_current.update(
+            (vendor, config_id)
+            for vendor, config_id, config in changes
+            if config is None and _current_id(doc, vendor) == config_id
+        )
+        _apply_batch(doc, changes)
+        return True
+
+    data, signature = read_versioned()
+    committed = _commit_if_unchanged(data, signature, mutate)
+    if committed is None:
+        return False
+    data, before, after = committed
+    for vendor, config_id, config in changes:
+        if config is None:
+            _fingerprints.remove(vendor, config_id, before, after)
+            _search.remove(vendor, config_id, before, after)
+            ev.remove_env_scripts(vendor, config_id, current=(vendor, config_id) in was_current)
+            _stager.drop(config_id)
+        else:
+            _fingerprints.upsert(vendor, config, before, after)
+            _search.upsert(vendor, config, before, after)
+            _refresh_env_scripts(vendor, config, data)
+            _schedule_stage(vendor, config)
     return True
 
 
-# ── 切换逻辑 ──────────────────────────────────────
+# ── 延迟合并写入（write-behind） ─────────────────
+#
+# 开启后保存/删除立即作用于内存中的文档（本进程的读取马上可见），
+# 持久化则合并为每个间隔一次原子写入。落盘时在写锁内重新读取磁盘上的最新内容并
+# 按顺序重放待写操作，因此不会覆盖其他进程在此期间的修改。
+# 切换配置前与进程退出时强制落盘。
 
+_write_behind = {"enabled": None, "interval": 0.5}
+_wb_lock = threading.RLock()
+_wb_ops: list[tuple] = []
+_wb_doc: dict | None = None
+_wb_timer: threading.Timer | None = None
 
-def switch_vendor_config(vendor: str, config_id: str) -> dict:
-    """切换某厂家到指定配置"""
-    if vendor not in VENDOR_CLIENTS:
-        return {"success": False, "message": f"未知厂家: {vendor}", "details": []}
 
-    # 原子读取配置
-    with _config_lock:
-        data = _load_unlocked()
-        vendor_data = data.get("vendors", {}).get(vendor, {})
-        configs = vendor_data.get("configs", [])
-        config = next((c for c in configs if c["id"] == config_id), None)
+def _wb_copy() -> dict | None:
+    """
+    延迟写入尚未落盘时内存文档的副本，否则 None
+
+    内存文档会被定时落盘线程与其他线程的保存修改，不能直接交给调用方。
+    先于 _config_lock 获取 _wb_lock（与 flush 的加锁顺序一致），不要在持有 _config_lock 时调用。
+    """
+    with _wb_lock:
+        return _copy_doc(_wb_doc) if _wb_doc is not None else None
+
+
+def _write_behind_active() -> bool:
+    """是否启用延迟写入：环境变量 CODEPIVOT_WRITE_BEHIND 或 settings.write_behind"""
+    if _write_behind["enabled"] is None:
+        env = os.environ.get("CODEPIVOT_WRITE_BEHIND", "").lower()
+        if env:
+            _write_behind["enabled"] = env in ("1", "true", "yes", "on")
+        else:
+            settings = get_settings()
+            _write_behind["enabled"] = bool(settings.get("write_behind", False))
+            _write_behind["interval"] = float(
+                settings.get("write_behind_interval", _write_behind["interval"])
+            )
+    return _write_behind["enabled"]
+
+
+def set_write_behind(enabled: bool, interval: float | None = None) -> dict:
+    """运行时开关延迟写入；关闭前先把待写内容落盘"""
+    if not enabled:
+        flush()
+    with _wb_lock:
+        _write_behind["enabled"] = bool(enabled)
+        if interval is not None:
+            _write_behind["interval"] = max(float(interval), 0.05)
+    return dict(_write_behind)
+
+
+def _enqueue_write(op, *args) -> bool:
+    """把一次修改作用到内存文档并登记待落盘，返回 op 的结果（False 表示无改动）"""
+    global _wb_doc, _wb_timer
+    with _wb_lock:
+        if _wb_doc is None:
+            with _config_lock.read():
+                _wb_doc = _load_unlocked()
+        if not op(_wb_doc, *args):
+            return False
+        _wb_ops.append((op, args))
+        # 与 _save_unlocked 相同：快照内的写入立即对后续读取可见
+        if getattr(_snapshot, "data", None) is not None:
+            _snapshot.data = _copy_doc(_wb_doc)
+        if _wb_timer is None:
+            _wb_timer = threading.Timer(_write_behind["interval"], flush)
+            _wb_timer.daemon = True
+            _wb_timer.start()
+    return True
+
+
+def flush() -> None:
+    """把合并的待写操作一次性原子写入 config.json"""
+    global _wb_doc, _wb_timer
+    with _wb_lock:
+        if _wb_timer is not None:
+            _wb_timer.cancel()
+            _wb_timer = None
+        if not _wb_ops:
+            return
+        with _config_lock.write():
+            data = _load_unlocked()
+            for op, args in _wb_ops:
+                op(data, *args)
+            _save_unlocked(data)
+        _wb_ops.clear()
+        _wb_doc = None
+
+
+atexit.register(flush)
+
+
+# ── 切换产物预生成 ──────────────────────────────
+#
+# 开启后每次保存/切换都会在后台为该厂家的配置渲染好各客户端的目标文件，
+# 切换时目标文件未被改动过就直接 rename，否则照常合并写入。
+
+_prestage = {"enabled": None}
+
+
+def _prestage_active() -> bool:
+    """是否启用预生成：环境变量 CODEPIVOT_PRESTAGE 或 settings.prestage_switch"""
+    if _prestage["enabled"] is None:
+        env = os.environ.get("CODEPIVOT_PRESTAGE", "").lower()
+        if env:
+            _prestage["enabled"] = env in ("1", "true", "yes", "on")
+        else:
+            _prestage["enabled"] = bool(get_settings().get("prestage_switch", False))
+    return _prestage["enabled"]
+
+
+def set_prestage(enabled: bool) -> dict:
+    """运行时开关预生成；开启时立即为所有配置排队生成"""
+    _prestage["enabled"] = bool(enabled)
+    if enabled:
+        prestage_vendors(VENDOR_META)
+    return prestage_stats()
+
 
-        if not config:
-            return {"success": False, "message": "配置不存在", "details": []}
+def prestage_stats() -> dict:
+    return {"enabled": bool(_prestage["enabled"]), **_stager.stats()}
 
+
+def _schedule_stage(vendor: str, config: dict) -> None:
+    if not _prestage_active():
+        return
+    model = config_models.parse(vendor, config)
+    for key in vendor_clients(vendor):
+        client = registry.get(key)
+        if client:
+            _stager.schedule(key, client, model.id, client.build_data(model))
+
+
+def prestage_vendors(vendors) -> None:
+    """为指定厂家的所有配置排队预生成（客户端文件变化或切换后调用）"""
+    if not _prestage_active():
+        return
+    data = _load()
+    for vendor in vendors:
+        for cfg in data.get("vendors", {}).get(vendor, {}).get("configs", []):
+            _schedule_stage(vendor, cfg)
+
+
+# ── 切换逻辑 ──────────────────────────────────────
+
+# 切换提交遇到并发写入时的最大尝试次数
+MAX_SWITCH_ATTEMPTS = 5
+
+# 每个厂家一把跨进程切换锁（锁文件与 config.json 同目录）
+_switch_locks = {
+    vk: RWFileLock(lambda vk=vk: CONFIG_PATH.with_name(f"{CONFIG_PATH.name}.{vk}.switch.lock"))
+    for vk in VENDOR_META
+}
+
+
+def _apply_clients(
+    vendor: str, config: dict, data: dict, prestaged: bool, progress=None, cancelled=None
+) -> tuple[list[str], list[str], int]:
+    """把配置写入该厂家的所有客户端，返回 (结果, 错误, 成功数)"""
     results = []
     errors = []
     success_count = 0
     backup_before = data.get("settings", {}).get("backup_before_switch", True)
-    client_keys = VENDOR_CLIENTS[vendor]
-
-    for key in client_keys:
-        client = ALL_CLIENTS.get(key)
+    model = config_models.parse(vendor, config)
+    for key in vendor_clients(vendor):
+        client = registry.get(key)
         if not client:
             continue
+        if cancelled and cancelled():
+            errors.append(f"[{client.display_name}] 已取消，未写入")
+            continue
 
-        merged = _build_client_data(vendor, key, config)
+        merged = client.build_data(model)
+        if progress:
+            progress({"stage": "client", "client": key, "status": "writing"})
 
         if backup_before:
             try:
@@ -293,85 +769,184 @@ def switch_vendor_config(vendor: str, config_id: str) -> dict:
                 results.append(f"[{client.display_name}] 备份警告: {e}")
 
         try:
-            client.apply(merged)
-            results.append(f"[{client.display_name}] ✔ 配置已写入")
+            if prestaged and _stager.try_switch(key, config["id"], merged):
+                results.append(f"[{client.display_name}] ✔ 配置已写入（预生成）")
+            else:
+                client.apply(merged)
+                results.append(f"[{client.display_name}] ✔ 配置已写入")
             success_count += 1
+            if progress:
+                progress({"stage": "client", "client": key, "status": "done"})
         except Exception as e:
             errors.append(f"[{client.display_name}] ✘ 写入失败: {e}")
+            if progress:
+                progress({"stage": "client", "client": key, "status": "failed", "message": str(e)})
+    return results, errors, success_count
+
+
+def switch_vendor_config(
+    vendor: str, config_id: str, progress=None, cancelled=None
+) -> dict:
+    """
+    切换某厂家到指定配置
+
+    Args:
+        progress: 可选回调，每个客户端处理前后收到 {"stage": "client", ...} 事件
+        cancelled: 可选函数，返回 True 时在下一个客户端之前停止（已写入的客户端保留）
+    """
+    if vendor not in VENDOR_META:
+        return {"success": False, "message": f"未知厂家: {vendor}", "details": []}
 
-    # 只要有客户端写入成功就更新 current_config_id（原子读写）
-    has_success = success_count > 0
-    if has_success:
-        with _config_lock:
-            data = _load_unlocked()
-            data.get("vendors", {}).get(vendor, {})["current_config_id"] = config_id
-            _save_unlocked(data)
-
-    if errors:
-        msg = "部分客户端写入失败" if has_success else "所有客户端写入失败"
-        return {"success": has_success, "message": msg, "details": results + errors}
-
-    return {
-        "success": True,
-        "message": f"已切换到「{config.get('name', '')}」",
-        "details": results,
-    }
-
-
-def _build_client_data(vendor: str, client_key: str, config: dict) -> dict:
-    """根据厂家和客户端，构建 client.apply() 需要的数据"""
-    api_url = config.get("api_url", "")
-    api_key = config.get("api_key", "")
-    model = config.get("model", "")
-
-    if client_key in ("claude_cli",):
-        return {"api_url": api_url, "api_key": api_key, "model": model}
+    # 切换前把延迟写入的修改落盘，保证读到的是最新配置
+    flush()
+
+    # 同一厂家的切换整段串行（写客户端文件 → 提交 current_config_id → 写 current.*）：
+    # 否则两个并发的切换可能一个的客户端文件留在磁盘上、另一个的 id 提交进 config.json
+    with _switch_locks[vendor].write():
+        applied = None  # 已写入客户端的配置内容
+        results, errors, success_count = [], [], 0
+        prestaged = _prestage_active()
+        for _ in range(MAX_SWITCH_ATTEMPTS):
+            # 一次读取：配置内容与写入 current_config_id 所需的文档都来自这里
+            data, signature = read_versioned()
+            configs = data.get("vendors", {}).get(vendor, {}).get("configs", [])
+            config = next((c for c in configs if c["id"] == config_id), None)
+            if not config:
+                if applied is not None:
+                    return {
+                        "success": False,
+                        "message": "配置在切换期间被删除",
+                        "details": results + errors,
+                    }
+                return {"success": False, "message": "配置不存在", "details": []}
+
+            # 重试时配置内容未变就不必重写客户端（切换锁内没有其他切换改写它们），只需重新提交
+            if config != applied:
+                results, errors, success_count = _apply_clients(
+                    vendor, config, data, prestaged, progress, cancelled
+                )
+                applied = dict(config)
+            if not success_count:
+                break
+
+            def set_current(doc: dict) -> bool:
+                vendor_data = doc.get("vendors", {}).get(vendor, {})
+                current = next(
+                    (c for c in vendor_data.get("configs", []) if c["id"] == config_id), None
+                )
+                if current != applied:
+                    return False
+                vendor_data["current_config_id"] = config_id
+                return True
+
+            # 一次条件写入：读取之后目标配置被改动则重读重试
+            # （_commit_if_unchanged 可能在其他写入之后的最新文档上调用 set_current，前提由它自己重新校验）
+            committed = _commit_if_unchanged(data, signature, set_current)
+            if committed is not None:
+                data, before, after = committed
+                _fingerprints.set_current(vendor, config_id, before, after)
+                break
+        else:
+            return {
+                "success": False,
+                "message": "配置持续被其他进程修改，切换未完成",
+                "details": results + errors,
+            }
 
-    if client_key == "vscode":
-        return {"api_url": api_url, "api_key": api_key, "model": model}
+        # 只要有客户端写入成功就已更新 current_config_id
+        has_success = success_count > 0
+        if has_success:
+            _write_current_script(vendor, config)
+            try:
+                usage_index.record_switch(vendor, config)
+            except OSError as e:
+                print(f"[警告] 记录切换历史失败: {e}")
+            # 目标文件已改变，该厂家其余配置的产物都已失效，重新生成
+            if prestaged:
+                for cfg in data.get("vendors", {}).get(vendor, {}).get("configs", []):
+                    _schedule_stage(vendor, cfg)
+
+        if errors:
+            msg = "部分客户端写入失败" if has_success else "所有客户端写入失败"
+            return {"success": has_success, "message": msg, "details": results + errors}
 
-    if client_key == "codex":
         return {
-            "api_key": api_key,
-            "base_url": api_url,
-            "model": model,
-            "provider_name": config.get("provider_name", "custom"),
-            "reasoning_effort": config.get("reasoning_effort", "high"),
+            "success": True,
+            "message": f"已切换到「{config.get('name', '')}」",
+            "details": results,
         }
 
-    if client_key == "gemini":
-        return {
-            "api_key": api_key,
-            "base_url": api_url,
-            "model": model,
-        }
 
-    if client_key == "opencode":
-        model_name = config.get("model_name", "") or model
-        # 防止空 model_name 导致 OpenCode 配置中出现空 key
-        models = {}
-        if model_name:
-            models[model_name] = {
-                "name": config.get("display_name", "") or model_name,
-                "limit": {
-                    "context": config.get("context_limit", 200000),
-                    "output": config.get("output_limit", 64000),
-                },
+# ── 实际生效配置识别 ──────────────────────────────
+
+
+def live_config_report() -> dict:
+    """
+    报告各客户端实际生效的是哪个已保存配置，以及是否与 current_config_id 不一致
+
+    指纹索引仅在 config.json 被外部修改时整体重建；客户端读取按文件 mtime 缓存，
+    因此每个客户端的判断是一次缓存命中 + 一次字典查找。
+
+    Returns:
+        dict: {vendor: {current_config_id, live_config_id, drifted,
+                        clients: {client_key: {live_config_id, drifted, found}}}}
+    """
+    wb_doc = _wb_copy()
+    with _config_lock.read():
+        signature = _config_signature()
+        if not _fingerprints.is_synced(signature):
+            _fingerprints.rebuild(wb_doc if wb_doc is not None else _load_unlocked(), signature)
+
+    report = {}
+    for vendor in VENDOR_META:
+        current_id = _fingerprints.current(vendor)
+        clients = {}
+        for key in vendor_clients(vendor):
+            client = registry.get(key)
+            if not client:
+                continue
+            candidates = client.read_live()
+            live_id = _fingerprints.lookup(vendor, candidates, prefer=current_id)
+            clients[key] = {
+                "live_config_id": live_id,
+                "drifted": live_id != current_id,
+                "found": bool(candidates),
             }
-        return {
-            "api_key": api_key,
-            "base_url": api_url,
-            "provider_id": config.get("provider_id", "anthropic"),
-            "npm": config.get("npm", ""),
-            "display_name": config.get("display_name", ""),
-            "models": models,
+        live_ids = {c["live_config_id"] for c in clients.values()}
+        report[vendor] = {
+            "current_config_id": current_id,
+            # 所有客户端一致时才给出厂家级的生效配置
+            "live_config_id": live_ids.pop() if len(live_ids) == 1 else None,
+            "drifted": any(c["drifted"] for c in clients.values()),
+            "clients": clients,
         }
+    return report
+
+
+# ── 搜索 ──────────────────────────────────────────
 
-    return {}
+
+def search_configs(query: str, limit: int = 20, vendor: str | None = None) -> list[dict]:
+    """按名称/主机名/模型/provider 搜索配置（前缀与模糊匹配），结果不含 api_key"""
+    wb_doc = _wb_copy()
+    with _config_lock.read():
+        signature = _config_signature()
+        if not _search.is_synced(signature):
+            _search.rebuild(wb_doc if wb_doc is not None else _load_unlocked(), signature)
+    return _search.search(query, limit, vendor)
 
 
 # ── 客户端检测 ────────────────────────────────────
 
 
+def lock_stats() -> dict:
+    """config.json 读写锁与各厂家切换锁的争用统计，以及切换提交的冲突次数"""
+    return {
+        **_config_lock.stats(),
+        "cas": dict(_cas_stats),
+        "switch_locks": {vk: lock.stats()["modes"]["write"] for vk, lock in _switch_locks.items()},
+    }
+
+
 def detect_clients() -> dict[str, bool]:
-    return {key: client.detect() for key, client in ALL_CLIENTS.items()}
+    return {key: client.detect() for key, client in registry.items()}
@@ -0,0 +1,170 @@
+"""
+厂家配置模型 — 每个厂家一个 slots 数据类，读取时统一校验并补齐默认值
+
+config.json 与前端之间仍以 dict 交换（to_dict），写入客户端时使用模型的属性，
+不再在每次切换时逐字段 .get(键, 默认值)。本程序不认识的字段保存在 extra 中原样写回。
+"""
+
+import hashlib
+import json
+import re
+import uuid
+from dataclasses import dataclass, field, fields
+
+
+# 配置 id 会用作文件名（环境变量脚本、同步记录、预生成产物），只允许字母、数字、- 和 _
+SAFE_ID = re.compile(r"[A-Za-z0-9_-]{1,128}")
+
+
+def is_safe_id(value) -> bool:
+    """id 能否直接用作文件名（不含路径分隔符、点号等）"""
+    return isinstance(value, str) and SAFE_ID.fullmatch(value) is not None
+
+
+def _text(value, default: str = "") -> str:
+    if value is None:
+        return default
+    text = value.strip() if isinstance(value, str) else str(value)
+    return text or default
+
+
+def _timestamp(value, default: float = 0.0) -> float:
+    if isinstance(value, bool):
+        return default
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return default
+    return number if number > 0 else default
+
+
+def _positive_int(value, default: int) -> int:
+    if isinstance(value, bool):
+        return default
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        return default
+    return number if number > 0 else default
+
+
+@dataclass(slots=True)
+class VendorConfig:
+    """Claude / Gemini：地址、密钥、模型"""
+
+    id: str
+    name: str = ""
+    api_url: str = ""
+    api_key: str = ""
+    model: str = ""
+    updated_at: float = 0.0  # 最后保存时间，同步时按它决定哪一方胜出
+    extra: dict = field(default_factory=dict)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "VendorConfig":
+        """校验并规范化：字符串去空白，数值非法时回退默认值，缺少 id 时按内容生成稳定的 id"""
+        rules = _RULES[cls]
+        known, extra = {}, {}
+        for key, value in data.items():
+            if key in rules:
+                known[key] = rules[key](value)
+            elif key != "extra":
+                extra[key] = value
+        config_id = known.pop("id", "")
+        if not config_id:
+            content = json.dumps(data, sort_keys=True, ensure_ascii=False, default=str)
+            config_id = str(uuid.uuid5(uuid.NAMESPACE_URL, content))
+        return cls(id=config_id, extra=extra, **known)
+
+    def to_dict(self) -> dict:
+        """config.json / 前端使用的 dict（已知字段在前，extra 在后）"""
+        data = {name: getattr(self, name) for name in _RULES[type(self)]}
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+    def get(self, key: str, default=None):
+        """按键读取，兼容把配置当作 dict 使用的扩展客户端"""
+        if key in _RULES[type(self)]:
+            return getattr(self, key)
+        return self.extra.get(key, default)
+
+    def __getitem__(self, key: str):
+        if key in _RULES[type(self)]:
+            return getattr(self, key)
+        return self.extra[key]
+
+
+@dataclass(slots=True)
+class CodexConfig(VendorConfig):
+    provider_name: str = "custom"
+    reasoning_effort: str = "high"
+
+
+@dataclass(slots=True)
+class OpenCodeConfig(VendorConfig):
+    provider_id: str = "anthropic"  # 界面上留空表示 anthropic
+    npm: str = ""
+    display_name: str = ""
+    model_name: str = ""
+    context_limit: int = 200000
+    output_limit: int = 64000
+
+
+def _rules_for(cls) -> dict:
+    """字段 → 规范化函数（按 to_dict 的输出顺序；空值回退到字段默认值）"""
+    rules = {}
+    for f in fields(cls):
+        if f.name == "extra":
+            continue
+        if f.type in (int, "int"):
+            rules[f.name] = lambda v, d=f.default: _positive_int(v, d)
+        elif f.type in (float, "float"):
+            rules[f.name] = lambda v, d=f.default: _timestamp(v, d)
+        else:
+            default = "" if f.name == "id" else f.default
+            rules[f.name] = lambda v, d=default: _text(v, d)
+    return rules
+
+
+_RULES = {cls: _rules_for(cls) for cls in (VendorConfig, CodexConfig, OpenCodeConfig)}
+
+MODELS: dict[str, type[VendorConfig]] = {
+    "claude": VendorConfig,
+    "codex": CodexConfig,
+    "gemini": VendorConfig,
+    "opencode": OpenCodeConfig,
+}
+
+
+def parse(vendor: str, data) -> VendorConfig:
+    """dict → 该厂家的配置模型（已是模型时原样返回）"""
+    if isinstance(data, VendorConfig):
+        return data
+    return MODELS.get(vendor, VendorConfig).from_dict(data)
+
+
+def normalize(vendor: str, data: dict) -> dict:
+    """校验并补齐默认值后的 dict"""
+    return parse(vendor, data).to_dict()
+
+
+def normalize_configs(vendor: str, configs) -> list[dict]:
+    """规范化一个厂家的配置列表，跳过无法识别的条目"""
+    if not isinstance(configs, list):
+        print(f"[警告] {vendor} 的 configs 不是列表，已忽略")
+        return []
+    normalized = []
+    for item in configs:
+        if not isinstance(item, dict):
+            print(f"[警告] 忽略 {vendor} 下无法识别的配置条目: {item!r:.60}")
+            continue
+        normalized.append(normalize(vendor, item))
+    return normalized
+
+
+def content_hash(config: dict) -> str:
+    """配置内容的哈希（不含 updated_at）：内容相同的两份配置哈希相同，与保存时间无关"""
+    content = {k: v for k, v in config.items() if k != "updated_at"}
+    raw = json.dumps(content, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
@@ -0,0 +1,283 @@
+"""
+常驻守护进程 — 在内存中保存配置状态，通过本地 IPC 为 shell 提示符钩子和编辑器集成提供亚毫秒级查询
+
+用法：
+    python daemon.py serve                      # 启动守护进程
+    python daemon.py list                       # 列出所有厂家与配置
+    python daemon.py current claude             # 查询当前配置
+    python daemon.py switch claude "My Relay"   # 按名称或 id 切换
+    python daemon.py status                     # 各客户端实际生效配置/漂移状态
+
+协议：Unix 上为 Unix socket（默认 ~/.ai-switcher/codepivot.sock），每行一个 JSON 请求/响应，
+可直接用 `echo '{"cmd":"current","vendor":"claude"}' | nc -U ~/.ai-switcher/codepivot.sock` 查询；
+Windows 上为命名管道 \\\\.\\pipe\\codepivot-<用户名>（multiprocessing.connection 帧格式）。
+
+客户端部分只依赖标准库，不导入 config_manager，启动开销仅为解释器本身。
+"""
+
+import json
+import os
+import socket
+import sys
+import threading
+from pathlib import Path
+
+STATE_DIR = Path.home() / ".ai-switcher"
+SOCKET_PATH = STATE_DIR / "codepivot.sock"
+PIPE_NAME = r"\\.\pipe\codepivot-" + os.environ.get("USERNAME", "user")
+
+IS_WINDOWS = sys.platform == "win32"
+
+
+# ── 客户端 ──────────────────────────────────────
+
+
+def request(cmd: str, timeout: float = 2.0, address=None, **params) -> dict:
+    """
+    向守护进程发送一个请求并返回响应
+
+    Raises:
+        ConnectionError: 守护进程未运行
+    """
+    message = {"cmd": cmd, **params}
+    if IS_WINDOWS:
+        from multiprocessing.connection import Client
+
+        try:
+            conn = Client(address or PIPE_NAME, family="AF_PIPE")
+        except OSError as e:
+            raise ConnectionError(f"守护进程未运行: {e}")
+        with conn:
+            conn.send(message)
+            return conn.recv()
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(str(address or SOCKET_PATH))
+    except OSError as e:
+        sock.close()
+        raise ConnectionError(f"守护进程未运行: {e}")
+    with sock:
+        sock.sendall(json.dumps(message, ensure_ascii=False).encode("utf-8") + b"\n")
+        buf = b""
+        while not buf.endswith(b"\n"):
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            buf += chunk
+    return json.loads(buf.decode("utf-8"))
+
+
+# ── 服务端 ──────────────────────────────────────
+
+
+class DaemonState:
+    """
+    守护进程的内存状态：厂家/配置视图按 config.json 的变化失效，查询直接命中缓存
+
+    命令处理与传输层无关，GUI 单实例转发等场景也可以复用 handle()。
+    """
+
+    def __init__(self):
+        import config_manager as cm
+
+        self._cm = cm
+        self._lock = threading.Lock()
+        self._vendors: dict | None = None
+        self._encoded: dict[tuple, bytes] = {}
+        self._generation = 0
+        self._handlers = {
+            "ping": self._ping,
+            "list": self._list,
+            "current": self._current,
+            "switch": self._switch,
+            "status": self._status,
+        }
+
+    def invalidate(self, changed=None) -> None:
+        """文件变化回调：config.json 变化时丢弃缓存（客户端文件的读取本身按 mtime 缓存）"""
+        with self._lock:
+            self._vendors = None
+            self._encoded.clear()
+            self._generation += 1
+
+    def handle(self, message: dict) -> dict:
+        cmd = message.get("cmd", "")
+        handler = self._handlers.get(cmd)
+        if not handler:
+            return {"ok": False, "error": f"未知命令: {cmd}"}
+        try:
+            return {"ok": True, "result": handler(message)}
+        except Exception as e:
+            return {"ok": False, "error": str(e)}
+
+    def handle_line(self, line: bytes) -> bytes:
+        """处理一行 JSON 请求；只读命令的响应按参数缓存为已编码字节"""
+        try:
+            message = json.loads(line.decode("utf-8"))
+        except ValueError:
+            return b'{"ok": false, "error": "\\u8bf7\\u6c42\\u4e0d\\u662f\\u5408\\u6cd5 JSON"}\n'
+        cacheable = message.get("cmd") in ("list", "current")
+        key = (message.get("cmd"), message.get("vendor"))
+        if cacheable:
+            cached = self._encoded.get(key)
+            if cached is not None:
+                return cached
+        generation = self._generation
+        encoded = json.dumps(self.handle(message), ensure_ascii=False).encode("utf-8") + b"\n"
+        if cacheable:
+            with self._lock:
+                # 计算期间发生过失效则不缓存，避免把旧结果写回
+                if generation == self._generation:
+                    self._encoded[key] = encoded
+        return encoded
+
+    def _vendor_view(self) -> dict:
+        with self._lock:
+            if self._vendors is None:
+                self._vendors = self._cm.get_vendors()
+            return self._vendors
+
+    def _ping(self, message: dict) -> str:
+        return "pong"
+
+    def _list(self, message: dict) -> dict:
+        return {
+            vk: {
+                "display_name": v["display_name"],
+                "current_config_id": v["current_config_id"],
+                "configs": [{"id": c["id"], "name": c.get("name", "")} for c in v["configs"]],
+            }
+            for vk, v in self._vendor_view().items()
+        }
+
+    def _current(self, message: dict) -> dict | None:
+        vendor = message.get("vendor") or "claude"
+        v = self._vendor_view().get(vendor)
+        if v is None:
+            raise ValueError(f"未知厂家: {vendor}")
+        return next((c for c in v["configs"] if c["id"] == v["current_config_id"]), None)
+
+    def _switch(self, message: dict) -> dict:
+        vendor = message.get("vendor", "")
+        target = message.get("config", "")
+        v = self._vendor_view().get(vendor)
+        if v is None:
+            raise ValueError(f"未知厂家: {vendor}")
+        cfg = next(
+            (c for c in v["configs"] if target in (c["id"], c.get("name"))), None
+        )
+        if not cfg:
+            raise ValueError(f"未找到配置: {target}")
+        result = self._perform_switch(vendor, cfg["id"])
+        self.invalidate()
+        return result
+
+    def _perform_switch(self, vendor: str, config_id: str) -> dict:
+        return self._cm.switch_vendor_config(vendor, config_id)
+
+    def _status(self, message: dict) -> dict:
+        return self._cm.live_config_report()
+
+
+def serve(address=None) -> None:
+    """启动守护进程（阻塞），监听配置文件变化以失效缓存"""
+    import config_manager as cm
+    from file_watcher import FileWatcher
+
+    state = DaemonState()
+    watcher = FileWatcher(cm.watched_paths(), state.invalidate, debounce=0.05)
+    watcher.start()
+    try:
+        if IS_WINDOWS:
+            _serve_pipe(state, address or PIPE_NAME)
+        else:
+            _serve_unix(state, Path(address or SOCKET_PATH))
+    finally:
+        watcher.stop()
+
+
+def _serve_unix(state: DaemonState, path: Path) -> None:
+    import socketserver
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            for line in self.rfile:
+                if line.strip():
+                    self.wfile.write(state.handle_line(line))
+
+    class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if path.exists():
+        # 上次异常退出遗留的 socket 文件；若仍有进程在监听则不抢占
+        try:
+            request("ping", timeout=0.2, address=path)
+            raise RuntimeError(f"守护进程已在运行: {path}")
+        except ConnectionError:
+            path.unlink()
+    old_umask = os.umask(0o177)  # socket 仅当前用户可访问
+    try:
+        server = Server(str(path), Handler)
+    finally:
+        os.umask(old_umask)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        path.unlink(missing_ok=True)
+
+
+def _serve_pipe(state: DaemonState, address: str) -> None:
+    from multiprocessing.connection import Listener
+
+    def handle(conn):
+        with conn:
+            try:
+                while True:
+                    conn.send(state.handle(conn.recv()))
+            except (EOFError, OSError):
+                pass
+
+    with Listener(address, family="AF_PIPE") as listener:
+        while True:
+            conn = listener.accept()
+            threading.Thread(target=handle, args=(conn,), daemon=True).start()
+
+
+def main(argv: list[str] | None = None) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="CodePivot 守护进程与客户端")
+    sub = parser.add_subparsers(dest="command")
+    sub.add_parser("serve", help="启动守护进程")
+    sub.add_parser("list", help="列出所有厂家与配置")
+    p = sub.add_parser("current", help="查询当前配置")
+    p.add_argument("vendor", nargs="?", default="claude")
+    p = sub.add_parser("switch", help="切换配置（名称或 id）")
+    p.add_argument("vendor")
+    p.add_argument("config")
+    sub.add_parser("status", help="各客户端实际生效配置")
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        serve()
+        return 0
+    if not args.command:
+        parser.print_help()
+        return 1
+
+    params = {k: v for k, v in vars(args).items() if k != "command"}
+    try:
+        response = request(args.command, **params)
+    except ConnectionError as e:
+        print(e, file=sys.stderr)
+        return 2
+    print(json.dumps(response.get("result") if response.get("ok") else response, ensure_ascii=False, indent=2))
+    return 0 if response.get("ok") else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
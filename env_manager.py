@@ -4,8 +4,17 @@ import ctypes
 import json
 import os
 import subprocess
+import threading
 from pathlib import Path
 
+try:
+    import winreg
+except ImportError:  # 非 Windows
+    winreg = None
+
+import shell_env
+from clients import _atomic_write_text
+
 # 环境变量到厂商的映射
 VENDOR_ENV_MAP = {
     "claude": ["ANTHROPIC_AUTH_TOKEN", "ANTHROPIC_BASE_URL", "ANTHROPIC_MODEL"],
@@ -15,6 +24,29 @@ VENDOR_ENV_MAP = {
 }
 
 
+def env_mappings(vendor: str, profile_data: dict) -> dict[str, str]:
+    """
+    按厂商把配置映射为环境变量（值可能为空，调用方决定跳过还是清除）
+
+    配置中的地址字段是 api_url，兼容旧数据中的 base_url。
+    """
+    api_key = profile_data.get("api_key", "")
+    api_url = profile_data.get("api_url") or profile_data.get("base_url", "")
+    if vendor == "claude":
+        return {
+            "ANTHROPIC_AUTH_TOKEN": api_key,
+            "ANTHROPIC_BASE_URL": api_url,
+            "ANTHROPIC_MODEL": profile_data.get("model", ""),
+        }
+    if vendor == "codex":
+        return {"OPENAI_API_KEY": api_key}
+    if vendor == "gemini":
+        return {"GEMINI_API_KEY": api_key, "GOOGLE_GEMINI_BASE_URL": api_url}
+    if vendor == "opencode":
+        return {"OPNCODE_API_KEY": api_key, "OPNCODE_BASE_URL": api_url}
+    return {}
+
+
 def _is_admin() -> bool:
     """检查是否以管理员权限运行"""
     try:
@@ -59,16 +91,105 @@ def _remove_system_env_var(name: str) -> bool:
         return False
 
 
-def deploy_to_env_vars(vendor: str, profile_data: dict) -> dict:
+# ── 用户环境变量快照 ──────────────────────────────
+#
+# 受管变量（VENDOR_ENV_MAP 中的全部变量）的值缓存在内存中：部署/清除成功后同步更新，
+# 其他程序修改 HKCU\Environment 时由注册表变更通知清空，也可调用 refresh_env_state() 强制重读。
+
+_env_lock = threading.Lock()
+_env_state: dict[str, str] | None = None
+_env_watcher: threading.Thread | None = None
+
+
+def _managed_vars() -> list[str]:
+    return [name for names in VENDOR_ENV_MAP.values() for name in names]
+
+
+def _read_user_env(names: list[str]) -> dict[str, str]:
+    """读取用户级环境变量；有 winreg 时直接读 HKCU\Environment，否则逐个经 PowerShell 查询"""
+    if winreg is None:
+        return {name: _get_registry_env_var(name) for name in names}
+    values = {name: "" for name in names}
+    try:
+        with winreg.OpenKey(winreg.HKEY_CURRENT_USER, "Environment") as key:
+            for name in names:
+                try:
+                    values[name] = str(winreg.QueryValueEx(key, name)[0])
+                except FileNotFoundError:
+                    pass
+    except OSError:
+        pass
+    return values
+
+
+def _watch_user_env() -> None:
+    """等待 HKCU\Environment 的变更通知，每次变更后清空快照"""
+    REG_NOTIFY_CHANGE_LAST_SET = 0x4
+    try:
+        advapi32 = ctypes.windll.advapi32
+        key = winreg.OpenKey(winreg.HKEY_CURRENT_USER, "Environment", 0, winreg.KEY_NOTIFY)
+    except (AttributeError, OSError):
+        return
+    with key:
+        while advapi32.RegNotifyChangeKeyValue(
+            int(key), False, REG_NOTIFY_CHANGE_LAST_SET, None, False
+        ) == 0:
+            invalidate_env_state()
+
+
+def _ensure_env_watcher() -> None:
+    global _env_watcher
+    if winreg is None or _env_watcher is not None:
+        return
+    _env_watcher = threading.Thread(target=_watch_user_env, name="env-watcher", daemon=True)
+    _env_watcher.start()
+
+
+def env_state() -> dict[str, str]:
+    """受管变量的当前值（缓存快照的副本；空字符串表示未设置）"""
+    global _env_state
+    with _env_lock:
+        if _env_state is None:
+            _ensure_env_watcher()
+            _env_state = _read_user_env(_managed_vars())
+        return dict(_env_state)
+
+
+def invalidate_env_state() -> None:
+    """清空快照，下次读取时重新查询（变更通知回调）"""
+    global _env_state
+    with _env_lock:
+        _env_state = None
+
+
+def refresh_env_state() -> dict[str, str]:
+    """强制重新读取受管变量"""
+    invalidate_env_state()
+    return env_state()
+
+
+def _remember_env(name: str, value: str) -> None:
+    """本程序写入成功后同步快照，避免下次读取再查询一遍"""
+    with _env_lock:
+        if _env_state is not None:
+            _env_state[name] = value
+
+
+def deploy_to_env_vars(
+    vendor: str, profile_data: dict, progress=None, cancelled=None
+) -> dict:
     """
     将配置部署到系统环境变量
 
     Args:
         vendor: 厂商标识 (claude/codex/gemini/opencode)
         profile_data: 配置数据
+        progress: 可选回调，每个变量处理后收到 {"stage": "env", "var", "status"} 事件
+        cancelled: 可选函数，返回 True 时跳过剩余变量
 
     Returns:
-        dict: {"success": bool, "message": str, "set_vars": list, "failed_vars": list}
+        dict: {"success": bool, "message": str, "set_vars": list, "failed_vars": list,
+               "unchanged_vars": list}
     """
     if vendor not in VENDOR_ENV_MAP:
         return {
@@ -76,56 +197,54 @@ def deploy_to_env_vars(vendor: str, profile_data: dict) -> dict:
             "message": f"不支持的厂商: {vendor}",
             "set_vars": [],
             "failed_vars": [],
+            "unchanged_vars": [],
         }
 
-    env_vars = VENDOR_ENV_MAP[vendor]
     set_vars = []
     failed_vars = []
+    unchanged_vars = []
+    mappings = env_mappings(vendor, profile_data)
+    current = env_state()
 
-    # 根据厂商构建环境变量映射
-    if vendor == "claude":
-        mappings = {
-            "ANTHROPIC_AUTH_TOKEN": profile_data.get("api_key", ""),
-            "ANTHROPIC_BASE_URL": profile_data.get("api_url", ""),
-            "ANTHROPIC_MODEL": profile_data.get("model", ""),
-        }
-    elif vendor == "codex":
-        mappings = {
-            "OPENAI_API_KEY": profile_data.get("api_key", ""),
-        }
-    elif vendor == "gemini":
-        mappings = {
-            "GEMINI_API_KEY": profile_data.get("api_key", ""),
-            "GOOGLE_GEMINI_BASE_URL": profile_data.get("base_url", ""),
-        }
-    elif vendor == "opencode":
-        mappings = {
-            "OPNCODE_API_KEY": profile_data.get("api_key", ""),
-            "OPNCODE_BASE_URL": profile_data.get("base_url", ""),
-        }
-    else:
-        mappings = {}
-
-    # 设置环境变量
+    # 只写入值有变化的变量（例如两个配置共用同一地址时只改密钥）
     for var_name, var_value in mappings.items():
-        if var_value:  # 只设置有值的变量
-            if _set_system_env_var(var_name, var_value):
-                set_vars.append(var_name)
-            else:
-                failed_vars.append(var_name)
+        if not var_value:  # 只设置有值的变量
+            continue
+        if current.get(var_name) == var_value:
+            unchanged_vars.append(var_name)
+            if progress:
+                progress({"stage": "env", "var": var_name, "status": "unchanged"})
+            continue
+        if cancelled and cancelled():
+            if progress:
+                progress({"stage": "env", "var": var_name, "status": "cancelled"})
+            continue
+        if _set_system_env_var(var_name, var_value):
+            _remember_env(var_name, var_value)
+            set_vars.append(var_name)
+            status = "set"
+        else:
+            failed_vars.append(var_name)
+            status = "failed"
+        if progress:
+            progress({"stage": "env", "var": var_name, "status": status})
 
     success = len(failed_vars) == 0
-    message = (
-        f"成功设置 {len(set_vars)} 个环境变量"
-        if success
-        else f"部分失败: {len(set_vars)} 成功, {len(failed_vars)} 失败"
-    )
+    if not success:
+        message = f"部分失败: {len(set_vars)} 成功, {len(failed_vars)} 失败"
+    elif not set_vars and unchanged_vars:
+        message = "环境变量均未变化（unchanged）"
+    else:
+        message = f"成功设置 {len(set_vars)} 个环境变量"
+        if unchanged_vars:
+            message += f"，{len(unchanged_vars)} 个未变化"
 
     return {
         "success": success,
         "message": message,
         "set_vars": set_vars,
         "failed_vars": failed_vars,
+        "unchanged_vars": unchanged_vars,
     }
 
 
@@ -147,7 +266,7 @@ def _get_registry_env_var(name: str) -> str:
 
 def get_env_vars_status(vendor: str) -> dict:
     """
-    获取环境变量当前状态（从注册表读取，确保与 deploy 结果一致）
+    获取环境变量当前状态（注册表快照，与 deploy 结果一致；refresh_env_state() 强制重读）
 
     Args:
         vendor: 厂商标识
@@ -158,11 +277,8 @@ def get_env_vars_status(vendor: str) -> dict:
     if vendor not in VENDOR_ENV_MAP:
         return {}
 
-    result = {}
-    for var_name in VENDOR_ENV_MAP[vendor]:
-        result[var_name] = _get_registry_env_var(var_name)
-
-    return result
+    current = env_state()
+    return {var_name: current.get(var_name, "") for var_name in VENDOR_ENV_MAP[vendor]}
 
 
 def remove_env_vars(vendor: str) -> dict:
@@ -183,9 +299,11 @@ def remove_env_vars(vendor: str) -> dict:
         }
 
     removed_vars = []
+    current = env_state()
     for var_name in VENDOR_ENV_MAP[vendor]:
-        if _get_registry_env_var(var_name):
+        if current.get(var_name):
             if _remove_system_env_var(var_name):
+                _remember_env(var_name, "")
                 removed_vars.append(var_name)
 
     return {
@@ -215,19 +333,14 @@ def generate_batch_script(
     # 根据厂商生成环境变量设置命令
     lines = ["@echo off", "echo 设置环境变量...", ""]
 
+    for var_name, var_value in env_mappings(vendor, profile_data).items():
+        if var_value:
+            lines.append(f"set {var_name}={var_value}")
     if vendor == "claude":
-        if profile_data.get("api_key"):
-            lines.append(f"set ANTHROPIC_AUTH_TOKEN={profile_data['api_key']}")
-        if profile_data.get("api_url"):
-            lines.append(f"set ANTHROPIC_BASE_URL={profile_data['api_url']}")
-        if profile_data.get("model"):
-            lines.append(f"set ANTHROPIC_MODEL={profile_data['model']}")
         lines.append("")
         lines.append("echo 启动 Claude CLI...")
         lines.append("claude")
     elif vendor == "codex":
-        if profile_data.get("api_key"):
-            lines.append(f"set OPENAI_API_KEY={profile_data['api_key']}")
         lines.append("")
         lines.append("echo 启动 Codex CLI...")
         lines.append("codex")
@@ -236,3 +349,65 @@ def generate_batch_script(
 
     output_path.write_text("\n".join(lines), encoding="utf-8")
     return output_path
+
+
+# ── 终端环境变量脚本 ──────────────────────────────
+
+
+def _quote_sh(value: str) -> str:
+    return "'" + value.replace("'", "'\\''") + "'"
+
+
+def _quote_fish(value: str) -> str:
+    return "'" + value.replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+
+def render_env_script(vendor: str, profile_data: dict, ext: str) -> str:
+    """
+    生成可直接 source 的脚本：有值的变量导出，空值的变量清除（避免残留上一个配置的值）
+
+    Args:
+        ext: 脚本类型 sh（bash/zsh）/ fish / ps1（PowerShell）
+    """
+    lines = [shell_env.header(vendor, profile_data.get("name", ""))]
+    for name, value in env_mappings(vendor, profile_data).items():
+        if ext == "sh":
+            lines.append(f"export {name}={_quote_sh(value)}" if value else f"unset {name}")
+        elif ext == "fish":
+            lines.append(f"set -gx {name} {_quote_fish(value)}" if value else f"set -e {name}")
+        else:
+            lines.append(
+                f"$env:{name} = '{_escape_powershell_string(value)}'"
+                if value
+                else f"Remove-Item Env:{name} -ErrorAction SilentlyContinue"
+            )
+    return "\n".join(lines) + "\n"
+
+
+def write_env_scripts(vendor: str, profile_data: dict, current: bool = False) -> list[Path]:
+    """
+    为一个配置写出所有 shell 的脚本：current=True 时写 current.*，否则写 <配置 id>.*
+
+    脚本包含 API 密钥，临时文件以 0600 权限创建后原子替换。
+    """
+    if vendor not in VENDOR_ENV_MAP:
+        return []
+    name = shell_env.CURRENT if current else profile_data["id"]
+    written = []
+    for ext in sorted(set(shell_env.SHELL_EXT.values())):
+        path = shell_env.snippet_path(vendor, name, ext)
+        _atomic_write_text(path, render_env_script(vendor, profile_data, ext))
+        written.append(path)
+    return written
+
+
+def remove_env_scripts(vendor: str, config_id: str, current: bool = False) -> None:
+    """删除某个配置已生成的脚本（内容过期或配置被删除）；current=True 时一并删除 current.*"""
+    names = [config_id] + ([shell_env.CURRENT] if current else [])
+    for ext in set(shell_env.SHELL_EXT.values()):
+        for name in names:
+            try:
+                shell_env.snippet_path(vendor, name, ext).unlink(missing_ok=True)
+            except (OSError, ValueError):
+                # 非法 id 不会有对应的脚本
+                pass
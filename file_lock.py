@@ -0,0 +1,199 @@
+"""跨进程读写锁 — 基于文件锁的共享/排他模式（POSIX flock / Windows LockFileEx），附带争用统计"""
+
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable
+
+if sys.platform == "win32":
+    import ctypes
+    import msvcrt
+    from ctypes import wintypes
+
+    _LOCKFILE_FAIL_IMMEDIATELY = 0x1
+    _LOCKFILE_EXCLUSIVE_LOCK = 0x2
+
+    class _OVERLAPPED(ctypes.Structure):
+        _fields_ = [
+            ("Internal", ctypes.c_void_p),
+            ("InternalHigh", ctypes.c_void_p),
+            ("Offset", wintypes.DWORD),
+            ("OffsetHigh", wintypes.DWORD),
+            ("hEvent", wintypes.HANDLE),
+        ]
+
+    _kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+    _LockFileEx = _kernel32.LockFileEx
+    _LockFileEx.argtypes = [
+        wintypes.HANDLE,
+        wintypes.DWORD,
+        wintypes.DWORD,
+        wintypes.DWORD,
+        wintypes.DWORD,
+        ctypes.POINTER(_OVERLAPPED),
+    ]
+    _LockFileEx.restype = wintypes.BOOL
+    _UnlockFileEx = _kernel32.UnlockFileEx
+    _UnlockFileEx.argtypes = [
+        wintypes.HANDLE,
+        wintypes.DWORD,
+        wintypes.DWORD,
+        wintypes.DWORD,
+        ctypes.POINTER(_OVERLAPPED),
+    ]
+    _UnlockFileEx.restype = wintypes.BOOL
+
+    def _os_lock(fd: int, exclusive: bool, blocking: bool) -> bool:
+        flags = _LOCKFILE_EXCLUSIVE_LOCK if exclusive else 0
+        if not blocking:
+            flags |= _LOCKFILE_FAIL_IMMEDIATELY
+        handle = msvcrt.get_osfhandle(fd)
+        ok = _LockFileEx(handle, flags, 0, 1, 0, ctypes.byref(_OVERLAPPED()))
+        if not ok and blocking:
+            raise ctypes.WinError(ctypes.get_last_error())
+        return bool(ok)
+
+    def _os_unlock(fd: int) -> None:
+        handle = msvcrt.get_osfhandle(fd)
+        _UnlockFileEx(handle, 0, 1, 0, ctypes.byref(_OVERLAPPED()))
+
+else:
+    import fcntl
+
+    def _os_lock(fd: int, exclusive: bool, blocking: bool) -> bool:
+        # flock 锁归属于打开的文件描述，同进程内不同线程各自 open 也会互斥
+        op = fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH
+        if not blocking:
+            op |= fcntl.LOCK_NB
+        try:
+            fcntl.flock(fd, op)
+            return True
+        except BlockingIOError:
+            return False
+
+    def _os_unlock(fd: int) -> None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+
+
+class RWFileLock:
+    """
+    跨进程读写锁
+
+    read() 为共享模式，多个读者（无论在哪个进程）可并行；write() 为排他模式。
+    同一线程内可重入：已持有写锁时再获取读/写锁直接复用；持有读锁时不能升级为写锁。
+
+    Args:
+        path: 锁文件路径，或返回路径的函数（路径可能在运行时被替换）
+    """
+
+    def __init__(self, path: Path | Callable[[], Path]):
+        self._path = path
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self._holders: dict[int, dict] = {}
+        self._stats = {
+            mode: {"acquisitions": 0, "contended": 0, "wait_total_ms": 0.0, "wait_max_ms": 0.0}
+            for mode in ("read", "write")
+        }
+        self._last_contention: dict | None = None
+
+    @property
+    def path(self) -> Path:
+        return self._path() if callable(self._path) else self._path
+
+    @contextmanager
+    def read(self):
+        with self._acquire(exclusive=False):
+            yield
+
+    @contextmanager
+    def write(self):
+        with self._acquire(exclusive=True):
+            yield
+
+    def stats(self) -> dict:
+        """争用统计：各模式的获取次数、争用次数、等待时间，以及当前持有者"""
+        with self._stats_lock:
+            return {
+                "path": str(self.path),
+                "modes": {m: dict(s) for m, s in self._stats.items()},
+                "holders": list(self._holders.values()),
+                "last_contention": dict(self._last_contention) if self._last_contention else None,
+            }
+
+    @contextmanager
+    def _acquire(self, exclusive: bool):
+        held = getattr(self._local, "mode", None)
+        if held == "write" or (held == "read" and not exclusive):
+            # 同线程重入
+            yield
+            return
+        if held == "read":
+            raise RuntimeError("持有读锁时不能升级为写锁")
+
+        mode = "write" if exclusive else "read"
+        path = self.path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(str(path), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            start = time.perf_counter()
+            contended = not _os_lock(fd, exclusive, blocking=False)
+            if contended:
+                holder = self._read_holder(fd)
+                _os_lock(fd, exclusive, blocking=True)
+            waited_ms = (time.perf_counter() - start) * 1000
+
+            ident = threading.get_ident()
+            with self._stats_lock:
+                s = self._stats[mode]
+                s["acquisitions"] += 1
+                s["wait_total_ms"] += waited_ms
+                s["wait_max_ms"] = max(s["wait_max_ms"], waited_ms)
+                if contended:
+                    s["contended"] += 1
+                    self._last_contention = {
+                        "mode": mode,
+                        "waited_ms": round(waited_ms, 3),
+                        "blocked_by": holder,
+                        "at": time.time(),
+                    }
+                self._holders[ident] = {
+                    "pid": os.getpid(),
+                    "thread": threading.current_thread().name,
+                    "mode": mode,
+                    "since": time.time(),
+                }
+            if exclusive:
+                self._write_holder(fd)
+
+            self._local.mode = mode
+            try:
+                yield
+            finally:
+                self._local.mode = None
+                with self._stats_lock:
+                    self._holders.pop(ident, None)
+                _os_unlock(fd)
+        finally:
+            os.close(fd)
+
+    def _write_holder(self, fd: int) -> None:
+        """排他持有者把自身信息写入锁文件，供其他进程在争用时查看"""
+        info = f"{os.getpid()} {threading.current_thread().name} {time.time():.3f}"
+        try:
+            os.ftruncate(fd, 0)
+            os.lseek(fd, 0, os.SEEK_SET)
+            os.write(fd, info.encode("utf-8"))
+        except OSError:
+            pass
+
+    def _read_holder(self, fd: int) -> str:
+        """读取最近一个写者的信息（共享持有者不记录，可能为空或已过期）"""
+        try:
+            os.lseek(fd, 0, os.SEEK_SET)
+            return os.read(fd, 256).decode("utf-8", errors="replace").strip()
+        except OSError:
+            return ""
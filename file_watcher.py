@@ -0,0 +1,231 @@
+"""配置文件监听 — Linux 下使用 inotify，其他平台回退到轮询，变更经过防抖后回调"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+import traceback
+from pathlib import Path
+from typing import Callable, Iterable
+
+# inotify 事件掩码（见 <sys/inotify.h>）
+_IN_MODIFY = 0x00000002
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_DELETE_SELF = 0x00000400
+_IN_MOVE_SELF = 0x00000800
+_IN_IGNORED = 0x00008000
+_WATCH_MASK = (
+    _IN_MODIFY
+    | _IN_CLOSE_WRITE
+    | _IN_MOVED_FROM
+    | _IN_MOVED_TO
+    | _IN_CREATE
+    | _IN_DELETE
+    | _IN_DELETE_SELF
+    | _IN_MOVE_SELF
+)
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+def _stat_signature(path: Path) -> tuple | None:
+    """文件签名 (inode, 大小, mtime)，不存在返回 None"""
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+class _Inotify:
+    """最小化的 inotify ctypes 封装（监听目录，按文件名过滤）"""
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or None, use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+        self.dirs: dict[int, Path] = {}
+
+    def add_dir(self, directory: Path) -> bool:
+        if directory in self.dirs.values():
+            return True
+        wd = self._add_watch(self.fd, os.fsencode(str(directory)), _WATCH_MASK)
+        if wd < 0:
+            return False
+        self.dirs[wd] = directory
+        return True
+
+    def read(self) -> list[tuple[Path, str]]:
+        """读取待处理事件，返回 [(目录, 文件名)]；目录自身被删除时文件名为空"""
+        try:
+            buf = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(buf):
+            wd, mask, _cookie, length = _EVENT_HEADER.unpack_from(buf, offset)
+            offset += _EVENT_HEADER.size
+            name = buf[offset : offset + length].rstrip(b"\0")
+            offset += length
+            directory = self.dirs.get(wd)
+            if directory is None:
+                continue
+            if mask & _IN_IGNORED:
+                # 目录被删除或移走，watch 已失效，交由轮询重新建立
+                self.dirs.pop(wd, None)
+                events.append((directory, ""))
+                continue
+            events.append((directory, os.fsdecode(name)))
+        return events
+
+    def close(self) -> None:
+        try:
+            os.close(self.fd)
+        except OSError:
+            pass
+
+
+class FileWatcher:
+    """
+    监听一组文件的外部修改
+
+    Args:
+        paths: 需要监听的文件路径
+        callback: 防抖结束后以 set[Path]（实际发生变化的文件）回调，在监听线程中执行
+        debounce: 最后一次事件后等待多久再回调（秒），合并编辑器的连续写入
+        poll_interval: 轮询间隔（秒），inotify 不可用时的主要手段，可用时作为兜底
+    """
+
+    def __init__(
+        self,
+        paths: Iterable[Path],
+        callback: Callable[[set[Path]], None],
+        debounce: float = 0.3,
+        poll_interval: float = 1.0,
+    ):
+        self._paths = {Path(p) for p in paths}
+        self._callback = callback
+        self._debounce = debounce
+        self._poll_interval = poll_interval
+        self._signatures = {p: _stat_signature(p) for p in self._paths}
+        self._pending: set[Path] = set()
+        self._last_event = 0.0
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._inotify: _Inotify | None = None
+        self._wake_r = self._wake_w = -1
+
+    @property
+    def backend(self) -> str:
+        return "inotify" if self._inotify else "polling"
+
+    def start(self) -> "FileWatcher":
+        if self._thread:
+            return self
+        if sys.platform.startswith("linux"):
+            try:
+                self._inotify = _Inotify()
+                self._wake_r, self._wake_w = os.pipe()
+            except (OSError, AttributeError):
+                self._inotify = None  # 内核/容器不支持时回退到轮询
+        self._watch_parents()
+        self._thread = threading.Thread(
+            target=self._run, name="config-file-watcher", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._wake_w >= 0:
+            os.write(self._wake_w, b"\0")
+        if self._thread:
+            self._thread.join(timeout=2)
+            self._thread = None
+        if self._inotify:
+            self._inotify.close()
+            self._inotify = None
+        for fd in (self._wake_r, self._wake_w):
+            if fd >= 0:
+                os.close(fd)
+        self._wake_r = self._wake_w = -1
+
+    def _watch_parents(self) -> None:
+        """为已存在的父目录建立 inotify watch（目录稍后创建时由轮询补上）"""
+        if not self._inotify:
+            return
+        for path in self._paths:
+            if path.parent.is_dir():
+                self._inotify.add_dir(path.parent)
+
+    def _run(self) -> None:
+        next_poll = time.monotonic() + self._poll_interval
+        while not self._stop.is_set():
+            now = time.monotonic()
+            timeout = next_poll - now
+            if self._pending:
+                timeout = min(timeout, self._last_event + self._debounce - now)
+            ready = []
+            if self._inotify:
+                try:
+                    ready, _, _ = select.select(
+                        [self._wake_r, self._inotify.fd], [], [], max(timeout, 0)
+                    )
+                except (OSError, ValueError):
+                    break
+            else:
+                # Windows 上 select 不支持管道，轮询模式直接等待
+                self._stop.wait(max(timeout, 0))
+            if self._stop.is_set():
+                break
+
+            if self._inotify and self._inotify.fd in ready:
+                for directory, name in self._inotify.read():
+                    for path in self._paths:
+                        if path.parent == directory and (not name or path.name == name):
+                            self._mark(path)
+
+            now = time.monotonic()
+            if now >= next_poll:
+                next_poll = now + self._poll_interval
+                # 轮询同时兜底 inotify 建立 watch 之前漏掉的变化
+                self._watch_parents()
+                for path in self._paths:
+                    if path not in self._pending and _stat_signature(
+                        path
+                    ) != self._signatures.get(path):
+                        self._mark(path)
+
+            if self._pending and now - self._last_event >= self._debounce:
+                self._flush()
+
+    def _mark(self, path: Path) -> None:
+        self._pending.add(path)
+        self._last_event = time.monotonic()
+
+    def _flush(self) -> None:
+        """比对签名，只回调真正变化的文件（过滤掉无内容变化的事件）"""
+        changed = set()
+        for path in self._pending:
+            sig = _stat_signature(path)
+            if sig != self._signatures.get(path):
+                self._signatures[path] = sig
+                changed.add(path)
+        self._pending.clear()
+        if not changed:
+            return
+        try:
+            self._callback(changed)
+        except Exception:
+            traceback.print_exc()
@@ -0,0 +1,120 @@
+"""连接参数指纹索引 — 将 (api_url, api_key, model) 的哈希映射到已保存的配置 id"""
+
+import hashlib
+import threading
+
+
+def fingerprint(api_url: str, api_key: str, model: str) -> str:
+    """计算连接参数指纹（URL 去掉结尾斜杠，避免书写差异导致误判）"""
+    raw = "\0".join(
+        [(api_url or "").strip().rstrip("/"), (api_key or "").strip(), (model or "").strip()]
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+
+def config_fingerprint(vendor: str, config: dict) -> str:
+    """已保存配置的指纹；OpenCode 写入客户端的模型名是 model_name（为空时回退到 model）"""
+    model = config.get("model", "")
+    if vendor == "opencode":
+        model = config.get("model_name", "") or model
+    return fingerprint(config.get("api_url", ""), config.get("api_key", ""), model)
+
+
+class FingerprintIndex:
+    """
+    按厂家维护的指纹 → 配置 id 索引
+
+    保存/删除时增量更新；config.json 被外部修改（签名不一致）时才整体重建。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # 厂家 → 指纹 → 该指纹下的配置 id（dict 作有序集合，按保存顺序）；
+        # 连接参数相同的配置可能有多个（如 Codex 配置只差 reasoning_effort）
+        self._by_fp: dict[str, dict[str, dict[str, None]]] = {}
+        self._by_id: dict[str, dict[str, str]] = {}
+        self._current: dict[str, str | None] = {}
+        self._signature = None
+
+    def is_synced(self, signature) -> bool:
+        return signature is not None and signature == self._signature
+
+    def rebuild(self, data: dict, signature) -> None:
+        """根据完整配置重建索引"""
+        with self._lock:
+            self._by_fp = {}
+            self._by_id = {}
+            self._current = {}
+            for vendor, vendor_data in data.get("vendors", {}).items():
+                self._current[vendor] = vendor_data.get("current_config_id")
+                for cfg in vendor_data.get("configs", []):
+                    self._upsert_unlocked(vendor, cfg)
+            self._signature = signature
+
+    def upsert(self, vendor: str, config: dict, before=None, after=None) -> None:
+        """新增或更新单个配置；before/after 为本次写入前后 config.json 的签名"""
+        with self._lock:
+            self._upsert_unlocked(vendor, config)
+            self._advance(before, after)
+
+    def remove(self, vendor: str, config_id: str, before=None, after=None) -> None:
+        with self._lock:
+            self._remove_unlocked(vendor, config_id)
+            if self._current.get(vendor) == config_id:
+                self._current[vendor] = None
+            self._advance(before, after)
+
+    def set_current(self, vendor: str, config_id: str | None, before=None, after=None) -> None:
+        """记录切换后的 current_config_id（连接参数本身未变化）"""
+        with self._lock:
+            self._current[vendor] = config_id
+            self._advance(before, after)
+
+    def current(self, vendor: str) -> str | None:
+        return self._current.get(vendor)
+
+    def lookup(self, vendor: str, candidates: list[dict], prefer: str | None = None) -> str | None:
+        """
+        在候选连接参数中查找匹配的配置 id
+
+        Args:
+            candidates: 客户端读取到的 [{"api_url", "api_key", "model"}]
+            prefer: 多个配置均命中时优先返回的配置 id（通常是 current_config_id）
+        """
+        by_fp = self._by_fp.get(vendor, {})
+        first = None
+        for cand in candidates:
+            ids = by_fp.get(
+                fingerprint(cand.get("api_url", ""), cand.get("api_key", ""), cand.get("model", ""))
+            )
+            if not ids:
+                continue
+            if prefer in ids:
+                return prefer
+            if first is None:
+                first = next(iter(ids))
+        return first
+
+    def _advance(self, before, after) -> None:
+        # 只有写入前索引已同步时才能直接推进签名，否则留待下次整体重建
+        if self.is_synced(before):
+            self._signature = after
+
+    def _upsert_unlocked(self, vendor: str, config: dict) -> None:
+        cid = config.get("id")
+        if not cid:
+            return
+        self._remove_unlocked(vendor, cid)
+        fp = config_fingerprint(vendor, config)
+        self._by_fp.setdefault(vendor, {}).setdefault(fp, {})[cid] = None
+        self._by_id.setdefault(vendor, {})[cid] = fp
+
+    def _remove_unlocked(self, vendor: str, config_id: str) -> None:
+        fp = self._by_id.get(vendor, {}).pop(config_id, None)
+        if fp is None:
+            return
+        ids = self._by_fp.get(vendor, {}).get(fp)
+        if ids is not None:
+            ids.pop(config_id, None)
+            if not ids:
+                del self._by_fp[vendor][fp]
@@ -0,0 +1,170 @@
+"""
+批量部署 — 把一个厂家配置并发写入多个用户主目录（共享构建机、开发容器等场景）
+
+以 root 运行时不直接操作他人的主目录：每个主目录在子进程中以其所有者的 uid/gid 写入，
+主目录中预先放置的符号链接（如 ~/.claude -> /etc）因此无法让 root 写入或读取目标之外的文件。
+无法启动子进程时（打包版）退回本进程写入，拒绝任何符号链接路径，并用 lchown 归还所有权。
+"""
+
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import config_manager as cm
+import config_models
+from client_registry import registry
+
+# 单个主目录的子进程写入超时（秒）
+CHILD_TIMEOUT = 120
+
+
+def _foreign_owner(home: Path) -> tuple[int, int] | None:
+    """以 root 运行且主目录属于其他用户时返回其 (uid, gid)，否则 None"""
+    if not hasattr(os, "geteuid") or os.geteuid() != 0:
+        return None
+    st = home.stat()
+    return None if st.st_uid == 0 else (st.st_uid, st.st_gid)
+
+
+def _refuse_symlinks(home: Path, paths: list[Path]) -> None:
+    """从主目录到各路径（含其本身）的任何一级是符号链接都拒绝写入"""
+    for path in paths:
+        node = path
+        while node != home and home in node.parents:
+            if node.is_symlink():
+                raise PermissionError(f"拒绝写入符号链接路径: {node}")
+            node = node.parent
+
+
+def _chown_like_home(home: Path, owner: tuple[int, int], paths: list[Path]) -> None:
+    """以 root 身份写入他人主目录后，把新写入的文件及其上级目录归还给主目录的所有者（不跟随符号链接）"""
+    uid, gid = owner
+    for path in paths:
+        node = path
+        while node != home and home in node.parents:
+            try:
+                st = node.lstat()
+                if st.st_uid != uid:
+                    os.chown(node, uid, gid, follow_symlinks=False)
+            except OSError:
+                pass
+            node = node.parent
+
+
+def _apply_clients(vendor: str, model, home: Path, backup: bool, owner: tuple[int, int] | None) -> dict:
+    """在本进程中写入一个主目录；owner 不为 None 表示以 root 身份代写他人的主目录"""
+    clients = {}
+    for key in cm.vendor_clients(vendor):
+        try:
+            client = registry.create(key, home=home)
+            if owner is not None:
+                _refuse_symlinks(home, client.config_paths + [client.backup_dir])
+            backed = client.backup() if backup else []
+            client.apply(client.build_data(model))
+            if owner is not None:
+                _chown_like_home(home, owner, client.config_paths + [Path(p) for p in backed])
+            clients[key] = "ok"
+        except Exception as e:
+            clients[key] = str(e)
+    return clients
+
+
+def _apply_as_owner(vendor: str, config: dict, home: Path, backup: bool, owner: tuple[int, int]) -> dict:
+    """在以主目录所有者身份运行的子进程中写入（见模块说明）"""
+    request = {"vendor": vendor, "config": config, "home": str(home), "backup": backup}
+    try:
+        proc = subprocess.run(
+            [sys.executable, str(Path(__file__).resolve()), "--apply-home"],
+            input=json.dumps(request, ensure_ascii=False),
+            capture_output=True,
+            text=True,
+            encoding="utf-8",
+            timeout=CHILD_TIMEOUT,
+            user=owner[0],
+            group=owner[1],
+            extra_groups=[],
+            cwd=home,
+            env={**os.environ, "HOME": str(home)},
+        )
+    except (OSError, subprocess.SubprocessError) as e:
+        return {"*": f"无法以主目录所有者身份写入: {e}"}
+    lines = proc.stdout.strip().splitlines()
+    try:
+        return json.loads(lines[-1])
+    except (IndexError, ValueError):
+        detail = (proc.stderr.strip().splitlines() or [f"退出码 {proc.returncode}"])[-1]
+        return {"*": f"子进程写入失败: {detail}"}
+
+
+def apply_to_home(vendor: str, config: dict, home: Path, backup: bool = True) -> dict:
+    """
+    把配置写入一个主目录下该厂家的所有客户端
+
+    Returns:
+        dict: {"home", "success", "clients": {client_key: "ok" 或错误信息}, "elapsed_ms"}
+    """
+    start = time.perf_counter()
+    home = Path(home)
+    if not home.is_dir():
+        clients = {"*": "主目录不存在"}
+    else:
+        owner = _foreign_owner(home)
+        if owner is not None and not getattr(sys, "frozen", False):
+            clients = _apply_as_owner(vendor, config, home, backup, owner)
+        else:
+            clients = _apply_clients(vendor, config_models.parse(vendor, config), home, backup, owner)
+    return {
+        "home": str(home),
+        "success": bool(clients) and all(v == "ok" for v in clients.values()),
+        "clients": clients,
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 2),
+    }
+
+
+def apply_to_homes(
+    vendor: str, config: dict, homes: list[Path], max_workers: int = 8, backup: bool = True
+) -> dict:
+    """
+    并发把配置写入多个主目录（最多 max_workers 个同时进行）
+
+    Returns:
+        dict: {"results": [每个目标的结果，按输入顺序], "summary": {总数/成功/失败/耗时统计}}
+    """
+    if vendor not in cm.VENDOR_META:
+        raise ValueError(f"未知厂家: {vendor}")
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        results = list(pool.map(lambda h: apply_to_home(vendor, config, h, backup), homes))
+    elapsed = sorted(r["elapsed_ms"] for r in results)
+    succeeded = sum(1 for r in results if r["success"])
+    return {
+        "results": results,
+        "summary": {
+            "targets": len(results),
+            "succeeded": succeeded,
+            "failed": len(results) - succeeded,
+            "wall_ms": round((time.perf_counter() - start) * 1000, 2),
+            "max_target_ms": elapsed[-1] if elapsed else 0,
+            "median_target_ms": elapsed[len(elapsed) // 2] if elapsed else 0,
+            "workers": max(1, max_workers),
+        },
+    }
+
+
+def _child_main() -> int:
+    """子进程入口（见 _apply_as_owner）：从 stdin 读取请求，以当前身份写入，结果作为最后一行输出"""
+    request = json.loads(sys.stdin.read())
+    vendor = request["vendor"]
+    clients = _apply_clients(
+        vendor, config_models.parse(vendor, request["config"]), Path(request["home"]), request["backup"], None
+    )
+    print(json.dumps(clients, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__" and sys.argv[1:] == ["--apply-home"]:
+    sys.exit(_child_main())
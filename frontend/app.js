@@ -11,6 +11,9 @@ let state = {
   selectedVendor: null,  // 当前选中的厂家 key
   selectedConfigId: null, // 当前选中的配置 id
   isNewConfig: false,    // 是否正在新建
+  runningJob: null,      // 正在运行的后台任务 id（Esc 取消）
+  searchQuery: '',       // 配置搜索框内容
+  searchResults: null,   // 搜索命中的 [{vendor, id, score, ...}]，null 表示未在搜索
 };
 let pendingDelete = null; // {vendor, configId}
 
@@ -21,6 +24,10 @@ const api = {
     if (window.pywebview) return await window.pywebview.api.get_vendors();
     return state.vendors;
   },
+  async getVendor(vendor) {
+    if (window.pywebview) return await window.pywebview.api.get_vendor(vendor);
+    return state.vendors[vendor];
+  },
   async saveVendorConfig(vendor, data) {
     if (window.pywebview) return await window.pywebview.api.save_vendor_config(vendor, data);
     if (!data.id) data.id = 'mock-' + Date.now();
@@ -36,7 +43,11 @@ const api = {
   },
   async deployToEnvVars(vendor, configId) {
     if (window.pywebview) return await window.pywebview.api.deploy_to_env_vars(vendor, configId);
-    return { success: true, message: '环境变量已设置', set_vars: [], failed_vars: [] };
+    return { success: true, message: '环境变量已设置', set_vars: [], failed_vars: [], unchanged_vars: [] };
+  },
+  async listModels(vendor, apiUrl, apiKey) {
+    if (window.pywebview) return await window.pywebview.api.list_models(vendor, apiUrl, apiKey);
+    return { models: [], stale: false, refreshing: false, error: null };
   },
   async getEnvVarsStatus(vendor) {
     if (window.pywebview) return await window.pywebview.api.env_vars_status(vendor);
@@ -50,6 +61,67 @@ const api = {
     if (window.pywebview) return await window.pywebview.api.get_min_versions();
     return {};
   },
+  async searchConfigs(query, limit = 50, vendor = null) {
+    if (window.pywebview) return await window.pywebview.api.search_configs(query, limit, vendor);
+    const q = query.toLowerCase();
+    return (state.vendors[vendor]?.configs || [])
+      .filter(c => [c.name, c.api_url, c.model].some(f => (f || '').toLowerCase().includes(q)))
+      .slice(0, limit)
+      .map(c => ({ vendor, id: c.id, name: c.name, score: 1 }));
+  },
+  async startJob(kind, args = []) {
+    if (window.pywebview) return await window.pywebview.api.start_job(kind, args);
+    return { job_id: 'mock-' + Date.now(), joined: false };
+  },
+  async jobStatus(jobId, since = 0) {
+    if (window.pywebview) return await window.pywebview.api.job_status(jobId, since);
+    return { job_id: jobId, status: 'done', events: [], next: 0, result: {}, error: null };
+  },
+  async cancelJob(jobId) {
+    if (window.pywebview) return await window.pywebview.api.cancel_job(jobId);
+    return false;
+  },
+  // 后台任务：启动后增量拉取进度事件，结束时返回结果；重复点击会合并到同一个任务
+  async runJob(kind, args, onEvent) {
+    const { job_id } = await api.startJob(kind, args);
+    state.runningJob = job_id;
+    let since = 0;
+    try {
+      for (;;) {
+        const snap = await api.jobStatus(job_id, since);
+        if (!snap) throw new Error('任务不存在');
+        since = snap.next;
+        if (onEvent) snap.events.forEach(onEvent);
+        if (snap.status === 'failed') throw new Error(snap.error || '任务失败');
+        if (snap.status === 'done' || snap.status === 'cancelled') {
+          return { ...(snap.result || {}), cancelled: snap.status === 'cancelled' };
+        }
+        await new Promise(r => setTimeout(r, 150));
+      }
+    } finally {
+      if (state.runningJob === job_id) state.runningJob = null;
+    }
+  },
+  // 批量调用：calls = [[method, ...args], ...]，一次桥接往返返回全部结果
+  async batch(calls) {
+    const payload = calls.map(([method, ...args]) => ({ method, args }));
+    let results;
+    if (window.pywebview) {
+      results = await window.pywebview.api.batch(payload);
+    } else {
+      // 无后端时逐个走本地 mock（snake_case → camelCase 对应上面的方法）
+      results = [];
+      for (const [method, ...args] of calls) {
+        const name = method.replace(/_([a-z])/g, (_, c) => c.toUpperCase());
+        const fn = api[name];
+        results.push(fn ? { ok: true, result: await fn.apply(api, args) } : { ok: true, result: {} });
+      }
+    }
+    return results.map((r, i) => {
+      if (!r.ok) throw new Error(r.error || `${calls[i][0]} 调用失败`);
+      return r.result;
+    });
+  },
 };
 
 // ── DOM ──────────────────────────────────
@@ -129,7 +201,12 @@ function renderConfigCards() {
   const cards = dom.configCards;
   cards.innerHTML = '';
 
-  const configs = vendor.configs || [];
+  let configs = vendor.configs || [];
+  if (state.searchResults) {
+    // 搜索中：按相关度顺序显示命中的配置
+    const byId = new Map(configs.map(c => [c.id, c]));
+    configs = state.searchResults.map(r => byId.get(r.id)).filter(Boolean);
+  }
   configs.forEach(cfg => {
     const isActive = cfg.id === vendor.current_config_id;
     const isSelected = cfg.id === state.selectedConfigId && !state.isNewConfig;
@@ -156,10 +233,49 @@ function renderConfigCards() {
   });
 
   if (configs.length === 0) {
-    cards.innerHTML = '<div style="color:var(--lego-muted);font-size:12px;padding:8px 0">暂无配置，点击“添加配置”创建</div>';
+    const empty = state.searchResults ? '没有匹配的配置' : '暂无配置，点击“添加配置”创建';
+    cards.innerHTML = `<div style="color:var(--lego-muted);font-size:12px;padding:8px 0">${empty}</div>`;
+  }
+}
+
+// ── 配置搜索 ──────────────────────────────
+
+let searchTimer = null;
+let searchSeq = 0;
+
+// 由后端索引完成匹配与排序，前端只按返回的 id 重排卡片
+async function runSearch() {
+  const query = state.searchQuery.trim();
+  const vendor = state.selectedVendor;
+  const seq = ++searchSeq;
+  if (!query || !vendor) {
+    state.searchResults = null;
+    renderConfigCards();
+    return;
+  }
+  try {
+    const results = await api.searchConfigs(query, 50, vendor);
+    if (seq !== searchSeq) return; // 已有更新的输入，丢弃过期结果
+    state.searchResults = results || [];
+    renderConfigCards();
+  } catch (e) {
+    console.log('搜索失败:', e);
   }
 }
 
+function onSearchInput(e) {
+  state.searchQuery = e.target.value;
+  clearTimeout(searchTimer);
+  searchTimer = setTimeout(runSearch, 60);
+}
+
+function clearSearch() {
+  state.searchQuery = '';
+  state.searchResults = null;
+  const input = $('#config-search');
+  if (input) input.value = '';
+}
+
 function escapeHtml(str) {
   const d = document.createElement('div');
   d.textContent = str;
@@ -176,6 +292,7 @@ function setStatus(text, type = 'neutral') {
 // ── 编辑器 ──────────────────────────────
 
 function selectVendor(vk) {
+  if (vk !== state.selectedVendor) clearSearch();
   state.selectedVendor = vk;
   state.selectedConfigId = null;
   state.isNewConfig = false;
@@ -218,6 +335,7 @@ function startNewConfig(vendor) {
 
 function showEditor(vendor, cfg) {
   dom.editorForm.classList.remove('hidden');
+  loadModelOptions();
 
   // 显示/隐藏厂家专属区域
   dom.extraCodex.classList.toggle('hidden', vendor !== 'codex');
@@ -240,6 +358,47 @@ function hideEditor() {
 
 // ── 填充/重置 ────────────────────────────
 
+// ── 模型下拉（端点模型列表） ─────────────────
+
+// 先用缓存立即填充，缓存过期时后端在后台刷新并通过 onModelsUpdated 推送
+async function loadModelOptions() {
+  const vendor = state.selectedVendor;
+  const apiUrl = $('#cfg-api-url').value.trim();
+  const apiKey = $('#cfg-api-key').value.trim();
+  if (!vendor || !apiKey) {
+    renderModelOptions([]);
+    return;
+  }
+  try {
+    const result = await api.listModels(vendor, apiUrl, apiKey);
+    renderModelOptions(result.models || []);
+  } catch (e) {
+    console.log('获取模型列表失败:', e);
+  }
+}
+
+function renderModelOptions(models) {
+  const list = $('#model-options');
+  list.innerHTML = '';
+  models.forEach(m => {
+    const opt = document.createElement('option');
+    opt.value = m;
+    list.appendChild(opt);
+  });
+}
+
+// 与后端 model_catalog.normalize_url 一致：去掉首尾空白与末尾的 /
+function normalizeApiUrl(url) {
+  return (url || '').trim().replace(/\/+$/, '');
+}
+
+window.onModelsUpdated = (event) => {
+  // 只在编辑器仍指向同一端点时更新
+  if (event.vendor === state.selectedVendor && event.api_url === normalizeApiUrl($('#cfg-api-url').value)) {
+    renderModelOptions(event.models || []);
+  }
+};
+
 function populateEditor(vendor, cfg) {
   $('#config-name').value = cfg.name || '';
   $('#cfg-api-url').value = cfg.api_url || '';
@@ -338,12 +497,13 @@ async function handleDeployEnvVars() {
 
   try {
     setStatus('正在部署环境变量...', 'neutral');
-    const result = await api.deployToEnvVars(vendor, state.selectedConfigId);
+    const result = await api.runJob('deploy_env', [vendor, state.selectedConfigId], describeProgress);
 
     if (result.success) {
       setStatus(result.message || '环境变量已部署，重启终端后生效', 'success');
       alert('环境变量部署成功！\n\n' +
-        `已设置：${result.set_vars.join(', ')}\n\n` +
+        `已设置：${result.set_vars.join(', ') || '无'}\n` +
+        (result.unchanged_vars?.length ? `未变化：${result.unchanged_vars.join(', ')}\n` : '') + '\n' +
         '提示：请关闭当前终端并重新打开，环境变量才会生效。');
     } else {
       setStatus(result.message || '部署失败', 'error');
@@ -357,11 +517,22 @@ async function handleDeployEnvVars() {
   }
 }
 
+// 后台任务进度 → 状态栏
+function describeProgress(ev) {
+  if (ev.stage === 'client') {
+    const text = { writing: '正在写入', done: '已写入', failed: '写入失败' }[ev.status] || ev.status;
+    setStatus(`${text} ${ev.client}...`, ev.status === 'failed' ? 'error' : 'neutral');
+  } else if (ev.stage === 'env') {
+    const text = { set: '已设置', failed: '设置失败', cancelled: '已取消', unchanged: '未变化' }[ev.status] || ev.status;
+    setStatus(`环境变量 ${ev.var} ${text}`, ev.status === 'failed' ? 'error' : 'neutral');
+  }
+}
+
 async function handleSwitch() {
   if (!state.selectedVendor || !state.selectedConfigId) return;
   setStatus('正在切换...', 'neutral');
   try {
-    const result = await api.switchVendorConfig(state.selectedVendor, state.selectedConfigId);
+    const result = await api.runJob('switch', [state.selectedVendor, state.selectedConfigId], describeProgress);
     if (result.success) {
       state.vendors = await api.getVendors();
       renderVendorList();
@@ -396,12 +567,16 @@ async function handleSave() {
   }
 
   try {
-    const saved = await api.saveVendorConfig(vendor, data);
-    state.vendors = await api.getVendors();
+    const [saved, vendors] = await api.batch([
+      ['save_vendor_config', vendor, data],
+      ['get_vendors'],
+    ]);
+    state.vendors = vendors;
     state.selectedConfigId = saved.id;
     state.isNewConfig = false;
     renderVendorList();
     renderConfigCards();
+    if (state.searchQuery) runSearch();
     const v = state.vendors[vendor];
     const cfg = v?.configs?.find(c => c.id === saved.id);
     if (cfg) showEditor(vendor, cfg);
@@ -428,8 +603,11 @@ async function confirmDelete() {
   if (!pendingDelete) return;
   const { vendor, configId } = pendingDelete;
   try {
-    await api.deleteVendorConfig(vendor, configId);
-    state.vendors = await api.getVendors();
+    const [, vendors] = await api.batch([
+      ['delete_vendor_config', vendor, configId],
+      ['get_vendors'],
+    ]);
+    state.vendors = vendors;
     if (state.selectedVendor === vendor && state.selectedConfigId === configId) {
       state.selectedConfigId = null;
       state.isNewConfig = false;
@@ -438,15 +616,54 @@ async function confirmDelete() {
     hideDeleteConfirm();
     renderVendorList();
     renderConfigCards();
+    if (state.searchQuery) runSearch();
     setStatus('配置已删除', 'neutral');
   } catch (e) {
     setStatus('删除失败: ' + e.message, 'error');
   }
 }
 
+// ── 外部修改推送 ────────────────────────
+
+// 后端文件监听检测到客户端配置或 config.json 被外部修改时调用，只刷新受影响的厂家
+window.onConfigFilesChanged = async (event) => {
+  const vendors = (event?.vendors || []).filter(vk => VENDOR_ORDER.includes(vk));
+  if (vendors.length === 0) return;
+  try {
+    const results = await api.batch(vendors.map(vk => ['get_vendor', vk]));
+    vendors.forEach((vk, i) => {
+      if (results[i]) state.vendors[vk] = results[i];
+    });
+  } catch (e) {
+    console.log('刷新厂家失败:', e);
+    return;
+  }
+
+  renderVendorList();
+  if (vendors.includes(state.selectedVendor)) {
+    renderConfigCards();
+    if (state.searchQuery) runSearch();
+    // 当前编辑的配置被外部删除时关闭编辑器，否则只刷新按钮状态（不覆盖正在编辑的表单）
+    if (state.selectedConfigId && !state.isNewConfig) {
+      const cfg = state.vendors[state.selectedVendor]?.configs?.find(c => c.id === state.selectedConfigId);
+      if (cfg) {
+        showEditor(state.selectedVendor, cfg);
+      } else {
+        state.selectedConfigId = null;
+        hideEditor();
+      }
+    }
+  }
+  const names = vendors.map(vk => state.vendors[vk]?.display_name || vk).join('、');
+  setStatus(`检测到外部修改，已刷新 ${names}`, 'neutral');
+};
+
 // ── 事件绑定 ────────────────────────────
 
 function bindEvents() {
+  $('#config-search').addEventListener('input', onSearchInput);
+  $('#cfg-api-url').addEventListener('change', loadModelOptions);
+  $('#cfg-api-key').addEventListener('change', loadModelOptions);
   $('#btn-save').addEventListener('click', handleSave);
   $('#btn-switch').addEventListener('click', handleSwitch);
   $('#btn-deploy-env').addEventListener('click', handleDeployEnvVars);
@@ -456,6 +673,14 @@ function bindEvents() {
     }
   });
 
+  // Esc 取消正在运行的后台任务
+  document.addEventListener('keydown', (e) => {
+    if (e.key === 'Escape' && state.runningJob) {
+      api.cancelJob(state.runningJob);
+      setStatus('正在取消...', 'neutral');
+    }
+  });
+
   // 密钥切换
   document.addEventListener('click', (e) => {
     const toggleBtn = e.target.closest('.key-toggle');
@@ -556,8 +781,11 @@ const stepGuide = {
 
 async function checkAndShowVersionWarnings() {
   try {
-    const versions = await api.checkVendorVersions();
-    const minVersions = await api.getMinVersions();
+    const [versions, minVersions] = await Promise.all([
+      api.runJob('check_versions', []),
+      api.getMinVersions(),
+    ]);
+    delete versions.cancelled;
     const warnings = [];
 
     for (const [vendor, [isCompatible, version, message]] of Object.entries(versions)) {
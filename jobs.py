@@ -0,0 +1,153 @@
+"""后台任务 — 长耗时操作放到受管的工作线程池中执行，支持进度事件、取消与重复提交合并"""
+
+import queue
+import threading
+import time
+import traceback
+import uuid
+from typing import Callable
+
+# 已结束任务最多保留多少个，供前端拉取最终结果
+MAX_FINISHED_JOBS = 50
+
+FINAL_STATES = ("done", "failed", "cancelled")
+
+
+class Job:
+    """一个后台任务：记录状态、进度事件和最终结果"""
+
+    def __init__(self, kind: str, key: str, func: Callable, args: tuple):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.key = key
+        self.status = "queued"
+        self.result = None
+        self.error: str | None = None
+        self.created = time.time()
+        self.finished: float | None = None
+        self._func = func
+        self._args = args
+        self._events: list[dict] = []
+        self._lock = threading.Lock()
+        self._cancel = threading.Event()
+
+    def progress(self, event: dict) -> None:
+        """追加一个进度事件（由任务函数在工作线程中调用）"""
+        with self._lock:
+            self._events.append({"seq": len(self._events) + 1, "ts": time.time(), **event})
+
+    def cancelled(self) -> bool:
+        """任务函数在安全点轮询此方法，决定是否提前结束"""
+        return self._cancel.is_set()
+
+    def cancel(self) -> None:
+        self._cancel.set()
+
+    def snapshot(self, since: int = 0) -> dict:
+        """任务状态与 seq > since 的新事件，前端按 next 作为下一次的 since 增量拉取"""
+        with self._lock:
+            events = self._events[since:]
+            return {
+                "job_id": self.id,
+                "kind": self.kind,
+                "status": self.status,
+                "events": events,
+                "next": len(self._events),
+                "result": self.result,
+                "error": self.error,
+            }
+
+    def _run(self) -> None:
+        if self._cancel.is_set():
+            self.status = "cancelled"
+            self.finished = time.time()
+            return
+        self.status = "running"
+        try:
+            self.result = self._func(*self._args, progress=self.progress, cancelled=self.cancelled)
+            self.status = "cancelled" if self._cancel.is_set() else "done"
+        except Exception as e:
+            traceback.print_exc()
+            self.error = str(e)
+            self.status = "failed"
+        finally:
+            self.finished = time.time()
+
+
+class JobManager:
+    """
+    固定大小的工作线程池 + 有界队列
+
+    同一 key 的任务未结束时重复提交会直接返回已有任务（例如连续点击“切换”），
+    队列已满时拒绝新任务而不是无限堆积。
+    """
+
+    def __init__(self, max_workers: int = 2, max_queue: int = 16):
+        self._queue: queue.Queue[Job] = queue.Queue(maxsize=max_queue)
+        self._jobs: dict[str, Job] = {}
+        self._active: dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self._max_workers = max_workers
+        self._workers: list[threading.Thread] = []
+
+    def submit(self, kind: str, key: str, func: Callable, *args) -> tuple[Job, bool]:
+        """
+        提交任务
+
+        Args:
+            func: 任务函数，额外接收关键字参数 progress 与 cancelled
+
+        Returns:
+            (任务, 是否合并到了已有任务)
+        """
+        with self._lock:
+            existing = self._active.get(key)
+            if existing and existing.status not in FINAL_STATES:
+                return existing, True
+            job = Job(kind, key, func, args)
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                raise RuntimeError("后台任务过多，请稍后重试")
+            self._jobs[job.id] = job
+            self._active[key] = job
+            self._ensure_workers()
+            self._prune()
+        return job, False
+
+    def get(self, job_id: str) -> Job | None:
+        return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> bool:
+        job = self._jobs.get(job_id)
+        if not job or job.status in FINAL_STATES:
+            return False
+        job.cancel()
+        return True
+
+    def _ensure_workers(self) -> None:
+        while len(self._workers) < self._max_workers:
+            worker = threading.Thread(
+                target=self._worker, name=f"job-worker-{len(self._workers)}", daemon=True
+            )
+            worker.start()
+            self._workers.append(worker)
+
+    def _worker(self) -> None:
+        while True:
+            job = self._queue.get()
+            try:
+                job._run()
+            finally:
+                with self._lock:
+                    if self._active.get(job.key) is job:
+                        del self._active[job.key]
+                self._queue.task_done()
+
+    def _prune(self) -> None:
+        finished = [j for j in self._jobs.values() if j.status in FINAL_STATES]
+        if len(finished) <= MAX_FINISHED_JOBS:
+            return
+        finished.sort(key=lambda j: j.finished or 0)
+        for job in finished[: len(finished) - MAX_FINISHED_JOBS]:
+            self._jobs.pop(job.id, None)
@@ -0,0 +1,213 @@
+"""JSONC（带注释/尾随逗号的 JSON）局部编辑器 — 只定位并替换顶层对象中的单个键，其余内容原样保留"""
+
+import json
+from dataclasses import dataclass
+
+
+@dataclass
+class _Member:
+    """顶层对象中一个成员在原文中的位置"""
+
+    key: str
+    key_start: int
+    value_start: int
+    value_end: int
+    comma_end: int | None  # 成员后逗号之后的位置，没有逗号为 None
+
+
+def _skip_ws(text: str, i: int) -> int:
+    """跳过空白与 // /* */ 注释"""
+    n = len(text)
+    while i < n:
+        ch = text[i]
+        if ch in " \t\r\n\ufeff":
+            i += 1
+        elif text.startswith("//", i):
+            nl = text.find("\n", i)
+            i = n if nl < 0 else nl + 1
+        elif text.startswith("/*", i):
+            end = text.find("*/", i + 2)
+            if end < 0:
+                raise ValueError("未闭合的块注释")
+            i = end + 2
+        else:
+            break
+    return i
+
+
+def _skip_string(text: str, i: int) -> int:
+    """i 指向开引号，返回闭引号之后的位置"""
+    i += 1
+    n = len(text)
+    while i < n:
+        ch = text[i]
+        if ch == "\\":
+            i += 2
+        elif ch == '"':
+            return i + 1
+        elif ch == "\n":
+            break
+        else:
+            i += 1
+    raise ValueError("未闭合的字符串")
+
+
+def _skip_value(text: str, i: int) -> int:
+    """跳过一个值（字符串/对象/数组/标量），返回值结束位置；不构建任何对象"""
+    n = len(text)
+    if i >= n:
+        raise ValueError("缺少值")
+    ch = text[i]
+    if ch == '"':
+        return _skip_string(text, i)
+    if ch in "{[":
+        depth = 0
+        while i < n:
+            ch = text[i]
+            if ch == '"':
+                i = _skip_string(text, i)
+                continue
+            if text.startswith("//", i) or text.startswith("/*", i):
+                i = _skip_ws(text, i)
+                continue
+            if ch in "{[":
+                depth += 1
+            elif ch in "}]":
+                depth -= 1
+                if depth == 0:
+                    return i + 1
+            i += 1
+        raise ValueError("未闭合的对象或数组")
+    start = i
+    while i < n and text[i] not in ",}] \t\r\n/":
+        i += 1
+    if i == start:
+        raise ValueError(f"无法识别的值 (位置 {i})")
+    return i
+
+
+def _scan_members(text: str, stop_at: str | None = None) -> tuple[list[_Member], int, int]:
+    """
+    扫描顶层对象的成员
+
+    Args:
+        stop_at: 找到该键后立即停止（避免扫描大文件的剩余部分）
+
+    Returns:
+        (成员列表, 左花括号位置, 右花括号位置；提前停止时为 -1)
+    """
+    i = _skip_ws(text, 0)
+    if i >= len(text) or text[i] != "{":
+        raise ValueError("顶层不是 JSON 对象")
+    open_pos = i
+    i += 1
+    members: list[_Member] = []
+    while True:
+        i = _skip_ws(text, i)
+        if i >= len(text):
+            raise ValueError("对象未闭合")
+        if text[i] == "}":
+            return members, open_pos, i
+        if text[i] != '"':
+            raise ValueError(f"期望键名 (位置 {i})")
+        key_start = i
+        key_end = _skip_string(text, i)
+        key = json.loads(text[key_start:key_end])
+        i = _skip_ws(text, key_end)
+        if i >= len(text) or text[i] != ":":
+            raise ValueError(f"期望 ':' (位置 {i})")
+        value_start = _skip_ws(text, i + 1)
+        value_end = _skip_value(text, value_start)
+        member = _Member(key, key_start, value_start, value_end, None)
+        members.append(member)
+        if key == stop_at:
+            return members, open_pos, -1
+        i = _skip_ws(text, value_end)
+        if i < len(text) and text[i] == ",":
+            member.comma_end = i + 1
+            i += 1
+
+
+def strip_jsonc(text: str) -> str:
+    """去掉注释和尾随逗号，得到标准 JSON（用于解析单个值片段）"""
+    out, i, n = [], 0, len(text)
+    while i < n:
+        ch = text[i]
+        if ch == '"':
+            end = _skip_string(text, i)
+            out.append(text[i:end])
+            i = end
+        elif text.startswith("//", i) or text.startswith("/*", i):
+            i = _skip_ws(text, i)
+        elif ch == ",":
+            j = _skip_ws(text, i + 1)
+            if j < n and text[j] in "}]":
+                i += 1  # 尾随逗号
+            else:
+                out.append(ch)
+                i += 1
+        else:
+            out.append(ch)
+            i += 1
+    return "".join(out)
+
+
+def get_member(text: str, key: str):
+    """读取顶层键的值（只解析该值本身），不存在返回 None"""
+    if not text.strip():
+        return None
+    members, _, _ = _scan_members(text, stop_at=key)
+    for m in members:
+        if m.key == key:
+            return json.loads(strip_jsonc(text[m.value_start : m.value_end]))
+    return None
+
+
+def _detect_indent(text: str, members: list[_Member]) -> str:
+    """以第一个成员所在行的缩进作为成员缩进"""
+    if members:
+        line_start = text.rfind("\n", 0, members[0].key_start) + 1
+        prefix = text[line_start : members[0].key_start]
+        if not prefix.strip():
+            return prefix
+    return "  "
+
+
+def _format_value(value, indent: str) -> str:
+    """序列化值，缩进单位沿用文件风格，多行时后续行补上成员缩进"""
+    unit = indent if indent in ("\t", "  ", "    ") else "  "
+    dumped = json.dumps(value, indent=unit, ensure_ascii=False)
+    return dumped.replace("\n", "\n" + indent)
+
+
+def set_member(text: str, key: str, value) -> str:
+    """
+    设置顶层键的值：已存在时只替换值的文本范围，不存在时插入到对象末尾
+
+    保留注释、尾随逗号风格和其余内容的原始格式。
+    """
+    if not text.strip():
+        return "{\n" + f"  {json.dumps(key)}: {_format_value(value, '  ')}" + "\n}\n"
+
+    members, open_pos, close_pos = _scan_members(text, stop_at=key)
+    indent = _detect_indent(text, members)
+    new_value = _format_value(value, indent)
+
+    for m in members:
+        if m.key == key:
+            return text[: m.value_start] + new_value + text[m.value_end :]
+
+    entry = f"{json.dumps(key, ensure_ascii=False)}: {new_value}"
+    if not members:
+        return text[: open_pos + 1] + f"\n{indent}{entry}\n" + text[close_pos:]
+
+    last = members[-1]
+    # 原文带尾随逗号时新成员沿用该风格；最后一个成员同行的 // 注释保留在原行
+    pos = last.comma_end if last.comma_end is not None else last.value_end
+    line_end = text.find("\n", pos)
+    if line_end < 0:
+        line_end = len(text)
+    tail = text[pos:line_end] if text[pos:line_end].strip().startswith("//") else ""
+    head = text[:pos] if last.comma_end is not None else text[:pos] + ","
+    suffix = "," if last.comma_end is not None else ""
+    return head + tail + f"\n{indent}{entry}{suffix}" + text[pos + len(tail) :]
@@ -1,9 +1,9 @@
 """CodePivot — AI 编程工具配置切换器"""
 
 import sys
-import webview
 from pathlib import Path
-from api import Api
+
+import single_instance
 
 
 def _get_base_path() -> Path:
@@ -18,6 +18,26 @@ FRONTEND_DIR = BASE_DIR / "frontend"
 
 
 def main():
+    if "--tray" in sys.argv[1:]:
+        # 托盘模式不创建窗口，也不需要加载 webview
+        import tray
+
+        sys.exit(tray.run())
+
+    # 参数不合法时直接报告用法，不启动窗口
+    try:
+        command = single_instance.parse_command(sys.argv[1:])
+    except ValueError as e:
+        sys.exit(_report({"ok": False, "error": str(e)}))
+
+    # 已有实例在运行：转发参数后立即退出（不加载 webview）
+    response = single_instance.forward_or_claim(sys.argv[1:])
+    if response is not None:
+        sys.exit(_report(response))
+
+    import webview
+    from api import Api
+
     api = Api()
     window = webview.create_window(
         title="CodePivot",
@@ -28,7 +48,37 @@ def main():
         resizable=True,
         text_select=True,
     )
-    webview.start(debug=False)
+    state = single_instance.listen(api, on_activate=lambda: _activate(window))
+
+    def on_start(window):
+        # 窗口就绪后启动配置文件监听，外部修改实时推送给前端
+        api._attach_window(window)
+        # 首次启动时带的命令（如 switch）在本进程内执行
+        if command["cmd"] == "switch":
+            _report(state.handle(command))
+
+    webview.start(on_start, window, debug=False)
+
+
+def _activate(window) -> None:
+    """把已有窗口带到前台"""
+    try:
+        window.restore()
+        window.show()
+    except Exception:
+        pass
+
+
+def _report(response: dict) -> int:
+    """打印转发命令的结果，返回退出码"""
+    if not response.get("ok"):
+        print(response.get("error", "失败"), file=sys.stderr)
+        return 1
+    result = response.get("result")
+    if isinstance(result, dict):
+        print(result.get("message", ""))
+        return 0 if result.get("success", True) else 1
+    return 0
 
 
 if __name__ == "__main__":
@@ -0,0 +1,209 @@
+"""
+模型目录发现 — 查询各配置端点的模型列表，按 (厂家, 地址, 密钥哈希) 缓存
+
+    claude    GET {base}/v1/models           x-api-key + anthropic-version
+    codex     GET {base}/models              Authorization: Bearer（OpenAI 兼容）
+    opencode  同 codex
+    gemini    GET {base}/v1beta/models       x-goog-api-key
+
+缓存写在 ~/.ai-switcher/model_cache.json，只保存密钥的哈希。条目在 TTL 内直接使用；
+过期后带 If-None-Match 重新验证，服务端返回 304 时只刷新时间戳。
+"""
+
+import hashlib
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from clients import _atomic_write_text
+
+CACHE_PATH = Path.home() / ".ai-switcher" / "model_cache.json"
+TTL = 6 * 3600
+ERROR_TTL = 300  # 请求失败的端点隔多久再试
+TIMEOUT = 8
+MAX_PARALLEL = 4
+
+DEFAULT_BASES = {
+    "claude": "https://api.anthropic.com",
+    "codex": "https://api.openai.com/v1",
+    "gemini": "https://generativelanguage.googleapis.com",
+}
+
+
+def normalize_url(api_url: str) -> str:
+    """缓存键与推送事件中使用的地址形式（去掉首尾空白与末尾的 /），前端比较时做同样处理"""
+    return (api_url or "").strip().rstrip("/")
+
+
+def cache_key(vendor: str, api_url: str, api_key: str) -> str:
+    key_hash = hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:16]
+    return f"{vendor}|{normalize_url(api_url)}|{key_hash}"
+
+
+def _request(vendor: str, api_url: str, api_key: str) -> urllib.request.Request:
+    base = normalize_url(api_url or DEFAULT_BASES.get(vendor, ""))
+    if not base:
+        raise ValueError("未填写 API 地址")
+    if vendor == "gemini":
+        # 地址可能已带版本段（/v1beta、/v1），与 OpenAI 风格的处理相同，不再重复拼接
+        if base.endswith("/models"):
+            url = base
+        elif base.rsplit("/", 1)[-1] in ("v1", "v1beta"):
+            url = f"{base}/models?pageSize=1000"
+        else:
+            url = f"{base}/v1beta/models?pageSize=1000"
+        headers = {"x-goog-api-key": api_key}
+    else:
+        # OpenAI 风格的地址通常已带 /v1；Anthropic 风格的只到主机名
+        url = f"{base}/models" if base.rsplit("/", 1)[-1] in ("v1", "v1beta") else f"{base}/v1/models"
+        headers = {"Authorization": f"Bearer {api_key}"}
+        if vendor == "claude":
+            headers = {"x-api-key": api_key, "anthropic-version": "2023-06-01", **headers}
+    return urllib.request.Request(url, headers={**headers, "Accept": "application/json"})
+
+
+def _parse_models(payload: dict) -> list[str]:
+    """兼容 OpenAI/Anthropic 的 data[].id 与 Gemini 的 models[].name"""
+    items = payload.get("data") or payload.get("models") or []
+    models = []
+    for item in items:
+        if isinstance(item, str):
+            name = item
+        else:
+            name = item.get("id") or item.get("name") or ""
+        if name.startswith("models/"):
+            name = name[len("models/") :]
+        if name:
+            models.append(name)
+    return sorted(set(models))
+
+
+class ModelCatalog:
+    """模型列表缓存；fetch 在线程中调用，同一键不会并发请求"""
+
+    def __init__(self, path: Path = CACHE_PATH, ttl: float = TTL):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: dict[str, dict] | None = None
+        self._inflight: dict[str, threading.Event] = {}
+
+    def cached(self, vendor: str, api_url: str, api_key: str) -> dict:
+        """
+        立即返回缓存（不发请求）
+
+        Returns:
+            dict: {"models": list, "fetched_at": float|None, "stale": bool, "error": str|None}
+        """
+        with self._lock:
+            return self._view(self._load().get(cache_key(vendor, api_url, api_key)))
+
+    def _view(self, entry: dict | None) -> dict:
+        if not entry:
+            return {"models": [], "fetched_at": None, "stale": True, "error": None}
+        return {
+            "models": entry.get("models", []),
+            "fetched_at": entry.get("fetched_at"),
+            "stale": self._stale(entry),
+            "error": entry.get("error"),
+        }
+
+    def fetch(self, vendor: str, api_url: str, api_key: str, force: bool = False) -> dict:
+        """未过期直接返回缓存，否则请求端点（带 ETag 重新验证）并更新缓存"""
+        key = cache_key(vendor, api_url, api_key)
+        while True:
+            with self._lock:
+                entry = self._load().get(key)
+                if entry and not force and not self._stale(entry):
+                    return self._view(entry)
+                waiting = self._inflight.get(key)
+                if waiting is None:
+                    done = self._inflight[key] = threading.Event()
+                    break
+            # 同一端点已有请求在进行，等它完成后直接用结果
+            waiting.wait(TIMEOUT * 2)
+            force = False
+        try:
+            entry = self._revalidate(vendor, api_url, api_key, entry)
+            with self._lock:
+                self._load()[key] = entry
+                self._save()
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            done.set()
+        return self._view(entry)
+
+    def fetch_many(self, targets: list[tuple[str, str, str]], force: bool = False, progress=None) -> dict:
+        """
+        并发刷新多个端点（最多 MAX_PARALLEL 个同时进行，相同端点只请求一次）
+
+        Returns:
+            dict: {cache_key: cached(...) 的结果}
+        """
+        unique = {cache_key(*t): t for t in targets}
+        results = {}
+
+        def run(item):
+            key, target = item
+            results[key] = self.fetch(*target, force=force)
+            if progress:
+                progress({"stage": "models", "vendor": target[0], "status": "done"})
+
+        with ThreadPoolExecutor(max_workers=MAX_PARALLEL) as pool:
+            list(pool.map(run, unique.items()))
+        return results
+
+    # ── 内部 ──────────────────────────────
+
+    def _stale(self, entry: dict) -> bool:
+        ttl = ERROR_TTL if entry.get("error") else self.ttl
+        return time.time() - entry.get("fetched_at", 0) > ttl
+
+    def _revalidate(self, vendor: str, api_url: str, api_key: str, entry: dict | None) -> dict:
+        old = entry or {}
+        try:
+            req = _request(vendor, api_url, api_key)
+            if old.get("etag") and old.get("models"):
+                req.add_header("If-None-Match", old["etag"])
+            with urllib.request.urlopen(req, timeout=TIMEOUT) as resp:
+                payload = json.loads(resp.read().decode("utf-8"))
+                etag = resp.headers.get("ETag")
+        except urllib.error.HTTPError as e:
+            if e.code == 304:
+                return {**old, "fetched_at": time.time(), "error": None}
+            return {**old, "fetched_at": time.time(), "error": f"HTTP {e.code}"}
+        except (urllib.error.URLError, OSError, ValueError) as e:
+            # 失败也记录时间，避免每次打开编辑器都重试一个不可达的端点
+            reason = getattr(e, "reason", e)
+            return {**old, "fetched_at": time.time(), "error": str(reason)}
+        return {
+            "models": _parse_models(payload) if isinstance(payload, dict) else [],
+            "etag": etag,
+            "fetched_at": time.time(),
+            "error": None,
+        }
+
+    def _load(self) -> dict[str, dict]:
+        """调用方需持有 self._lock"""
+        if self._entries is None:
+            try:
+                data = json.loads(self.path.read_text(encoding="utf-8"))
+                self._entries = data if isinstance(data, dict) else {}
+            except (OSError, ValueError):
+                self._entries = {}
+        return self._entries
+
+    def _save(self) -> None:
+        """调用方需持有 self._lock；写入失败只影响缓存持久化"""
+        try:
+            _atomic_write_text(self.path, json.dumps(self._entries, ensure_ascii=False))
+        except OSError as e:
+            print(f"[警告] 写入模型缓存失败: {e}")
+
+
+catalog = ModelCatalog()
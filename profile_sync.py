@@ -0,0 +1,327 @@
+"""
+配置同步 — 通过共享目录（网盘同步目录、挂载的共享盘等）在多台机器间同步中转配置
+
+    python set_env_helper.py sync ~/Dropbox/codepivot
+
+每个配置是 <目录>/records/ 下的一个记录文件，文件名带内容哈希：
+    <厂家>.<配置 id>.<内容哈希>.json
+内容变化即文件名变化，只列目录就能知道哪些记录变了，不需要读取或 stat 未变化的记录；
+删除写成哈希为 deleted 的墓碑记录，这样删除也能传到其他机器。
+
+本机在 ~/.ai-switcher/sync_state.json 中记录每个 (config.json, 目录) 上次同步时各记录的哈希（基线），
+与本地、远端三方比较：只有本地变了就上传，只有远端变了就拉取，两边都变了按 updated_at
+后写者胜出并报告冲突（本地删除没有保存时间，按同步时刻计）。
+拉取的改动一次原子提交到 config.json（见 cm.apply_synced）。
+
+记录文件包含 API 密钥，同步目录的访问权限应与 config.json 相同。
+"""
+
+import json
+import os
+import socket
+import time
+from pathlib import Path
+from urllib.parse import quote, unquote
+
+import config_manager as cm
+import config_models
+from clients import _atomic_write_text
+
+STATE_PATH = Path.home() / ".ai-switcher" / "sync_state.json"
+RECORDS_DIRNAME = "records"
+TOMBSTONE = "deleted"
+
+# 规划期间本地配置被修改时重新规划的次数
+MAX_ATTEMPTS = 3
+
+
+def _record_name(vendor: str, config_id: str, digest: str) -> str:
+    return f"{vendor}.{quote(config_id, safe='')}.{digest}.json"
+
+
+def _parse_name(name: str) -> tuple[str, str, str] | None:
+    """
+    记录文件名 → (厂家, 配置 id, 哈希)；临时文件、其他文件与 id 不合法的记录返回 None
+
+    id 会被用来生成本机的文件路径（环境变量脚本等），同步目录中的文件名不可信，
+    只接受 config_models.is_safe_id 允许的 id。
+    """
+    if name.startswith(".") or not name.endswith(".json"):
+        return None
+    head, _, digest = name[: -len(".json")].rpartition(".")
+    vendor, _, quoted = head.partition(".")
+    if not (vendor in cm.VENDOR_META and quoted and digest):
+        return None
+    config_id = unquote(quoted)
+    if not config_models.is_safe_id(config_id):
+        return None
+    return vendor, config_id, digest
+
+
+class ProfileSync:
+    """
+    与一个同步目录的增量同步
+
+    Args:
+        directory: 同步目录（不存在时自动创建）
+        state_path: 本机的同步基线
+    """
+
+    def __init__(self, directory: Path | str, state_path: Path = STATE_PATH):
+        self.directory = Path(directory).expanduser().resolve()
+        self.records = self.directory / RECORDS_DIRNAME
+        self.state_path = state_path
+        self.origin = socket.gethostname()
+
+    def sync(self, progress=None, cancelled=None) -> dict:
+        """
+        执行一次双向同步
+
+        Returns:
+            dict: {"directory", "pushed", "pulled", "conflicts", "errors", "unchanged",
+                   "files_read", "files_written", "files_deleted", "elapsed_ms"}
+        """
+        start = time.perf_counter()
+        self.records.mkdir(parents=True, exist_ok=True)
+        for _ in range(MAX_ATTEMPTS):
+            report = self._attempt(progress, cancelled)
+            if report is not None:
+                break
+        else:
+            raise RuntimeError("同步期间本地配置持续被修改，请稍后重试")
+        report["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        return report
+
+    # ── 内部 ──────────────────────────────
+
+    def _attempt(self, progress, cancelled) -> dict | None:
+        report = {
+            "directory": str(self.directory),
+            "pushed": [],
+            "pulled": [],
+            "conflicts": [],
+            "errors": [],
+            "unchanged": 0,
+            "files_read": 0,
+            "files_written": 0,
+            "files_deleted": 0,
+        }
+        state = self._load_state()
+        # 基线按 (config.json, 同步目录) 区分：换了配置文件（例如便携版换了位置）不会被当成全部删除
+        state_key = f"{Path(cm.CONFIG_PATH).resolve()}|{self.directory}"
+        base: dict[str, str] = state.get(state_key, {})
+
+        data, _ = cm.read_versioned()
+        local: dict[str, tuple[str, dict]] = {}  # key → (哈希, 配置)
+        for vendor in cm.VENDOR_META:
+            for cfg in data.get("vendors", {}).get(vendor, {}).get("configs", []):
+                if not config_models.is_safe_id(cfg["id"]):
+                    # 其他机器会拒绝这样的记录，不上传
+                    report["errors"].append(f"{vendor}/{cfg['id']}: 配置 id 不合法，未同步")
+                    continue
+                local[f"{vendor}/{cfg['id']}"] = (config_models.content_hash(cfg), cfg)
+        remote = self._list_remote()
+
+        changes: list[tuple[str, str, dict | None]] = []  # 拉取到本地的改动
+        expected: dict[tuple[str, str], str | None] = {}
+        pushes: list[tuple[str, str, str, dict | None, list[str]]] = []  # (key, 厂家, id, 配置, 要删除的旧文件)
+        new_base = dict(base)  # 未处理到的记录（取消、读取失败）保留原基线
+
+        for key in sorted(set(local) | set(remote) | set(base)):
+            if cancelled and cancelled():
+                break
+            vendor, _, config_id = key.partition("/")
+            l_hash, l_cfg = local.get(key, (None, None))
+            b_hash = base.get(key)
+            candidates = remote.get(key, [])
+            record = None
+
+            if len(candidates) > 1:
+                # 多台机器同时写入同一配置：按 updated_at 取最新的一份，其余删除
+                winner = self._resolve_remote(vendor, config_id, candidates, report)
+                if winner is None:
+                    continue
+                r_hash, r_name, record = winner
+            else:
+                r_hash, r_name = candidates[0] if candidates else (None, None)
+
+            # 墓碑与“没有”对本地来说是同一状态
+            l_state = l_hash
+            r_state = None if r_hash == TOMBSTONE else r_hash
+            b_state = None if b_hash == TOMBSTONE else b_hash
+
+            if l_state == r_state:
+                if r_hash is not None:
+                    new_base[key] = r_hash
+                else:
+                    new_base.pop(key, None)
+                report["unchanged"] += 1
+                continue
+
+            local_changed = l_state != b_state
+            remote_changed = r_hash != b_hash
+            if r_hash is None and l_state is not None:
+                # 远端没有这条记录（新配置，或同步目录被清理过）
+                pushes.append((key, vendor, config_id, l_cfg, []))
+                continue
+            if local_changed and not remote_changed:
+                pushes.append((key, vendor, config_id, l_cfg, [r_name] if r_name else []))
+                continue
+
+            record = record or self._read_record(r_name, report)
+            if record is None:
+                continue
+            if local_changed and remote_changed:
+                # 两边都改过：后写者胜出
+                local_time = l_cfg.get("updated_at", 0) if l_cfg else time.time()
+                remote_time = record.get("updated_at", 0)
+                local_wins = (local_time, l_hash or "") > (remote_time, r_hash)
+                report["conflicts"].append({
+                    "vendor": vendor,
+                    "id": config_id,
+                    "name": (l_cfg or record.get("config") or {}).get("name", ""),
+                    "winner": "local" if local_wins else "remote",
+                    "local_updated_at": local_time,
+                    "remote_updated_at": remote_time,
+                    "remote_origin": record.get("origin", ""),
+                })
+                if local_wins:
+                    pushes.append((key, vendor, config_id, l_cfg, [r_name]))
+                    continue
+
+            # 拉取远端
+            config = None if record.get("deleted") else config_models.normalize(vendor, record["config"])
+            changes.append((vendor, config_id, config))
+            expected[(vendor, config_id)] = l_hash
+            new_base[key] = r_hash
+            report["pulled"].append(self._entry(vendor, config_id, config, l_cfg))
+            if progress:
+                progress({"stage": "sync", "key": key, "status": "pulled"})
+
+        if not cm.apply_synced(changes, expected):
+            return None
+
+        for key, vendor, config_id, config, stale in pushes:
+            try:
+                new_base[key] = self._write_record(vendor, config_id, config, report)
+                for name in stale:
+                    self._remove(name, report)
+            except OSError as e:
+                report["errors"].append(f"{key}: 写入失败: {e}")
+                continue
+            report["pushed"].append(self._entry(vendor, config_id, config, config))
+            if progress:
+                progress({"stage": "sync", "key": key, "status": "pushed"})
+
+        if new_base != base:
+            state[state_key] = new_base
+            self._save_state(state)
+        return report
+
+    def _list_remote(self) -> dict[str, list[tuple[str, str]]]:
+        """只列目录（不读取、不 stat 记录文件）：key → [(哈希, 文件名)]"""
+        remote: dict[str, list[tuple[str, str]]] = {}
+        with os.scandir(self.records) as it:
+            for entry in it:
+                parsed = _parse_name(entry.name)
+                if parsed:
+                    vendor, config_id, digest = parsed
+                    remote.setdefault(f"{vendor}/{config_id}", []).append((digest, entry.name))
+        return remote
+
+    def _resolve_remote(self, vendor, config_id, candidates, report) -> tuple[str, str, dict] | None:
+        """同一配置在同步目录中有多个版本：返回最新的 (哈希, 文件名, 记录)，删除其余版本"""
+        records = []
+        for digest, name in candidates:
+            record = self._read_record(name, report)
+            if record is not None:
+                records.append((record.get("updated_at", 0), digest, name, record))
+        if not records:
+            return None
+        records.sort(key=lambda r: r[:3], reverse=True)
+        _, digest, name, record = records[0]
+        report["conflicts"].append({
+            "vendor": vendor,
+            "id": config_id,
+            "name": (record.get("config") or {}).get("name", ""),
+            "winner": "remote",
+            "remote_origin": record.get("origin", ""),
+            "detail": f"同步目录中有 {len(records)} 个版本，保留最新的一个",
+        })
+        for _, _, loser, _ in records[1:]:
+            self._remove(loser, report)
+        return digest, name, record
+
+    def _read_record(self, name: str, report: dict) -> dict | None:
+        """读取并校验记录：厂家、id 必须与文件名一致，内容必须与文件名中的哈希一致"""
+        vendor, config_id, digest = _parse_name(name)
+        try:
+            record = json.loads((self.records / name).read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            # 网盘尚未同步完整等情况，下次再试
+            report["errors"].append(f"{name}: 读取失败: {e}")
+            return None
+        report["files_read"] += 1
+        if not isinstance(record, dict) or record.get("vendor") != vendor or record.get("id") != config_id:
+            report["errors"].append(f"{name}: 记录的厂家或 id 与文件名不符，已跳过")
+            return None
+        if record.get("deleted"):
+            return record
+        config = record.get("config")
+        if not isinstance(config, dict) or config.get("id") != config_id:
+            report["errors"].append(f"{name}: 配置 id 与文件名不符，已跳过")
+            return None
+        if config_models.content_hash(config_models.normalize(vendor, config)) != digest:
+            report["errors"].append(f"{name}: 内容与文件名中的哈希不符，已跳过")
+            return None
+        return record
+
+    def _write_record(self, vendor: str, config_id: str, config: dict | None, report: dict) -> str:
+        if config is None:
+            digest = TOMBSTONE
+            record = {"vendor": vendor, "id": config_id, "deleted": True, "updated_at": time.time()}
+        else:
+            digest = config_models.content_hash(config)
+            record = {"vendor": vendor, "id": config_id, "updated_at": config.get("updated_at", 0), "config": config}
+        record["origin"] = self.origin
+        _atomic_write_text(
+            self.records / _record_name(vendor, config_id, digest),
+            json.dumps(record, ensure_ascii=False, indent=2),
+        )
+        report["files_written"] += 1
+        return digest
+
+    def _remove(self, name: str, report: dict) -> None:
+        try:
+            (self.records / name).unlink()
+            report["files_deleted"] += 1
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def _entry(vendor: str, config_id: str, config: dict | None, fallback: dict | None) -> dict:
+        return {
+            "vendor": vendor,
+            "id": config_id,
+            "name": (config or fallback or {}).get("name", ""),
+            "deleted": config is None,
+        }
+
+    def _load_state(self) -> dict:
+        try:
+            state = json.loads(self.state_path.read_text(encoding="utf-8"))
+            return state if isinstance(state, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def _save_state(self, state: dict) -> None:
+        try:
+            _atomic_write_text(self.state_path, json.dumps(state, ensure_ascii=False))
+        except OSError as e:
+            # 基线丢失只会让下次同步多比较一次，内容相同的记录不会重复传输
+            print(f"[警告] 写入同步状态失败: {e}")
+
+
+def sync(directory: Path | str, progress=None, cancelled=None) -> dict:
+    """与 directory 同步一次（见 ProfileSync.sync）"""
+    return ProfileSync(directory).sync(progress=progress, cancelled=cancelled)
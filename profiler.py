@@ -0,0 +1,162 @@
+"""
+性能采样模式 — 开启后每次 API 调用用 cProfile 记录耗时、用 tracemalloc 记录内存分配
+
+输出到 ~/.ai-switcher/profiles：
+    <时间>_<方法>.prof   单次调用的 cProfile 数据（python -m pstats / snakeviz 查看）
+    summary.json         滚动汇总：最慢的 N 次调用、内存峰值最大的 N 次调用及其主要分配位置
+
+默认关闭；通过环境变量 CODEPIVOT_PROFILE=1、settings.profile 或运行时 set_enabled() 开启。
+"""
+
+import cProfile
+import io
+import json
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+from clients import _atomic_write_text
+
+PROFILE_DIR = Path.home() / ".ai-switcher" / "profiles"
+TOP_N = 20
+MAX_DUMPS = 200
+
+# 3.12 起 cProfile 基于全进程唯一的 sys.monitoring，同一时间只能有一个 Profile 处于启用状态
+_EXCLUSIVE = sys.version_info >= (3, 12)
+
+
+class Profiler:
+    """
+    包装单次调用
+
+    嵌套调用（如 batch 内的方法）计入外层 profile；Python 3.12+ 上同一时间只采样一个调用，
+    与之并发的调用照常执行但不采样。内存峰值为进程级统计，并发调用时仅供参考。
+    """
+
+    def __init__(self, directory: Path = PROFILE_DIR, top_n: int = TOP_N):
+        self.directory = directory
+        self.top_n = top_n
+        self.enabled = False
+        self._busy = threading.Lock()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._slowest: list[dict] = []
+        self._largest: list[dict] = []
+        self._counts = {"profiled": 0, "skipped": 0}
+
+    def set_enabled(self, enabled: bool) -> dict:
+        with self._lock:
+            self.enabled = bool(enabled)
+            if self.enabled and not tracemalloc.is_tracing():
+                tracemalloc.start()
+            elif not self.enabled and tracemalloc.is_tracing():
+                tracemalloc.stop()
+        return self.summary()
+
+    def call(self, func, *args, **kwargs):
+        """执行 func；采样模式下记录 profile 与内存峰值"""
+        if not self.enabled or getattr(self._local, "active", False):
+            return func(*args, **kwargs)
+        if _EXCLUSIVE and not self._busy.acquire(blocking=False):
+            self._counts["skipped"] += 1
+            return func(*args, **kwargs)
+        self._local.active = True
+        try:
+            return self._profiled(func, args, kwargs)
+        finally:
+            self._local.active = False
+            if _EXCLUSIVE:
+                self._busy.release()
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "directory": str(self.directory),
+                **self._counts,
+                "slowest": list(self._slowest),
+                "largest_allocations": list(self._largest),
+            }
+
+    # ── 内部 ──────────────────────────────
+
+    def _profiled(self, func, args, kwargs):
+        name = getattr(func, "__qualname__", repr(func))
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+            before = tracemalloc.take_snapshot()
+            base, _ = tracemalloc.get_traced_memory()
+        profile = cProfile.Profile()
+        start = time.perf_counter()
+        error = None
+        try:
+            profile.enable()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profile.disable()
+        except Exception as e:
+            error = str(e)
+            raise
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            record = {
+                "method": name,
+                "elapsed_ms": round(elapsed_ms, 3),
+                "at": datetime.now().isoformat(timespec="seconds"),
+                "error": error,
+            }
+            if tracing:
+                _, peak = tracemalloc.get_traced_memory()
+                record["peak_kb"] = round((peak - base) / 1024, 1)
+                record["top_allocations"] = [
+                    f"{stat.traceback[0].filename}:{stat.traceback[0].lineno} +{stat.size_diff / 1024:.1f} KiB"
+                    for stat in tracemalloc.take_snapshot().compare_to(before, "lineno")[:5]
+                ]
+            try:
+                record["dump"] = str(self._dump(profile, name))
+                self._record(record, profile)
+            except OSError as e:
+                print(f"[警告] 写入性能数据失败: {e}")
+
+    def _dump(self, profile: cProfile.Profile, name: str) -> Path:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        path = self.directory / f"{stamp}_{name.replace('.', '-')}.prof"
+        profile.dump_stats(str(path))
+        dumps = sorted(self.directory.glob("*.prof"))
+        for old in dumps[: max(0, len(dumps) - MAX_DUMPS)]:
+            old.unlink(missing_ok=True)
+        return path
+
+    def _record(self, record: dict, profile: cProfile.Profile) -> None:
+        out = io.StringIO()
+        pstats.Stats(profile, stream=out).sort_stats("cumulative").print_stats(8)
+        record["hotspots"] = [
+            line.strip() for line in out.getvalue().splitlines() if line.strip()
+        ][-8:]
+        with self._lock:
+            self._counts["profiled"] += 1
+            self._slowest = sorted(
+                self._slowest + [record], key=lambda r: r["elapsed_ms"], reverse=True
+            )[: self.top_n]
+            if "peak_kb" in record:
+                self._largest = sorted(
+                    self._largest + [record], key=lambda r: r["peak_kb"], reverse=True
+                )[: self.top_n]
+            summary = {
+                **self._counts,
+                "slowest": self._slowest,
+                "largest_allocations": self._largest,
+            }
+        _atomic_write_text(
+            self.directory / "summary.json", json.dumps(summary, indent=2, ensure_ascii=False)
+        )
+
+
+profiler = Profiler()
@@ -0,0 +1,214 @@
+"""配置搜索索引 — 名称、API 地址主机名、模型、provider_id 的倒排索引，支持前缀与模糊匹配"""
+
+import bisect
+import heapq
+import re
+import threading
+from urllib.parse import urlparse
+
+# 字段权重：名称命中最相关
+FIELD_WEIGHTS = {"name": 3.0, "model": 2.0, "host": 2.0, "provider": 1.0}
+
+# 匹配方式的得分系数
+EXACT, PREFIX, FUZZY = 3.0, 2.0, 1.0
+
+# 参与模糊匹配的最短词长（过短的词编辑距离 1 几乎能匹配任何词）
+MIN_FUZZY_LEN = 4
+
+# 单词匹配结果缓存的上限（边输入边搜索时前面的词会被反复查询）
+MATCH_CACHE_SIZE = 256
+
+# 英文数字按连续串切分，中日韩字符逐字切分（中文名称无空格，逐字索引才能搜到中间的词）
+_TOKEN_RE = re.compile(r"[0-9a-z]+|[\u3040-\u30ff\u3400-\u9fff\uac00-\ud7af]")
+
+
+# 大于任何词内字符的哨兵，term + _MAX_CHAR 是以 term 为前缀的词在有序词表中的上界
+_MAX_CHAR = chr(0x10FFFF)
+
+
+def tokenize(text: str) -> list[str]:
+    return _TOKEN_RE.findall((text or "").lower())
+
+
+def _deletes(token: str) -> set[str]:
+    """删除一个字符得到的所有变体（对称删除法：两词编辑距离 ≤ 1 时必有公共变体或互为变体）"""
+    return {token[:i] + token[i + 1 :] for i in range(len(token))}
+
+
+def _fields(vendor: str, config: dict) -> dict[str, str]:
+    host = ""
+    try:
+        host = urlparse(config.get("api_url", "") or "").hostname or ""
+    except ValueError:
+        pass
+    model = config.get("model", "")
+    if vendor == "opencode":
+        model = " ".join(filter(None, [config.get("model_name", ""), model]))
+    return {
+        "name": config.get("name", ""),
+        "model": model,
+        "host": host,
+        "provider": config.get("provider_id", "") or config.get("provider_name", ""),
+    }
+
+
+class SearchIndex:
+    """
+    增量维护的倒排索引
+
+    与指纹索引相同：保存/删除时增量更新，config.json 被外部修改（签名不一致）时整体重建。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings: dict[str, dict[tuple[str, str], float]] = {}
+        self._vocab: list[str] = []  # 有序词表，用于前缀查找
+        self._variants: dict[str, set[str]] = {}  # 删除变体 → 原词，用于模糊查找
+        self._docs: dict[tuple[str, str], dict] = {}
+        self._doc_tokens: dict[tuple[str, str], tuple[str, ...]] = {}
+        self._match_cache: dict[str, dict[tuple[str, str], float]] = {}
+        self._signature = None
+
+    # ── 同步 ──────────────────────────────
+
+    def is_synced(self, signature) -> bool:
+        return signature is not None and signature == self._signature
+
+    def rebuild(self, data: dict, signature) -> None:
+        with self._lock:
+            self._postings, self._vocab, self._variants = {}, [], {}
+            self._docs, self._doc_tokens = {}, {}
+            self._match_cache.clear()
+            for vendor, vendor_data in data.get("vendors", {}).items():
+                for cfg in vendor_data.get("configs", []):
+                    self._upsert_unlocked(vendor, cfg)
+            self._signature = signature
+
+    def upsert(self, vendor: str, config: dict, before=None, after=None) -> None:
+        with self._lock:
+            self._upsert_unlocked(vendor, config)
+            self._advance(before, after)
+
+    def remove(self, vendor: str, config_id: str, before=None, after=None) -> None:
+        with self._lock:
+            self._remove_unlocked((vendor, config_id))
+            self._advance(before, after)
+
+    # ── 查询 ──────────────────────────────
+
+    def search(self, query: str, limit: int = 20, vendor: str | None = None) -> list[dict]:
+        """
+        多个查询词之间为“与”关系；每个词做精确与前缀匹配，都没有命中时才做模糊匹配
+
+        Returns:
+            list: [{"vendor", "id", "name", "api_url", "model", "score"}]，按得分降序
+        """
+        terms = tokenize(query)
+        if not terms:
+            return []
+        with self._lock:
+            per_term = [self._cached_match(term) for term in dict.fromkeys(terms)]
+            per_term.sort(key=len)
+            scores = per_term[0]
+            for matches in per_term[1:]:
+                scores = {d: s + matches[d] for d, s in scores.items() if d in matches}
+                if not scores:
+                    return []
+            if vendor:
+                scores = {d: s for d, s in scores.items() if d[0] == vendor}
+            top = heapq.nlargest(max(0, limit), scores, key=scores.get)
+            top.sort(key=lambda d: (-scores[d], self._docs[d]["name"]))
+            return [{**self._docs[d], "score": round(scores[d], 2)} for d in top]
+
+    def _cached_match(self, term: str) -> dict[tuple[str, str], float]:
+        result = self._match_cache.get(term)
+        if result is None:
+            if len(self._match_cache) >= MATCH_CACHE_SIZE:
+                self._match_cache.clear()
+            result = self._match_cache[term] = self._match(term)
+        return result
+
+    def _match(self, term: str) -> dict[tuple[str, str], float]:
+        """单个查询词命中的文档 → 得分（同一文档取最高的一种匹配）"""
+        exact = self._postings.get(term)
+        result = {doc: weight * EXACT for doc, weight in exact.items()} if exact else {}
+
+        def add(token: str, factor: float) -> None:
+            for doc, weight in self._postings[token].items():
+                score = weight * factor
+                if score > result.get(doc, 0):
+                    result[doc] = score
+
+        # 以 term 为前缀的词在有序词表中连续排列，二分出整个区间后全部合并（不截断，否则会漏掉结果）
+        lo = bisect.bisect_left(self._vocab, term)
+        hi = bisect.bisect_left(self._vocab, term + _MAX_CHAR, lo)
+        for token in self._vocab[lo:hi]:
+            if token != term:
+                add(token, PREFIX)
+        if not result and len(term) >= MIN_FUZZY_LEN:
+            candidates = set(self._variants.get(term, ()))
+            for variant in _deletes(term):
+                if variant in self._postings:
+                    candidates.add(variant)
+                candidates.update(self._variants.get(variant, ()))
+            for token in candidates:
+                if token != term:
+                    add(token, FUZZY)
+        return result
+
+    # ── 内部 ──────────────────────────────
+
+    def _advance(self, before, after) -> None:
+        if self.is_synced(before):
+            self._signature = after
+
+    def _upsert_unlocked(self, vendor: str, config: dict) -> None:
+        cid = config.get("id")
+        if not cid:
+            return
+        doc = (vendor, cid)
+        self._remove_unlocked(doc)
+        self._match_cache.clear()
+        weights: dict[str, float] = {}
+        for field, text in _fields(vendor, config).items():
+            for token in tokenize(text):
+                weights[token] = max(weights.get(token, 0), FIELD_WEIGHTS[field])
+        for token, weight in weights.items():
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = {}
+                bisect.insort(self._vocab, token)
+                if len(token) >= MIN_FUZZY_LEN:
+                    for variant in _deletes(token):
+                        self._variants.setdefault(variant, set()).add(token)
+            postings[doc] = weight
+        self._docs[doc] = {
+            "vendor": vendor,
+            "id": cid,
+            "name": config.get("name", ""),
+            "api_url": config.get("api_url", ""),
+            "model": config.get("model", ""),
+        }
+        self._doc_tokens[doc] = tuple(weights)
+
+    def _remove_unlocked(self, doc: tuple[str, str]) -> None:
+        self._match_cache.clear()
+        self._docs.pop(doc, None)
+        for token in self._doc_tokens.pop(doc, ()):
+            postings = self._postings.get(token)
+            if postings is None:
+                continue
+            postings.pop(doc, None)
+            if postings:
+                continue
+            del self._postings[token]
+            i = bisect.bisect_left(self._vocab, token)
+            if i < len(self._vocab) and self._vocab[i] == token:
+                del self._vocab[i]
+            if len(token) >= MIN_FUZZY_LEN:
+                for variant in _deletes(token):
+                    tokens = self._variants.get(variant)
+                    if tokens:
+                        tokens.discard(token)
+                        if not tokens:
+                            del self._variants[variant]
@@ -1,9 +1,12 @@
 """环境变量设置辅助工具 - 从命令行配置系统环境变量"""
 
 import argparse
+import contextlib
 import json
 import os
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 # 添加项目目录到路径
@@ -63,38 +66,49 @@ def show_vendors():
             print("    (无配置)")
         print()
 
-def deploy_vendor_config(vendor: str, config_name: str = None):
-    """部署指定厂商的配置到系统环境变量"""
-    vendors = cm.get_vendors()
+def _select_config(vendors: dict, vendor: str, config_name: str = None):
+    """
+    按名称选择配置，不指定时使用当前配置（没有则第一个）
 
+    Returns:
+        (配置, 提示)：找不到时配置为 None、提示为原因；回退到第一个配置时提示为警告
+    """
     if vendor not in vendors:
-        print_error(f"不支持的厂商: {vendor}")
-        print(f"支持的厂商: {', '.join(vendors.keys())}")
-        return False
-
-    vendor_data = vendors[vendor]
-    configs = vendor_data.get('configs', [])
+        return None, f"不支持的厂商: {vendor}"
 
+    configs = vendors[vendor].get('configs', [])
     if not configs:
-        print_error(f"厂商 {vendor} 没有任何配置")
-        return False
+        return None, f"厂商 {vendor} 没有任何配置"
 
-    # 选择配置
-    config = None
     if config_name:
         config = next((c for c in configs if c['name'] == config_name), None)
-        if not config:
-            print_error(f"未找到配置: {config_name}")
-            return False
-    else:
-        # 使用当前配置
-        current_id = vendor_data.get('current_config_id')
-        if current_id:
-            config = next((c for c in configs if c['id'] == current_id), None)
+        return (config, "") if config else (None, f"未找到配置: {config_name}")
 
-        if not config:
-            print_warning("没有当前配置，使用第一个配置")
-            config = configs[0]
+    # 使用当前配置
+    current_id = vendors[vendor].get('current_config_id')
+    config = next((c for c in configs if c['id'] == current_id), None) if current_id else None
+    if config:
+        return config, ""
+    return configs[0], "没有当前配置，使用第一个配置"
+
+def resolve_config(vendor: str, config_name: str = None):
+    """按名称选择配置（见 _select_config）；失败时打印原因并返回 (None, None)"""
+    vendors = cm.get_vendors()
+    config, note = _select_config(vendors, vendor, config_name)
+    if config is None:
+        print_error(note)
+        if vendor not in vendors:
+            print(f"支持的厂商: {', '.join(vendors.keys())}")
+        return None, None
+    if note:
+        print_warning(note)
+    return vendors[vendor], config
+
+def deploy_vendor_config(vendor: str, config_name: str = None):
+    """部署指定厂商的配置到系统环境变量"""
+    vendor_data, config = resolve_config(vendor, config_name)
+    if not config:
+        return False
 
     print_header(f"\n即将部署配置：{config['name']}")
     print(f"厂商: {vendor_data['display_name']}")
@@ -119,6 +133,8 @@ def deploy_vendor_config(vendor: str, config_name: str = None):
         print("已设置的环境变量：")
         for var in result.get('set_vars', []):
             print(f"  ✓ {var}")
+        for var in result.get('unchanged_vars', []):
+            print(f"  = {var}（未变化）")
 
         if result.get('failed_vars'):
             print()
@@ -160,6 +176,175 @@ def show_env_status(vendor: str = None):
                     print(f"  {var}: (未设置)")
     print()
 
+def _deploy_one(vendors: dict, vendor: str, config_name: str, switch: bool) -> dict:
+    """部署（可选先切换）一个厂商，返回带耗时的结果"""
+    start = time.perf_counter()
+    result = {"vendor": vendor, "config": None, "success": False, "message": "",
+              "set_vars": [], "unchanged_vars": [], "failed_vars": []}
+    config, note = _select_config(vendors, vendor, config_name)
+    if config is None:
+        result["message"] = note
+    else:
+        result["config"] = {"id": config["id"], "name": config.get("name", "")}
+        if note:
+            result["warning"] = note
+        try:
+            if switch:
+                sw = cm.switch_vendor_config(vendor, config["id"])
+                result["switch"] = {"success": sw["success"], "message": sw["message"]}
+            if switch and not result["switch"]["success"]:
+                result["message"] = result["switch"]["message"]
+            else:
+                env = ev.deploy_to_env_vars(vendor, config)
+                result.update(
+                    success=env["success"],
+                    message=env["message"],
+                    set_vars=env["set_vars"],
+                    unchanged_vars=env.get("unchanged_vars", []),
+                    failed_vars=env["failed_vars"],
+                )
+        except Exception as e:
+            result["message"] = str(e)
+    result["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 2)
+    return result
+
+def deploy_many(targets: list, config_name: str = None, switch: bool = False) -> dict:
+    """
+    在同一进程内并发部署多个厂商（各厂商的环境变量互不相交，config.json 的提交由比较并交换保证）
+
+    Returns:
+        dict: {"results": [按输入顺序], "summary": {"targets", "succeeded", "failed", "wall_ms"}}
+    """
+    start = time.perf_counter()
+    vendors = cm.get_vendors()
+    with ThreadPoolExecutor(max_workers=max(1, len(targets))) as pool:
+        results = list(pool.map(lambda v: _deploy_one(vendors, v, config_name, switch), targets))
+    succeeded = sum(1 for r in results if r["success"])
+    return {
+        "results": results,
+        "summary": {
+            "targets": len(results),
+            "succeeded": succeeded,
+            "failed": len(results) - succeeded,
+            "wall_ms": round((time.perf_counter() - start) * 1000, 2),
+        },
+    }
+
+def deploy_batch(targets: list, config_name: str, yes: bool, as_json: bool, switch: bool) -> bool:
+    """deploy 命令的非交互/多厂商入口"""
+    # JSON 模式下错误与过程中的提示信息输出到 stderr，保证 stdout 只有可直接解析的 JSON
+    with contextlib.redirect_stdout(sys.stderr if as_json else sys.stdout):
+        if not targets:
+            print_error("请指定厂商或使用 --all")
+            return False
+        if len(targets) > 1 and config_name:
+            print_error("--name 只能与单个厂商一起使用")
+            return False
+        if as_json and not yes:
+            print_error("--json 需要同时指定 --yes（JSON 模式不进行交互确认）")
+            return False
+
+        if not yes:
+            action = "切换并部署" if switch else "部署"
+            response = input(f"{Colors.WARNING}确认{action} {', '.join(targets)} 的配置到系统环境变量? (y/n): {Colors.ENDC}")
+            if response.lower() != 'y':
+                print_info("已取消")
+                return False
+
+        report = deploy_many(targets, config_name, switch)
+    if as_json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return report['summary']['failed'] == 0
+
+    for r in report['results']:
+        name = r['config']['name'] if r['config'] else '-'
+        line = f"  {r['vendor']}「{name}」: {r['message']} ({r['elapsed_ms']} ms)"
+        if r['success']:
+            print_success("  ✓" + line[1:])
+        else:
+            print(f"{Colors.FAIL}  ✗{line[1:]}{Colors.ENDC}")
+    s = report['summary']
+    print()
+    print_info(f"成功 {s['succeeded']} / 失败 {s['failed']}，总耗时 {s['wall_ms']} ms")
+    return s['failed'] == 0
+
+def fleet_apply(vendor: str, config_name: str, homes: list, jobs: int, backup: bool, as_json: bool):
+    """把配置并发写入多个用户主目录下的客户端配置文件"""
+    import glob
+    import fleet
+
+    # JSON 模式下错误与提示信息输出到 stderr，保证 stdout 只有可直接解析的 JSON
+    with contextlib.redirect_stdout(sys.stderr if as_json else sys.stdout):
+        _, config = resolve_config(vendor, config_name)
+        if not config:
+            return False
+
+        # 支持通配符，例如 --homes '/home/*'
+        targets = []
+        for pattern in homes:
+            matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+            targets.extend(Path(m) for m in matches)
+        if not targets:
+            print_error("没有匹配的主目录")
+            return False
+
+        report = fleet.apply_to_homes(vendor, config, targets, max_workers=jobs, backup=backup)
+    if as_json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return report['summary']['failed'] == 0
+
+    print_header(f"\n批量部署「{config['name']}」到 {len(targets)} 个主目录：")
+    for r in report['results']:
+        if r['success']:
+            print_success(f"  ✓ {r['home']} ({r['elapsed_ms']} ms)")
+        else:
+            failed = ', '.join(f"{k}: {v}" for k, v in r['clients'].items() if v != 'ok')
+            print(f"{Colors.FAIL}  ✗ {r['home']} — {failed}{Colors.ENDC}")
+    s = report['summary']
+    print()
+    print_info(
+        f"成功 {s['succeeded']} / 失败 {s['failed']}，总耗时 {s['wall_ms']} ms"
+        f"（单目标中位 {s['median_target_ms']} ms，最长 {s['max_target_ms']} ms，并发 {s['workers']}）"
+    )
+    return s['failed'] == 0
+
+def sync_profiles(directory: str, as_json: bool) -> bool:
+    """与共享目录双向同步配置，报告传输的记录与冲突"""
+    import profile_sync
+
+    # JSON 模式下错误与过程中的提示信息输出到 stderr，保证 stdout 只有可直接解析的 JSON
+    with contextlib.redirect_stdout(sys.stderr if as_json else sys.stdout):
+        directory = directory or cm.get_settings().get('sync_dir')
+        if not directory:
+            print_error("请指定同步目录，或在 config.json 的 settings.sync_dir 中设置")
+            return False
+        try:
+            report = profile_sync.sync(directory)
+        except (OSError, RuntimeError) as e:
+            print_error(f"同步失败: {e}")
+            return False
+    if as_json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return not report['errors']
+
+    print_header(f"\n同步 {report['directory']}：")
+    for r in report['pulled']:
+        print_success(f"  ↓ {r['vendor']}「{r['name'] or r['id']}」{'（已删除）' if r['deleted'] else ''}")
+    for r in report['pushed']:
+        print_success(f"  ↑ {r['vendor']}「{r['name'] or r['id']}」{'（已删除）' if r['deleted'] else ''}")
+    for c in report['conflicts']:
+        winner = '本机' if c['winner'] == 'local' else (c.get('remote_origin') or '同步目录')
+        print_warning(f"  冲突 {c['vendor']}「{c['name'] or c['id']}」: 保留 {winner} 的版本 {c.get('detail', '')}")
+    for e in report['errors']:
+        print_error(f"  {e}")
+    print()
+    print_info(
+        f"拉取 {len(report['pulled'])} / 上传 {len(report['pushed'])} / 冲突 {len(report['conflicts'])}，"
+        f"{report['unchanged']} 条未变化；读取 {report['files_read']} 个文件、写入 {report['files_written']} 个，"
+        f"耗时 {report['elapsed_ms']} ms"
+    )
+    return not report['errors']
+
 def main():
     parser = argparse.ArgumentParser(description='环境变量设置辅助工具')
     subparsers = parser.add_subparsers(dest='command', help='可用命令')
@@ -169,8 +354,26 @@ def main():
 
     # deploy 命令
     deploy_parser = subparsers.add_parser('deploy', help='部署配置到系统环境变量')
-    deploy_parser.add_argument('vendor', help='厂商标识 (claude/codex/gemini/opencode)')
-    deploy_parser.add_argument('--name', help='配置名称 (不指定则使用当前配置)')
+    deploy_parser.add_argument('vendor', nargs='*', help='厂商标识 (claude/codex/gemini/opencode)，可指定多个')
+    deploy_parser.add_argument('--name', help='配置名称 (不指定则使用当前配置，仅限单个厂商)')
+    deploy_parser.add_argument('--all', action='store_true', help='所有有配置的厂商')
+    deploy_parser.add_argument('--switch', action='store_true', help='同时切换客户端配置文件')
+    deploy_parser.add_argument('-y', '--yes', action='store_true', help='不确认直接执行')
+    deploy_parser.add_argument('--json', action='store_true', help='以 JSON 输出结果（需同时指定 --yes）')
+
+    # fleet 命令
+    fleet_parser = subparsers.add_parser('fleet', help='把配置并发写入多个用户主目录')
+    fleet_parser.add_argument('vendor', help='厂商标识 (claude/codex/gemini/opencode)')
+    fleet_parser.add_argument('--name', help='配置名称 (不指定则使用当前配置)')
+    fleet_parser.add_argument('--homes', nargs='+', required=True, help="目标主目录，支持通配符如 '/home/*'")
+    fleet_parser.add_argument('--jobs', type=int, default=8, help='最大并发数 (默认 8)')
+    fleet_parser.add_argument('--no-backup', action='store_true', help='写入前不备份')
+    fleet_parser.add_argument('--json', action='store_true', help='以 JSON 输出结果')
+
+    # sync 命令
+    sync_parser = subparsers.add_parser('sync', help='与共享目录同步配置')
+    sync_parser.add_argument('directory', nargs='?', help='同步目录 (不指定则使用 settings.sync_dir)')
+    sync_parser.add_argument('--json', action='store_true', help='以 JSON 输出结果')
 
     # status 命令
     status_parser = subparsers.add_parser('status', help='显示环境变量状态')
@@ -185,7 +388,20 @@ def main():
     if args.command == 'list':
         show_vendors()
     elif args.command == 'deploy':
-        deploy_vendor_config(args.vendor, args.name)
+        targets = list(dict.fromkeys(args.vendor))
+        if args.all:
+            targets = [vk for vk, v in cm.get_vendors().items() if v.get('configs')]
+        if len(targets) == 1 and not (args.yes or args.json or args.switch):
+            deploy_vendor_config(targets[0], args.name)
+        else:
+            ok = deploy_batch(targets, args.name, args.yes, args.json, args.switch)
+            sys.exit(0 if ok else 1)
+    elif args.command == 'fleet':
+        ok = fleet_apply(args.vendor, args.name, args.homes, args.jobs, not args.no_backup, args.json)
+        sys.exit(0 if ok else 1)
+    elif args.command == 'sync':
+        ok = sync_profiles(args.directory, args.json)
+        sys.exit(0 if ok else 1)
     elif args.command == 'status':
         show_env_status(args.vendor)
     else:
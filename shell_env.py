@@ -0,0 +1,132 @@
+"""
+预生成的终端环境变量脚本 — 当前配置的脚本在保存/切换时写出，终端内切换只需读取一个文件
+
+    eval "$(python shell_env.py claude)"                   # bash / zsh，当前配置
+    eval "$(python shell_env.py claude "My Relay")"        # 按名称或 id 指定配置
+    python shell_env.py --shell fish claude | source       # fish
+    python shell_env.py --shell pwsh claude | Invoke-Expression   # PowerShell
+
+也可以不经过 Python 直接加载：source ~/.ai-switcher/env/claude/current.sh
+
+其他配置的脚本在第一次加载时才生成（此时导入 config_manager / env_manager），
+配置被修改后删除、下次加载时重新生成；已生成的脚本只需标准库即可读取。
+"""
+
+import os
+import re
+import sys
+from pathlib import Path
+
+ENV_DIR = Path.home() / ".ai-switcher" / "env"
+
+# shell → 脚本扩展名（bash/zsh 共用 POSIX 语法）
+SHELL_EXT = {
+    "sh": "sh",
+    "bash": "sh",
+    "zsh": "sh",
+    "fish": "fish",
+    "powershell": "ps1",
+    "pwsh": "ps1",
+}
+
+CURRENT = "current"
+
+# 厂家与配置 id 直接作为文件名，只允许字母、数字、- 和 _（与 config_models.SAFE_ID 相同）
+_SAFE_NAME = re.compile(r"[A-Za-z0-9_-]{1,128}")
+
+
+def snippet_path(vendor: str, name: str, ext: str) -> Path:
+    """
+    脚本路径：~/.ai-switcher/env/<vendor>/<配置 id 或 current>.<ext>
+
+    厂家、id 含路径分隔符或 .. 等字符，或者解析后的路径不在 ENV_DIR/<vendor> 下时抛出 ValueError。
+    """
+    if not (_SAFE_NAME.fullmatch(vendor) and _SAFE_NAME.fullmatch(name) and ext in SHELL_EXT.values()):
+        raise ValueError(f"非法的环境变量脚本名: {vendor!r} / {name!r}.{ext}")
+    base = ENV_DIR / vendor
+    path = base / f"{name}.{ext}"
+    if path.resolve().parent != base.resolve():
+        raise ValueError(f"环境变量脚本路径超出 {base}: {path}")
+    return path
+
+
+def header(vendor: str, name: str) -> str:
+    """脚本首行注释，记录配置名称，供按名称查找（三种 shell 的注释符都是 #）"""
+    return f"# CodePivot {vendor}: {name.replace(chr(10), ' ')}"
+
+
+def default_shell() -> str:
+    if sys.platform == "win32":
+        return "powershell"
+    return Path(os.environ.get("SHELL", "bash")).name
+
+
+def find_snippet(vendor: str, config: str | None = None, shell: str | None = None) -> Path | None:
+    """定位脚本：未指定配置时返回当前配置；指定时先按 id 再按名称匹配，尚未生成时按需生成"""
+    ext = SHELL_EXT.get(shell or default_shell(), "sh")
+    if not _SAFE_NAME.fullmatch(vendor):
+        return None
+    name = config or CURRENT
+    if _SAFE_NAME.fullmatch(name):
+        try:
+            target = snippet_path(vendor, name, ext)
+        except ValueError:
+            return None
+        if target.exists():
+            return target
+    if not config:
+        return None
+    wanted = header(vendor, config)
+    for path in (ENV_DIR / vendor).glob(f"*.{ext}"):
+        if path.stem == CURRENT:
+            continue
+        try:
+            with path.open(encoding="utf-8") as f:
+                if f.readline().rstrip("\n") == wanted:
+                    return path
+        except OSError:
+            continue
+    return _generate(vendor, config, ext)
+
+
+def _generate(vendor: str, config: str | None, ext: str) -> Path | None:
+    """按 id 或名称找到已保存的配置并写出其脚本（未指定配置时写出 current.*）"""
+    import config_manager as cm
+    import env_manager as ev
+
+    view = cm.get_vendor(vendor)
+    if view is None:
+        return None
+    wanted = config or view.get("current_config_id")
+    configs = view.get("configs", [])
+    match = next((c for c in configs if c["id"] == wanted), None)
+    if match is None and config:
+        match = next((c for c in configs if c.get("name") == config), None)
+    if match is None:
+        return None
+    try:
+        written = ev.write_env_scripts(vendor, match, current=not config)
+    except (OSError, ValueError):
+        return None
+    return next((p for p in written if p.suffix == f".{ext}"), None)
+
+
+def main(argv: list[str] | None = None) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="输出预生成的环境变量脚本")
+    parser.add_argument("--shell", choices=sorted(SHELL_EXT), help="目标 shell（默认按 $SHELL 判断）")
+    parser.add_argument("vendor", help="厂商标识 (claude/codex/gemini/opencode)")
+    parser.add_argument("config", nargs="?", help="配置名称或 id（不指定则使用当前配置）")
+    args = parser.parse_args(argv)
+
+    path = find_snippet(args.vendor, args.config, args.shell)
+    if path is None:
+        print(f"未找到环境变量脚本: {args.vendor} {args.config or CURRENT}（请先在应用中保存或切换配置）", file=sys.stderr)
+        return 1
+    sys.stdout.write(path.read_text(encoding="utf-8"))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
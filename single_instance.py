@@ -0,0 +1,128 @@
+"""
+单实例 — 主窗口只运行一个；再次启动时把参数转发给已运行的实例后立即退出
+
+    python main.py                          # 已在运行：激活已有窗口
+    python main.py switch claude "My Relay" # 已在运行：由已有进程完成切换（含环境变量部署）
+
+传输层与守护进程相同（Unix socket / Windows 命名管道，见 daemon.py），地址与守护进程分开，
+两者可以同时运行。转发端只依赖标准库，不导入 webview 和 config_manager，转发耗时为毫秒级。
+"""
+
+import atexit
+import os
+import threading
+import time
+from pathlib import Path
+
+import daemon
+from file_lock import _os_lock
+
+SOCKET_PATH = daemon.STATE_DIR / "codepivot-gui.sock"
+PIPE_NAME = daemon.PIPE_NAME.replace("codepivot-", "codepivot-gui-")
+LOCK_PATH = daemon.STATE_DIR / "gui.lock"
+
+# 另一个实例正在启动（已持有锁、尚未开始监听）时，等待其就绪的最长时间
+STARTUP_WAIT = 5.0
+
+_lock_fd: int | None = None
+
+
+def _address():
+    return PIPE_NAME if daemon.IS_WINDOWS else SOCKET_PATH
+
+
+def parse_command(argv: list[str]) -> dict:
+    """
+    把命令行参数解析为实例命令（转发给已有实例与本进程首次启动共用）
+
+    Raises:
+        ValueError: 参数不合法，消息为用法说明
+    """
+    if argv and argv[0] == "switch":
+        if len(argv) != 3:
+            raise ValueError("用法: switch <厂家> <配置名称或 id>")
+        return {"cmd": "switch", "vendor": argv[1], "config": argv[2]}
+    return {"cmd": "activate"}
+
+
+def forward(argv: list[str], timeout: float = 5.0) -> dict | None:
+    """
+    把命令行参数转发给已运行的实例
+
+    Returns:
+        实例的响应；没有实例在运行时返回 None
+    """
+    try:
+        message = parse_command(argv)
+    except ValueError as e:
+        return {"ok": False, "error": str(e)}
+    try:
+        return daemon.request(timeout=timeout, address=_address(), **message)
+    except ConnectionError:
+        return None
+
+
+def claim() -> bool:
+    """尝试成为唯一实例；锁随进程退出自动释放，异常退出也不会残留"""
+    global _lock_fd
+    LOCK_PATH.parent.mkdir(parents=True, exist_ok=True)
+    fd = os.open(LOCK_PATH, os.O_RDWR | os.O_CREAT, 0o600)
+    if _os_lock(fd, exclusive=True, blocking=False):
+        _lock_fd = fd  # 保持描述符打开直到进程结束
+        return True
+    os.close(fd)
+    return False
+
+
+def forward_or_claim(argv: list[str]) -> dict | None:
+    """
+    已有实例则转发并返回其响应；否则成为实例并返回 None
+
+    两个进程同时启动时只有一个能拿到锁，另一个等待它开始监听后再转发。
+    """
+    deadline = time.monotonic() + STARTUP_WAIT
+    while True:
+        response = forward(argv)
+        if response is not None:
+            return response
+        if claim():
+            return None
+        if time.monotonic() > deadline:
+            return {"ok": False, "error": "已有实例正在启动但未响应"}
+        time.sleep(0.05)
+
+
+class InstanceState(daemon.DaemonState):
+    """在守护进程命令之外支持 activate；切换走 Api，与窗口内切换行为一致"""
+
+    def __init__(self, api, on_activate=None):
+        super().__init__()
+        self._api = api
+        self._on_activate = on_activate
+        self._handlers["activate"] = self._activate
+
+    def _activate(self, message: dict) -> bool:
+        if self._on_activate:
+            self._on_activate()
+        return True
+
+    def _perform_switch(self, vendor: str, config_id: str) -> dict:
+        return self._api.switch_vendor_config(vendor, config_id)
+
+
+def listen(api, on_activate=None) -> InstanceState:
+    """在后台线程中接收其他启动实例转发的命令（调用前需已 claim()）"""
+    import config_manager as cm
+    from file_watcher import FileWatcher
+
+    state = InstanceState(api, on_activate)
+    FileWatcher(cm.watched_paths(), state.invalidate, debounce=0.05).start()
+    if daemon.IS_WINDOWS:
+        target = daemon._serve_pipe
+    else:
+        # 已持有实例锁，残留的 socket 文件一定来自上次异常退出
+        Path(SOCKET_PATH).unlink(missing_ok=True)
+        atexit.register(Path(SOCKET_PATH).unlink, missing_ok=True)
+        target = daemon._serve_unix
+    threading.Thread(target=target, args=(state, _address()), name="single-instance", daemon=True).start()
+    return state
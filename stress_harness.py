@@ -0,0 +1,422 @@
+"""
+并发压力测试 — 多进程 × 多线程同时保存/删除/切换配置，统计吞吐与延迟并检查不变量
+
+用法：
+    python stress_harness.py                         # 默认 3 进程 × 4 线程 × 每线程 60 次操作
+    python stress_harness.py -p 4 -t 8 -n 200 --json
+    python stress_harness.py --prestage --keep       # 同时开启预生成，保留沙箱目录便于排查
+    python stress_harness.py --switch-only --trials 40   # 只在两个配置间并发切换，重复 40 轮
+
+所有读写都在临时沙箱中进行（HOME 与 config.json 均指向沙箱），不会触碰真实配置。
+检查的不变量：
+    1. 没有丢失的更新：最终 config.json 与各线程记录的期望内容逐条一致
+    2. generation 等于成功写入次数（每次保存/删除/切换恰好提交一次）
+    3. current_config_id 为空或指向存在的配置
+    4. 沙箱内没有 _atomic_write_text 遗留的 .tmp 临时文件
+    5. 各客户端配置文件都能被解析
+    6. 每个客户端的备份数量不超过 MAX_BACKUPS（加上并发写入者数量的余量）
+    7. 各客户端文件中生效的密钥属于该厂家 current_config_id 指向的配置（切换写入与提交一致）
+任一不变量失败或出现未预期的异常时退出码为 1。
+"""
+
+import argparse
+import json
+import multiprocessing as mp
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from queue import Empty
+
+PROJECT_DIR = Path(__file__).parent
+VENDORS = ("claude", "codex", "gemini", "opencode")
+
+# 操作比例：保存 / 切换 / 删除
+OP_WEIGHTS = {"save": 50, "switch": 35, "delete": 15}
+
+# --switch-only：所有线程都在同一厂家的两个配置之间来回切换
+SWITCH_ONLY_WEIGHTS = {"save": 0, "switch": 1, "delete": 0}
+SWITCH_ONLY_VENDOR = "claude"
+
+
+def _percentiles(samples: list[float]) -> dict:
+    if not samples:
+        return {"count": 0}
+    s = sorted(samples)
+
+    def pick(q: float) -> float:
+        return round(s[min(len(s) - 1, int(q * len(s)))], 2)
+
+    return {"count": len(s), "p50": pick(0.5), "p95": pick(0.95), "p99": pick(0.99), "max": round(s[-1], 2)}
+
+
+# ── 工作进程 ──────────────────────────────────────
+
+
+def _worker(
+    index: int, sandbox: str, threads: int, ops: int, seed: int, queue, weights: dict, vendors: tuple
+) -> None:
+    """在沙箱中运行 threads 个线程，每个线程按 weights 执行 ops 次随机操作，结果放入 queue"""
+    sys.path.insert(0, str(PROJECT_DIR))
+    import config_manager as cm
+
+    cm.CONFIG_PATH = Path(sandbox) / "config.json"
+
+    latencies = {op: [] for op in OP_WEIGHTS}
+    expected: dict[str, dict] = {}  # 配置 id → 最后一次保存的内容（None 表示已删除）
+    vendors_of: dict[str, str] = {}
+    keys_of: dict[str, list[str]] = {}  # 配置 id → 保存过的所有密钥（每次保存的密钥都不同）
+    errors: list[str] = []
+    writes = [0]
+    lock = threading.Lock()
+
+    def run(tid: int) -> None:
+        rng = random.Random(seed * 1000 + index * 100 + tid)
+        mine: list[str] = []
+        for n in range(ops):
+            op = rng.choices(list(weights), weights=list(weights.values()))[0]
+            if op == "delete" and not mine:
+                op = "save"
+            start = time.perf_counter()
+            try:
+                if op == "save":
+                    vendor = rng.choice(vendors)
+                    if mine and rng.random() < 0.4:
+                        # 更新自己的配置（厂家不变）
+                        cid = rng.choice(mine)
+                        vendor = vendors_of[cid]
+                        payload = {"id": cid}
+                    else:
+                        payload = {}
+                    payload.update(
+                        name=f"w{index}-t{tid}-{n}",
+                        api_url=f"https://relay{rng.randint(1, 5)}.example.com/v1",
+                        api_key=f"sk-{index}-{tid}-{n}",
+                        model=f"rev-{index}-{tid}-{n}",
+                    )
+                    saved = cm.save_vendor_config(vendor, payload)
+                    with lock:
+                        expected[saved["id"]] = dict(saved)
+                        vendors_of[saved["id"]] = vendor
+                        keys_of.setdefault(saved["id"], []).append(saved["api_key"])
+                        writes[0] += 1
+                    if saved["id"] not in mine:
+                        mine.append(saved["id"])
+                elif op == "delete":
+                    cid = mine.pop(rng.randrange(len(mine)))
+                    if cm.delete_vendor_config(vendors_of[cid], cid):
+                        with lock:
+                            expected[cid] = None
+                            writes[0] += 1
+                    else:
+                        errors.append(f"删除自己的配置失败: {cid}")
+                else:
+                    vendor = rng.choice(vendors)
+                    configs = (cm.get_vendor(vendor) or {}).get("configs", [])
+                    if not configs:
+                        continue
+                    result = cm.switch_vendor_config(vendor, rng.choice(configs)["id"])
+                    if result["success"]:
+                        with lock:
+                            writes[0] += 1
+                    elif result["message"] not in ("配置不存在", "配置在切换期间被删除"):
+                        # 其他线程刚删除了目标配置属于正常竞争，其余失败都要报告
+                        errors.append(f"切换失败: {result['message']} {result['details']}")
+            except Exception as e:
+                errors.append(f"{op}: {type(e).__name__}: {e}")
+            latencies[op].append((time.perf_counter() - start) * 1000)
+
+    pool = [threading.Thread(target=run, args=(t,)) for t in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    cm.flush()
+    queue.put(
+        {
+            "latencies": latencies,
+            "expected": expected,
+            "vendors_of": vendors_of,
+            "keys_of": keys_of,
+            "errors": errors,
+            "writes": writes[0],
+        }
+    )
+
+
+# ── 不变量检查 ────────────────────────────────────
+
+
+def _check(sandbox: Path, results: list[dict], workers: int, merged_writes: bool) -> list[dict]:
+    sys.path.insert(0, str(PROJECT_DIR))
+    import config_manager as cm
+    from client_registry import registry
+    from clients import MAX_BACKUPS
+    from jsonc_editor import strip_jsonc
+
+    try:
+        import tomllib
+    except ImportError:  # Python < 3.11
+        tomllib = None
+
+    checks = []
+
+    def check(name: str, ok: bool, detail: str = "") -> None:
+        checks.append({"name": name, "ok": bool(ok), "detail": detail})
+
+    # 多轮运行时本进程的 HOME 每轮都会变，客户端实例显式指向本轮沙箱的主目录
+    clients = {}
+    for key in registry.keys():
+        try:
+            clients[key] = registry.create(key, home=sandbox / "home")
+        except Exception:
+            clients[key] = None
+
+    data = json.loads((sandbox / "config.json").read_text(encoding="utf-8"))
+    stored = {
+        c["id"]: (vk, c)
+        for vk, v in data["vendors"].items()
+        for c in v["configs"]
+    }
+
+    # 1. 没有丢失的更新
+    expected, vendors_of = {}, {}
+    for r in results:
+        expected.update(r["expected"])
+        vendors_of.update(r["vendors_of"])
+    missing = [cid for cid, cfg in expected.items() if cfg is not None and cid not in stored]
+    resurrected = [cid for cid, cfg in expected.items() if cfg is None and cid in stored]
+    stale = [
+        cid
+        for cid, cfg in expected.items()
+        if cfg is not None and cid in stored
+        and (stored[cid][0] != vendors_of[cid] or stored[cid][1].get("model") != cfg["model"])
+    ]
+    unknown = [cid for cid in stored if cid not in expected]
+    check(
+        "没有丢失的更新",
+        not (missing or resurrected or stale or unknown),
+        f"期望 {sum(1 for c in expected.values() if c)} 条，实际 {len(stored)} 条；"
+        f"丢失 {len(missing)}，删除后复现 {len(resurrected)}，内容过期 {len(stale)}，来历不明 {len(unknown)}",
+    )
+
+    # 2. 每次成功写入恰好提交一次（延迟写入会合并多次保存，不适用）
+    if not merged_writes:
+        writes = sum(r["writes"] for r in results)
+        check("generation 等于成功写入次数", data.get("generation") == writes,
+              f"generation={data.get('generation')}，成功写入 {writes} 次")
+
+    # 3. current_config_id 有效
+    dangling = [
+        vk for vk, v in data["vendors"].items()
+        if v.get("current_config_id") and v["current_config_id"] not in {c["id"] for c in v["configs"]}
+    ]
+    check("current_config_id 有效", not dangling, ", ".join(dangling))
+
+    # 4. 没有遗留的临时文件
+    orphans = [str(p) for p in sandbox.rglob(".*.tmp")]
+    check("没有遗留的 .tmp 文件", not orphans, "; ".join(orphans[:5]))
+
+    # 5. 客户端文件可解析
+    bad = []
+    for key in registry.keys():
+        client = clients.get(key)
+        for path in client.config_paths if client else []:
+            if not path.exists():
+                continue
+            text = path.read_text(encoding="utf-8")
+            try:
+                if path.suffix in (".json", ".jsonc"):
+                    json.loads(strip_jsonc(text))
+                elif path.suffix == ".toml" and tomllib:
+                    tomllib.loads(text)
+            except ValueError as e:
+                bad.append(f"{path}: {e}")
+    check("客户端文件可解析", not bad, "; ".join(bad[:5]))
+
+    # 6. 备份数量有界
+    backup_dir = Path(data.get("settings", {}).get("backup_dir", ""))
+    counts = {}
+    if backup_dir.is_dir():
+        for key in registry.keys():
+            client = clients.get(key)
+            if client:
+                counts[client.display_name] = len(list(backup_dir.glob(f"{client.display_name}_*")))
+    limit = MAX_BACKUPS + workers
+    check("备份数量有界", all(n <= limit for n in counts.values()), f"上限 {limit}，实际 {counts}")
+
+    # 7. 客户端文件与 current_config_id 一致：切换之后该配置可能又被保存过（不会重写客户端），
+    #    因此比较的是它保存过的任一版本的密钥
+    keys_of: dict[str, set] = {}
+    for r in results:
+        for cid, keys in r["keys_of"].items():
+            keys_of.setdefault(cid, set()).update(keys)
+    drifted = []
+    for vk, v in data["vendors"].items():
+        current = v.get("current_config_id")
+        if not current:
+            continue
+        for key in cm.vendor_clients(vk):
+            client = clients.get(key)
+            live = {c.get("api_key") for c in client.read_live()} if client else set()
+            if not live & keys_of.get(current, set()):
+                drifted.append(f"{vk}/{key}: 生效 {sorted(live) or '无'}，current={current}")
+    check("客户端文件与 current_config_id 一致", not drifted, "; ".join(drifted[:5]))
+    return checks
+
+
+# ── 入口 ──────────────────────────────────────────
+
+
+def _seed_switch_configs(sandbox: str, queue) -> None:
+    """--switch-only 的初始数据：为 SWITCH_ONLY_VENDOR 保存两个配置，按工作进程结果的格式放入 queue"""
+    sys.path.insert(0, str(PROJECT_DIR))
+    import config_manager as cm
+
+    cm.CONFIG_PATH = Path(sandbox) / "config.json"
+    expected, vendors_of, keys_of = {}, {}, {}
+    for name in ("A", "B"):
+        saved = cm.save_vendor_config(
+            SWITCH_ONLY_VENDOR,
+            {"name": name, "api_url": f"https://{name.lower()}.example.com", "api_key": f"sk-{name}"},
+        )
+        expected[saved["id"]] = saved
+        vendors_of[saved["id"]] = SWITCH_ONLY_VENDOR
+        keys_of[saved["id"]] = [saved["api_key"]]
+    queue.put(
+        {
+            "latencies": {op: [] for op in OP_WEIGHTS},
+            "expected": expected,
+            "vendors_of": vendors_of,
+            "keys_of": keys_of,
+            "errors": [],
+            "writes": len(expected),
+        }
+    )
+
+
+def _run(args, seed: int) -> dict:
+    """在一个新沙箱中运行一轮压力测试并检查不变量，返回报告（工作进程异常退出时返回 None）"""
+    sandbox = Path(tempfile.mkdtemp(prefix="codepivot-stress-"))
+    home = sandbox / "home"
+    home.mkdir()
+    # 子进程以 spawn 方式启动，在导入任何模块前就使用沙箱 HOME
+    os.environ["HOME"] = os.environ["USERPROFILE"] = str(home)
+    os.environ["CODEPIVOT_PRESTAGE"] = "1" if args.prestage else "0"
+    os.environ["CODEPIVOT_WRITE_BEHIND"] = "1" if args.write_behind else "0"
+
+    ctx = mp.get_context("spawn")
+    queue = ctx.Queue()
+    results = []
+    if args.switch_only:
+        # 初始配置也在子进程中写入：config_manager 的默认设置（如备份目录）在导入时按 HOME 确定
+        seeder = ctx.Process(target=_seed_switch_configs, args=(str(sandbox), queue))
+        seeder.start()
+        seeder.join()
+        if seeder.exitcode != 0:
+            print("[错误] 写入初始配置失败", file=sys.stderr)
+            shutil.rmtree(sandbox, ignore_errors=True)
+            return None
+        results.append(queue.get())
+        weights, vendors = SWITCH_ONLY_WEIGHTS, (SWITCH_ONLY_VENDOR,)
+    else:
+        weights, vendors = OP_WEIGHTS, VENDORS
+    procs = [
+        ctx.Process(
+            target=_worker,
+            args=(i, str(sandbox), args.threads, args.ops, seed, queue, weights, vendors),
+        )
+        for i in range(args.processes)
+    ]
+    start = time.perf_counter()
+    for p in procs:
+        p.start()
+    expected_results = len(procs) + len(results)
+    while len(results) < expected_results:
+        try:
+            results.append(queue.get(timeout=1))
+        except Empty:
+            # 工作进程异常退出时不会放入结果，不能一直等下去
+            if not any(p.is_alive() for p in procs) and queue.empty():
+                print(f"[错误] {expected_results - len(results)} 个工作进程异常退出", file=sys.stderr)
+                shutil.rmtree(sandbox, ignore_errors=True)
+                return None
+    wall = time.perf_counter() - start
+    for p in procs:
+        p.join()
+
+    checks = _check(sandbox, results, args.processes * args.threads, args.write_behind)
+    errors = [e for r in results for e in r["errors"]]
+    latencies = {op: [x for r in results for x in r["latencies"][op]] for op in OP_WEIGHTS}
+    total = sum(len(v) for v in latencies.values())
+    if not args.keep:
+        shutil.rmtree(sandbox, ignore_errors=True)
+    return {
+        "workers": {"processes": args.processes, "threads": args.threads, "ops_per_thread": args.ops},
+        "seed": seed,
+        "wall_s": round(wall, 2),
+        "ops": total,
+        "ops_per_s": round(total / wall, 1) if wall else 0,
+        "latency_ms": {op: _percentiles(v) for op, v in latencies.items()},
+        "checks": checks,
+        "errors": errors[:20],
+        "error_count": len(errors),
+        "sandbox": str(sandbox) if args.keep else None,
+        "ok": all(c["ok"] for c in checks) and not errors,
+    }
+
+
+def _print_report(report: dict) -> None:
+    print(f"{report['ops']} 次操作，耗时 {report['wall_s']} s，{report['ops_per_s']} ops/s")
+    for op, p in report["latency_ms"].items():
+        if p["count"]:
+            print(f"  {op:<7} n={p['count']:<5} p50={p['p50']}ms p95={p['p95']}ms p99={p['p99']}ms max={p['max']}ms")
+    for c in report["checks"]:
+        print(f"  [{'通过' if c['ok'] else '失败'}] {c['name']}  {c['detail']}")
+    if report["errors"]:
+        print(f"  异常 {report['error_count']} 个：")
+        for e in report["errors"]:
+            print(f"    {e}")
+    if report["sandbox"]:
+        print(f"  沙箱: {report['sandbox']}")
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="CodePivot 并发压力测试")
+    parser.add_argument("-p", "--processes", type=int, default=3, help="进程数 (默认 3)")
+    parser.add_argument("-t", "--threads", type=int, default=4, help="每进程线程数 (默认 4)")
+    parser.add_argument("-n", "--ops", type=int, default=60, help="每线程操作次数 (默认 60)")
+    parser.add_argument("--seed", type=int, default=1, help="随机种子（第 i 轮使用 seed + i）")
+    parser.add_argument("--trials", type=int, default=1, help="重复轮数，每轮使用新的沙箱 (默认 1)")
+    parser.add_argument("--switch-only", action="store_true", help="只在同一厂家的两个配置之间并发切换")
+    parser.add_argument("--prestage", action="store_true", help="开启切换产物预生成")
+    parser.add_argument("--write-behind", action="store_true", help="开启 config.json 延迟写入")
+    parser.add_argument("--keep", action="store_true", help="保留沙箱目录")
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出结果")
+    args = parser.parse_args(argv)
+
+    reports = []
+    for trial in range(max(1, args.trials)):
+        report = _run(args, args.seed + trial)
+        if report is None:
+            return 1
+        reports.append(report)
+        if not args.json:
+            if args.trials > 1:
+                print(f"第 {trial + 1}/{args.trials} 轮（seed={report['seed']}）：", end="")
+            _print_report(report)
+
+    failed = sum(1 for r in reports if not r["ok"])
+    if args.json:
+        print(json.dumps(reports[0] if len(reports) == 1 else reports, ensure_ascii=False, indent=2))
+    elif len(reports) > 1:
+        print(f"{len(reports)} 轮中 {failed} 轮失败")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
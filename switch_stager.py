@@ -0,0 +1,233 @@
+"""
+切换产物预生成 — 后台为每个配置提前渲染并 fsync 各客户端的目标文件，切换时只需 rename
+
+预生成文件包含 API 密钥，放在本程序自己的 ~/.ai-switcher/staged/<进程号>/ 下（目录 0700、文件 0600），
+不写进客户端的配置目录；文件名只含序号、客户端与目标文件名，不含配置 id。
+os.replace 只在同一文件系统内是原子操作，目标文件与该目录不在同一文件系统时不预生成。
+每个产物记录渲染时目标文件的 (inode, 大小, mtime)：目标文件之后被任何人修改（包括一次切换），
+签名不再匹配，产物即失效，切换回退到正常的读取-合并-写入流程，不会覆盖外部修改。
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+from clients import _atomic_write_text, _record_own_write
+
+STAGE_ROOT = Path.home() / ".ai-switcher" / "staged"
+
+# 旧版本放在客户端配置目录下的预生成目录，遇到时删除
+LEGACY_DIRNAME = ".codepivot-staged"
+
+# 其他进程异常退出后遗留的预生成目录，超过这个时间未修改即清理
+ORPHAN_AGE = 24 * 3600
+
+
+def _signature(path: Path) -> tuple | None:
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+def _data_key(data: dict) -> str:
+    return hashlib.sha1(json.dumps(data, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+@dataclass
+class _Artifact:
+    """一个 (客户端, 配置) 的预生成结果"""
+
+    data_key: str
+    files: list[tuple[Path, Path, tuple | None]]  # (目标, 预生成文件, 渲染时目标签名)
+
+    def discard(self) -> None:
+        for _, staged, _ in self.files:
+            try:
+                staged.unlink(missing_ok=True)
+            except OSError:
+                pass
+
+
+class SwitchStager:
+    """预生成产物的登记表与后台渲染线程"""
+
+    def __init__(self):
+        self._artifacts: dict[tuple[str, str], _Artifact] = {}
+        self._pending: dict[tuple[str, str], tuple] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._worker: threading.Thread | None = None
+        self._seq = 0
+        self._closed = False
+        self._dir = STAGE_ROOT / str(os.getpid())
+        self._devices: dict[Path, bool] = {}  # 目标目录 → 是否与预生成目录同一文件系统
+        self._stats = {"staged": 0, "hits": 0, "misses": 0, "stale": 0, "errors": 0, "cross_device": 0}
+
+    def schedule(self, client_key: str, client, config_id: str, data: dict) -> None:
+        """登记后台预生成；同一 (客户端, 配置) 未处理的旧请求被覆盖"""
+        with self._lock:
+            if self._closed:
+                return
+            self._pending[(client_key, config_id)] = (client, data)
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="switch-stager", daemon=True)
+                self._worker.start()
+        self._wake.set()
+
+    def stage(self, client_key: str, client, config_id: str, data: dict) -> bool:
+        """立即渲染并写出预生成文件，成功返回 True"""
+        signatures = {path: _signature(path) for path in client.config_paths}
+        try:
+            rendered = client.render(data)
+        except Exception:
+            self._stats["errors"] += 1
+            return False
+        if not all(self._same_device(target.parent) for target in rendered):
+            self._stats["cross_device"] += 1
+            return False
+        with self._lock:
+            self._seq += 1
+            seq = self._seq
+        files = []
+        artifact = _Artifact(_data_key(data), files)
+        try:
+            for target, content in rendered.items():
+                staged = self._dir / f"{seq}.{client_key}.{target.name}"
+                _atomic_write_text(staged, content)
+                files.append((target, staged, signatures.get(target, _signature(target))))
+        except OSError:
+            artifact.discard()
+            self._stats["errors"] += 1
+            return False
+        # 渲染期间目标文件被修改则产物一出生就过期
+        if any(_signature(t) != sig for t, _, sig in files):
+            artifact.discard()
+            self._stats["stale"] += 1
+            return False
+        with self._lock:
+            old = self._artifacts.get((client_key, config_id))
+            self._artifacts[(client_key, config_id)] = artifact
+            self._stats["staged"] += 1
+        if old:
+            old.discard()
+        return True
+
+    def try_switch(self, client_key: str, config_id: str, data: dict) -> bool:
+        """
+        用预生成产物完成切换（逐个 os.replace；中途失败时恢复已替换的文件后抛出异常）
+
+        Returns:
+            False 表示没有可用产物（未生成、配置已变或目标文件已被修改），调用方应走正常写入
+        """
+        with self._lock:
+            artifact = self._artifacts.pop((client_key, config_id), None)
+        if artifact is None or artifact.data_key != _data_key(data):
+            self._stats["misses"] += 1
+            if artifact:
+                artifact.discard()
+            return False
+        for target, staged, sig in artifact.files:
+            if _signature(target) != sig or not staged.exists():
+                self._stats["stale"] += 1
+                artifact.discard()
+                return False
+        replaced: list[tuple[Path, bytes | None]] = []
+        try:
+            for target, staged, _ in artifact.files:
+                old = target.read_bytes() if target.exists() else None
+                os.replace(staged, target)
+                _record_own_write(target)
+                replaced.append((target, old))
+        except OSError:
+            for target, old in reversed(replaced):
+                if old is not None:
+                    _atomic_write_text(target, old.decode("utf-8"))
+                else:
+                    target.unlink(missing_ok=True)
+                _record_own_write(target)
+            artifact.discard()
+            self._stats["errors"] += 1
+            raise
+        self._stats["hits"] += 1
+        return True
+
+    def drop(self, config_id: str) -> None:
+        """配置被删除时清理它在所有客户端下的产物"""
+        with self._lock:
+            keys = [k for k in self._artifacts if k[1] == config_id]
+            dropped = [self._artifacts.pop(k) for k in keys]
+            for k in [k for k in self._pending if k[1] == config_id]:
+                del self._pending[k]
+        for artifact in dropped:
+            artifact.discard()
+
+    def close(self, timeout: float = 5.0) -> None:
+        """放弃未处理的请求，等待正在进行的渲染完成后删除本进程的所有产物（进程退出前调用）"""
+        with self._lock:
+            self._closed = True
+            self._pending.clear()
+            worker = self._worker
+            artifacts = list(self._artifacts.values())
+            self._artifacts.clear()
+        self._wake.set()
+        if worker is not None and worker is not threading.current_thread():
+            worker.join(timeout)
+        for artifact in artifacts:
+            artifact.discard()
+        shutil.rmtree(self._dir, ignore_errors=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, "artifacts": len(self._artifacts), "pending": len(self._pending)}
+
+    def _same_device(self, directory: Path) -> bool:
+        """目标目录与预生成目录是否在同一文件系统（按目录缓存）；顺带删除旧版本遗留的预生成目录"""
+        cached = self._devices.get(directory)
+        if cached is not None:
+            return cached
+        shutil.rmtree(directory / LEGACY_DIRNAME, ignore_errors=True)
+        try:
+            self._dir.mkdir(parents=True, exist_ok=True)
+            os.chmod(self._dir.parent, 0o700)
+            os.chmod(self._dir, 0o700)
+            same = os.stat(directory).st_dev == os.stat(self._dir).st_dev
+        except OSError:
+            # 目标目录还不存在（客户端未安装）时下次再判断
+            return False
+        self._devices[directory] = same
+        return same
+
+    @staticmethod
+    def _prune_orphans() -> None:
+        """清理其他进程异常退出后遗留的预生成目录"""
+        try:
+            entries = list(os.scandir(STAGE_ROOT))
+        except OSError:
+            return
+        cutoff = time.time() - ORPHAN_AGE
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False) and entry.stat().st_mtime < cutoff:
+                    shutil.rmtree(entry.path, ignore_errors=True)
+            except OSError:
+                continue
+
+    def _run(self) -> None:
+        self._prune_orphans()
+        while not self._closed:
+            self._wake.wait()
+            self._wake.clear()
+            while True:
+                with self._lock:
+                    if self._closed or not self._pending:
+                        break
+                    key = next(iter(self._pending))
+                    client, data = self._pending.pop(key)
+                self.stage(key[0], client, key[1], data)
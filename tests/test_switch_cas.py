@@ -0,0 +1,124 @@
+"""
+并发切换时 current_config_id 的条件写入（_commit_if_unchanged）必须在最新文档上重新提交，不丢失其他写入
+
+config_manager 的默认路径（备份目录、环境变量脚本等）在导入时按 HOME 确定，
+因此与 stress_harness 相同，每个场景在以沙箱为 HOME 的子进程中运行，不会触碰真实配置。
+"""
+
+import json
+import os
+import subprocess
+import sys
+import textwrap
+from pathlib import Path
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+
+_PRELUDE = """
+import json, sys, threading
+from pathlib import Path
+import config_manager as cm
+
+cm.CONFIG_PATH = Path(sys.argv[1]) / "config.json"
+ids = {}
+for vk in ("claude", "codex"):
+    for name in ("A", "B"):
+        saved = cm.save_vendor_config(
+            vk, {"name": name, "api_url": f"https://{vk}-{name}.example.com", "api_key": f"sk-{vk}-{name}"}
+        )
+        ids[vk, name] = saved["id"]
+
+
+def report(**extra):
+    data, _ = cm.read_versioned()
+    home = Path(sys.argv[1]) / "home"
+    print(json.dumps({
+        "current": {vk: data["vendors"][vk]["current_config_id"] for vk in ("claude", "codex")},
+        "ids": {f"{vk}.{name}": cid for (vk, name), cid in ids.items()},
+        "cas": dict(cm._cas_stats),
+        "claude_file": (home / ".claude" / "settings.json").read_text(encoding="utf-8"),
+        "codex_file": (home / ".codex" / "auth.json").read_text(encoding="utf-8"),
+        **extra,
+    }))
+"""
+
+
+def _run(tmp_path: Path, body: str) -> dict:
+    home = tmp_path / "home"
+    home.mkdir()
+    env = {**os.environ, "HOME": str(home), "USERPROFILE": str(home), "PYTHONPATH": str(PROJECT_DIR)}
+    env.pop("CODEPIVOT_WRITE_BEHIND", None)
+    env.pop("CODEPIVOT_PRESTAGE", None)
+    proc = subprocess.run(
+        [sys.executable, "-c", _PRELUDE + textwrap.dedent(body), str(tmp_path)],
+        cwd=PROJECT_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        timeout=120,
+    )
+    assert proc.returncode == 0, proc.stderr
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def test_commit_rebases_onto_switch_that_landed_in_between(tmp_path):
+    # claude 的切换写完客户端文件、尚未提交 current_config_id 时，codex 的切换完整提交
+    result = _run(
+        tmp_path,
+        """
+        real = cm._apply_clients
+
+        def interleaved(vendor, *args, **kwargs):
+            out = real(vendor, *args, **kwargs)
+            if vendor == "claude":
+                cm._apply_clients = real
+                assert cm.switch_vendor_config("codex", ids["codex", "B"])["success"]
+            return out
+
+        cm._apply_clients = interleaved
+        ok = cm.switch_vendor_config("claude", ids["claude", "B"])["success"]
+        report(ok=ok)
+        """,
+    )
+    assert result["ok"]
+    # 两个切换都已提交：claude 的提交在包含 codex 切换的最新文档上重做，而不是覆盖它
+    assert result["current"] == {"claude": result["ids"]["claude.B"], "codex": result["ids"]["codex.B"]}
+    assert result["cas"]["rebased"] == 1
+    assert result["cas"]["conflicts"] == 0
+    assert "sk-claude-B" in result["claude_file"]
+    assert "sk-codex-B" in result["codex_file"]
+
+
+def test_concurrent_switches_keep_client_files_and_current_id_consistent(tmp_path):
+    # 两个厂家各两个线程交替切换；结束后每个厂家的客户端文件必须对应其 current_config_id
+    result = _run(
+        tmp_path,
+        """
+        barrier = threading.Barrier(4)
+        failures = []
+
+        def worker(vk, names):
+            barrier.wait()
+            for name in names * 10:
+                if not cm.switch_vendor_config(vk, ids[vk, name])["success"]:
+                    failures.append((vk, name))
+
+        threads = [
+            threading.Thread(target=worker, args=(vk, names))
+            for vk in ("claude", "codex")
+            for names in (["A", "B"], ["B", "A"])
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        report(failures=failures)
+        """,
+    )
+    assert result["failures"] == []
+    assert result["cas"]["commits"] == 80  # 每次切换恰好提交一次
+    by_id = {cid: name for name, cid in result["ids"].items()}
+    for vk, text in (("claude", result["claude_file"]), ("codex", result["codex_file"])):
+        current = by_id[result["current"][vk]]
+        assert current.startswith(vk + ".")
+        assert f"sk-{vk}-{current[-1]}" in text
@@ -0,0 +1,329 @@
+"""保留格式的 TOML 局部编辑器 — 只定位并修改受管理的键，其余内容（注释、数组、多行字符串等）原样保留"""
+
+import json
+import re
+from dataclasses import dataclass
+
+_BARE_KEY = re.compile(r"^[A-Za-z0-9_-]+$")
+
+
+@dataclass
+class _Entry:
+    """一条 key = value 语句在原文中的位置"""
+
+    table: tuple[str, ...]
+    key: tuple[str, ...]
+    value_start: int
+    value_end: int
+    stmt_end: int  # 语句所在最后一行的换行符之后
+
+
+@dataclass
+class _Header:
+    """一个 [table] 表头在原文中的位置"""
+
+    table: tuple[str, ...]
+    end: int  # 表头行换行符之后
+
+
+def toml_string(value: str) -> str:
+    """Python 字符串 → TOML 基本字符串字面量（JSON 转义是 TOML 转义的子集）"""
+    return json.dumps(value, ensure_ascii=False)
+
+
+def parse_string(raw: str | None) -> str:
+    """TOML 字符串字面量 → Python 字符串；非字符串值原样返回"""
+    if not raw:
+        return ""
+    if raw.startswith("'''") or raw.startswith('"""'):
+        return raw[3:-3].lstrip("\n")
+    if raw.startswith("'") and raw.endswith("'"):
+        return raw[1:-1]
+    if raw.startswith('"'):
+        try:
+            return json.loads(raw)
+        except ValueError:
+            return raw.strip('"')
+    return raw
+
+
+def format_table(table: tuple[str, ...]) -> str:
+    """表名 → 表头文本，必要时为非裸键加引号"""
+    return ".".join(p if _BARE_KEY.match(p) else toml_string(p) for p in table)
+
+
+def _split_dotted(text: str) -> tuple[str, ...]:
+    """拆分点分键（如 a."b.c".d），去掉引号"""
+    parts, buf, quote = [], [], None
+    for ch in text:
+        if quote:
+            if ch == quote:
+                quote = None
+            else:
+                buf.append(ch)
+        elif ch in "\"'":
+            quote = ch
+        elif ch == ".":
+            parts.append("".join(buf).strip())
+            buf = []
+        else:
+            buf.append(ch)
+    parts.append("".join(buf).strip())
+    return tuple(parts)
+
+
+class TomlEditor:
+    """
+    对 TOML 文本做一次词法扫描，记录每条语句与表头的位置，然后按位置拼接修改
+
+    只识别编辑所需的结构（表头、键、值的范围），不构建完整的数据模型，
+    因此大文件中用户维护的其余部分不会被重新序列化。
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        self._entries: list[_Entry] = []
+        self._headers: list[_Header] = []
+        self._edits: list[tuple[str, tuple[str, ...], str, str]] = []
+        self._scan()
+
+    # ── 查询 ──────────────────────────────
+
+    def get(self, table: tuple[str, ...], key: str) -> str | None:
+        """返回值的原始文本（含引号），不存在返回 None"""
+        entry = self._find(table, key)
+        if entry is None:
+            return None
+        return self.text[entry.value_start : entry.value_end]
+
+    def has_table(self, table: tuple[str, ...]) -> bool:
+        return any(h.table == table for h in self._headers)
+
+    # ── 修改（先登记，render() 时一次性应用） ──
+
+    def set(self, table: tuple[str, ...], key: str, raw_value: str) -> None:
+        self._edits.append(("set", table, key, raw_value))
+
+    def setdefault(self, table: tuple[str, ...], key: str, raw_value: str) -> None:
+        self._edits.append(("default", table, key, raw_value))
+
+    def render(self) -> str:
+        """应用所有登记的修改并返回新文本"""
+        replacements: list[tuple[int, int, str]] = []
+        inserts: dict[int, list[str]] = {}
+        new_tables: dict[tuple[str, ...], list[str]] = {}
+
+        for mode, table, key, raw in self._edits:
+            entry = self._find(table, key)
+            line = f"{format_table((key,))} = {raw}\n"
+            if entry is not None:
+                if mode == "set" and self.text[entry.value_start : entry.value_end] != raw:
+                    replacements.append((entry.value_start, entry.value_end, raw))
+                continue
+            self._check_extensible(table, key)
+            if table and not self.has_table(table):
+                anchor = self._dotted_anchor(table)
+                if anchor is not None:
+                    # 表已由点分键隐式定义（如 a.b.c = 1），不能再追加 [a.b] 表头，在同一处补一条点分键
+                    dotted = format_table(table[len(anchor.table) :] + (key,))
+                    inserts.setdefault(anchor.stmt_end, []).append(f"{dotted} = {raw}\n")
+                    continue
+                new_tables.setdefault(table, []).append(line)
+                continue
+            inserts.setdefault(self._insert_point(table), []).append(line)
+
+        text = self.text
+        pieces = [(s, e, r) for s, e, r in replacements]
+        pieces += [(pos, pos, "".join(lines)) for pos, lines in inserts.items()]
+        # 从后往前拼接，前面的偏移量保持有效
+        for start, end, raw in sorted(pieces, key=lambda p: (p[0], p[1]), reverse=True):
+            if start == end and start == len(text) and text and not text.endswith("\n"):
+                raw = "\n" + raw
+            text = text[:start] + raw + text[end:]
+
+        if new_tables:
+            if text and not text.endswith("\n"):
+                text += "\n"
+            for table, lines in new_tables.items():
+                text += ("\n" if text else "") + f"[{format_table(table)}]\n" + "".join(lines)
+        self._edits = []
+        return text
+
+    # ── 内部 ──────────────────────────────
+
+    def _find(self, table: tuple[str, ...], key: str) -> _Entry | None:
+        """按完整路径查找，点分键写法（[a] 下的 b.c = 1 或顶层的 a.b.c = 1）同样匹配 a.b.c"""
+        path = table + (key,)
+        for entry in self._entries:
+            if entry.table + entry.key == path:
+                return entry
+        return None
+
+    def _dotted_anchor(self, table: tuple[str, ...]) -> _Entry | None:
+        """隐式定义了 table 的最后一条点分键语句（位于 table 的某个上级表中）"""
+        anchor = None
+        for entry in self._entries:
+            if len(entry.table) < len(table) and (entry.table + entry.key[:-1])[: len(table)] == table:
+                anchor = entry
+        return anchor
+
+    def _check_extensible(self, table: tuple[str, ...], key: str) -> None:
+        """table 或其上级已被赋值为内联表（或其他值）时无法在原处追加键，抛出 ValueError"""
+        for entry in self._entries:
+            path = entry.table + entry.key
+            if table[: len(path)] == path:
+                kind = "内联表" if self.text.startswith("{", entry.value_start) else "一个值"
+                raise ValueError(
+                    f"{format_table(path)} 已写成{kind}，无法自动写入 {format_table(table + (key,))}；"
+                    f"请改为 [{format_table(table)}] 表的写法"
+                )
+
+    def _insert_point(self, table: tuple[str, ...]) -> int:
+        """新键插入位置：该表最后一条语句之后；表为空时紧跟表头；顶层为空时放在文件开头"""
+        last = None
+        for entry in self._entries:
+            if entry.table == table:
+                last = entry.stmt_end
+        if last is not None:
+            return last
+        if not table:
+            return 0
+        for header in self._headers:
+            if header.table == table:
+                return header.end
+        return len(self.text)
+
+    def _scan(self) -> None:
+        text, n = self.text, len(self.text)
+        table: tuple[str, ...] = ()
+        pos = 0
+        while pos < n:
+            # 行首空白
+            while pos < n and text[pos] in " \t\r":
+                pos += 1
+            if pos >= n:
+                break
+            ch = text[pos]
+            if ch == "\n":
+                pos += 1
+            elif ch == "#":
+                pos = self._line_end(pos)
+            elif ch == "[":
+                end = self._line_end(pos)
+                line = self._header_text(text, pos, end)
+                if line.startswith("[["):
+                    # 数组表不参与编辑，用不可能匹配的名字占位
+                    table = ("[[", *_split_dotted(line[2:].rstrip("]").strip()))
+                else:
+                    table = _split_dotted(line[1:].rstrip("]").strip())
+                    self._headers.append(_Header(table, end))
+                pos = end
+            else:
+                pos = self._scan_entry(pos, table)
+
+    def _header_text(self, text: str, start: int, end: int) -> str:
+        """表头行去掉行尾注释（引号内的 # 不算注释）"""
+        quote = None
+        for i in range(start, end):
+            ch = text[i]
+            if quote:
+                if ch == quote:
+                    quote = None
+            elif ch in "\"'":
+                quote = ch
+            elif ch == "#":
+                return text[start:i].strip()
+        return text[start:end].strip()
+
+    def _line_end(self, pos: int) -> int:
+        """pos 所在行换行符之后的位置"""
+        nl = self.text.find("\n", pos)
+        return len(self.text) if nl < 0 else nl + 1
+
+    def _scan_entry(self, pos: int, table: tuple[str, ...]) -> int:
+        text, n = self.text, len(self.text)
+        # 键：读到引号外的 '='
+        key_start, quote = pos, None
+        while pos < n:
+            ch = text[pos]
+            if quote:
+                if ch == quote:
+                    quote = None
+            elif ch in "\"'":
+                quote = ch
+            elif ch == "=" or ch == "\n":
+                break
+            pos += 1
+        if pos >= n or text[pos] != "=":
+            # 不是合法语句，跳过整行
+            return self._line_end(pos)
+        key = _split_dotted(text[key_start:pos])
+        pos += 1
+        while pos < n and text[pos] in " \t":
+            pos += 1
+        value_start = value_end = pos
+
+        # 值：跨越多行字符串、多行数组与内联表，直到深度为 0 的换行
+        depth = 0
+        while pos < n:
+            ch = text[pos]
+            if text.startswith('"""', pos) or text.startswith("'''", pos):
+                pos = self._skip_multiline(pos)
+                value_end = pos
+                continue
+            if ch in "\"'":
+                pos = self._skip_string(pos)
+                value_end = pos
+                continue
+            if ch == "#":
+                # 注释跳到行尾，停在换行符上交给下面判断语句是否结束
+                nl = text.find("\n", pos)
+                pos = n if nl < 0 else nl
+                continue
+            if ch == "\n":
+                if depth <= 0:
+                    break
+                pos += 1
+                continue
+            if ch in "[{":
+                depth += 1
+            elif ch in "]}":
+                depth -= 1
+            if ch not in " \t\r":
+                value_end = pos + 1
+            pos += 1
+
+        stmt_end = pos + 1 if pos < n else n
+        self._entries.append(_Entry(table, key, value_start, value_end, stmt_end))
+        return stmt_end
+
+    def _skip_string(self, pos: int) -> int:
+        """跳过单行字符串（基本字符串处理反斜杠转义，字面量字符串不转义）"""
+        text, quote = self.text, self.text[pos]
+        pos += 1
+        while pos < len(text) and text[pos] != "\n":
+            if quote == '"' and text[pos] == "\\":
+                pos += 2
+                continue
+            if text[pos] == quote:
+                return pos + 1
+            pos += 1
+        return pos
+
+    def _skip_multiline(self, pos: int) -> int:
+        """跳过多行字符串，允许结尾紧跟最多两个额外引号（如 \"\"\"a\"\"\"\"\"）"""
+        text, delim = self.text, self.text[pos : pos + 3]
+        pos += 3
+        while pos < len(text):
+            if delim == '"""' and text[pos] == "\\":
+                pos += 2
+                continue
+            if text.startswith(delim, pos):
+                end = pos + 3
+                extra = 0
+                while end < len(text) and text[end] == delim[0] and extra < 2:
+                    end += 1
+                    extra += 1
+                return end
+            pos += 1
+        return len(text)
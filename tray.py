@@ -0,0 +1,221 @@
+"""
+托盘快速切换 — 常驻系统托盘/菜单栏，不创建 webview 窗口即可切换中转配置
+
+用法：
+    python main.py --tray
+
+厂家与配置常驻内存，config.json 变化时自动重新加载；每个厂家一个子菜单，当前配置打勾，
+点击即在后台线程中完成切换（与主窗口的切换相同，包含环境变量部署）。
+
+可选依赖：pystray + Pillow（托盘图标）、pynput（全局快捷键）。
+快捷键在 config.json 的 settings.tray_hotkeys 中配置，目标为厂家（循环切换到下一个配置）
+或 "厂家:配置名称/id"，例如：
+    "tray_hotkeys": {"<ctrl>+<alt>+c": "claude", "<ctrl>+<alt>+1": "claude:My Relay"}
+
+TrayModel 不依赖任何图形库，可在无显示环境下直接使用。
+"""
+
+import subprocess
+import sys
+import threading
+import traceback
+from pathlib import Path
+
+import config_manager as cm
+from api import Api
+from file_watcher import FileWatcher
+
+
+class TrayModel:
+    """托盘菜单的数据与操作（与图形界面无关）"""
+
+    def __init__(self, api: Api | None = None):
+        self._api = api or Api()
+        self._lock = threading.Lock()
+        self._vendors: dict = {}
+        self._switching = threading.Lock()
+        self.last_message = ""
+        self.reload()
+
+    def reload(self) -> None:
+        """重新读取厂家与配置"""
+        vendors = cm.get_vendors()
+        with self._lock:
+            self._vendors = vendors
+
+    def menu(self) -> list[dict]:
+        """
+        菜单结构（有配置的厂家才出现）
+
+        Returns:
+            list: [{"vendor", "title", "items": [{"id", "name", "checked"}]}]
+        """
+        with self._lock:
+            vendors = self._vendors
+        sections = []
+        for vk, v in vendors.items():
+            if not v["configs"]:
+                continue
+            sections.append({
+                "vendor": vk,
+                "title": v["display_name"],
+                "items": [
+                    {
+                        "id": c["id"],
+                        "name": c.get("name", "") or c["id"],
+                        "checked": c["id"] == v["current_config_id"],
+                    }
+                    for c in v["configs"]
+                ],
+            })
+        return sections
+
+    def is_current(self, vendor: str, config_id: str) -> bool:
+        with self._lock:
+            return self._vendors.get(vendor, {}).get("current_config_id") == config_id
+
+    def resolve(self, target: str) -> tuple[str, str] | None:
+        """
+        把快捷键目标解析为 (厂家, 配置 id)
+
+        "厂家" 表示切换到该厂家的下一个配置（循环），"厂家:名称或 id" 表示指定配置。
+        """
+        vendor, _, name = target.partition(":")
+        with self._lock:
+            v = self._vendors.get(vendor)
+        if not v or not v["configs"]:
+            return None
+        configs = v["configs"]
+        if name:
+            cfg = next((c for c in configs if name in (c["id"], c.get("name"))), None)
+            return (vendor, cfg["id"]) if cfg else None
+        ids = [c["id"] for c in configs]
+        current = v["current_config_id"]
+        nxt = ids[(ids.index(current) + 1) % len(ids)] if current in ids else ids[0]
+        return vendor, nxt
+
+    def switch(self, vendor: str, config_id: str) -> dict:
+        """执行切换并刷新内存中的状态；同一时间只进行一次切换"""
+        with self._switching:
+            result = self._api.switch_vendor_config(vendor, config_id)
+            self.reload()
+        self.last_message = result.get("message", "")
+        env = result.get("env_deploy")
+        if env and env.get("message"):
+            self.last_message += f"；{env['message']}"
+        return result
+
+    def trigger(self, target: str) -> dict | None:
+        """快捷键入口；目标无法解析时返回 None"""
+        resolved = self.resolve(target)
+        if not resolved:
+            print(f"[警告] 快捷键目标无效: {target}")
+            return None
+        return self.switch(*resolved)
+
+    def hotkeys(self) -> dict[str, str]:
+        """settings.tray_hotkeys：组合键 → 目标"""
+        hotkeys = cm.get_settings().get("tray_hotkeys", {})
+        return {k: v for k, v in hotkeys.items() if isinstance(v, str)} if isinstance(hotkeys, dict) else {}
+
+
+# ── 图形前端（pystray） ────────────────────────────
+
+
+def _open_window() -> None:
+    """在独立进程中打开主窗口（webview 需要占用进程主线程）"""
+    if getattr(sys, "frozen", False):
+        subprocess.Popen([sys.executable])
+    else:
+        subprocess.Popen([sys.executable, str(Path(__file__).with_name("main.py"))])
+
+
+def _build_menu(pystray, model: TrayModel, on_switch):
+    def config_item(vendor: str, item: dict):
+        return pystray.MenuItem(
+            item["name"],
+            lambda icon, _: on_switch(vendor, item["id"]),
+            checked=lambda _: model.is_current(vendor, item["id"]),
+            radio=True,
+        )
+
+    def items():
+        sections = model.menu()
+        for section in sections:
+            yield pystray.MenuItem(
+                section["title"],
+                pystray.Menu(*[config_item(section["vendor"], i) for i in section["items"]]),
+            )
+        if not sections:
+            yield pystray.MenuItem("暂无配置", None, enabled=False)
+        yield pystray.Menu.SEPARATOR
+        yield pystray.MenuItem("打开主窗口", lambda icon, _: _open_window())
+        yield pystray.MenuItem("退出", lambda icon, _: icon.stop())
+
+    # 传入可调用对象，每次打开菜单时按最新状态生成
+    return pystray.Menu(items)
+
+
+def _start_hotkeys(model: TrayModel, run_async):
+    """注册全局快捷键；未安装 pynput 或没有配置时返回 None"""
+    hotkeys = model.hotkeys()
+    if not hotkeys:
+        return None
+    try:
+        from pynput import keyboard
+    except ImportError:
+        print("[警告] 未安装 pynput，全局快捷键不可用（pip install pynput）")
+        return None
+    bindings = {combo: (lambda t=target: run_async(model.trigger, t)) for combo, target in hotkeys.items()}
+    try:
+        listener = keyboard.GlobalHotKeys(bindings)
+    except ValueError as e:
+        print(f"[警告] 快捷键配置无效: {e}")
+        return None
+    listener.start()
+    return listener
+
+
+def run() -> int:
+    """启动托盘（阻塞直到选择“退出”）"""
+    try:
+        import pystray
+        from PIL import Image
+    except ImportError:
+        print("[错误] 托盘模式需要 pystray 与 Pillow：pip install pystray Pillow")
+        return 1
+
+    model = TrayModel()
+    icon_path = Path(getattr(sys, "_MEIPASS", Path(__file__).parent)) / "icon.ico"
+    image = Image.open(icon_path) if icon_path.exists() else Image.new("RGB", (64, 64), "#E3000B")
+    icon = pystray.Icon("CodePivot", image, "CodePivot")
+
+    def run_async(func, *args):
+        def worker():
+            try:
+                result = func(*args)
+            except Exception as e:
+                traceback.print_exc()
+                model.last_message = f"切换失败: {e}"
+                result = None
+            icon.update_menu()
+            if result is not None and getattr(icon, "HAS_NOTIFICATION", False):
+                icon.notify(model.last_message, "CodePivot")
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def on_files_changed(changed):
+        model.reload()
+        icon.update_menu()
+
+    icon.menu = _build_menu(pystray, model, lambda vendor, cid: run_async(model.switch, vendor, cid))
+    watcher = FileWatcher([cm.CONFIG_PATH], on_files_changed)
+    watcher.start()
+    listener = _start_hotkeys(model, run_async)
+    try:
+        icon.run()
+    finally:
+        watcher.stop()
+        if listener:
+            listener.stop()
+    return 0
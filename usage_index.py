@@ -0,0 +1,292 @@
+"""
+用量索引 — 增量读取各客户端的本地会话日志，把 token 用量归到当时生效的 CodePivot 配置
+
+数据来源（均为只追加的 JSONL）：
+    claude  ~/.claude/projects/**/*.jsonl            assistant 消息的 message.usage
+    codex   ~/.codex/sessions/**/rollout-*.jsonl     event_msg/token_count 的 last_token_usage
+
+Gemini CLI 与 OpenCode 的会话文件会被整体重写（JSON/按消息分文件），无法按偏移增量读取，暂不纳入。
+
+每个日志文件记录已读到的字节偏移，每次只读新增的完整行；累计结果与偏移一起保存在
+~/.ai-switcher/usage_index.json，查询时直接返回，不重新扫描历史。
+归属依据切换历史 ~/.ai-switcher/switch_history.jsonl：取事件时间之前最近一次切换的配置，
+第一次切换之前的用量记为 UNATTRIBUTED。
+"""
+
+import bisect
+import json
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+from clients import _atomic_write_text
+
+STATE_DIR = Path.home() / ".ai-switcher"
+HISTORY_PATH = STATE_DIR / "switch_history.jsonl"
+INDEX_PATH = STATE_DIR / "usage_index.json"
+
+UNATTRIBUTED = "_unattributed"
+
+# 单次读取的块大小；首次索引大文件时按块推进，内存占用与文件大小无关
+READ_CHUNK = 1 << 20
+
+TOKEN_FIELDS = ("input", "output", "cache_read", "cache_write", "requests")
+
+
+# ── 切换历史 ──────────────────────────────────────
+
+
+def record_switch(vendor: str, config: dict, ts: float | None = None) -> None:
+    """追加一条切换记录（切换成功后调用）"""
+    line = json.dumps(
+        {"ts": ts or time.time(), "vendor": vendor, "config_id": config["id"], "name": config.get("name", "")},
+        ensure_ascii=False,
+    )
+    HISTORY_PATH.parent.mkdir(parents=True, exist_ok=True)
+    with open(HISTORY_PATH, "a", encoding="utf-8") as f:
+        f.write(line + "\n")
+
+
+def load_history(path: Path = HISTORY_PATH) -> dict[str, tuple[list[float], list[str]]]:
+    """按厂家返回按时间排序的 (时间戳列表, 配置 id 列表)，供二分查找"""
+    events: dict[str, list[tuple[float, str]]] = {}
+    try:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                    events.setdefault(rec["vendor"], []).append((float(rec["ts"]), rec["config_id"]))
+                except (ValueError, KeyError, TypeError):
+                    continue
+    except FileNotFoundError:
+        pass
+    history = {}
+    for vendor, items in events.items():
+        items.sort()
+        history[vendor] = ([t for t, _ in items], [c for _, c in items])
+    return history
+
+
+def _attribute(history: dict, vendor: str, ts: float) -> str:
+    times, ids = history.get(vendor, ([], []))
+    i = bisect.bisect_right(times, ts)
+    return ids[i - 1] if i else UNATTRIBUTED
+
+
+def _parse_ts(value) -> float | None:
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+
+# ── 日志解析 ──────────────────────────────────────
+
+
+def _claude_usage(rec: dict, file_state: dict) -> tuple[float, dict] | None:
+    """Claude Code：同一条消息分块写入时每块都带 usage，按 message.id 去重"""
+    if rec.get("type") != "assistant":
+        return None
+    message = rec.get("message") or {}
+    usage = message.get("usage")
+    if not usage:
+        return None
+    msg_id = message.get("id")
+    if msg_id and msg_id == file_state.get("last_id"):
+        return None
+    file_state["last_id"] = msg_id
+    ts = _parse_ts(rec.get("timestamp"))
+    if ts is None:
+        return None
+    return ts, {
+        "input": usage.get("input_tokens", 0) or 0,
+        "output": usage.get("output_tokens", 0) or 0,
+        "cache_read": usage.get("cache_read_input_tokens", 0) or 0,
+        "cache_write": usage.get("cache_creation_input_tokens", 0) or 0,
+    }
+
+
+def _codex_usage(rec: dict, file_state: dict) -> tuple[float, dict] | None:
+    """Codex：每次请求后写一条 token_count 事件，last_token_usage 为该次用量"""
+    payload = rec.get("payload") or {}
+    if rec.get("type") != "event_msg" or payload.get("type") != "token_count":
+        return None
+    usage = (payload.get("info") or {}).get("last_token_usage")
+    if not usage:
+        return None
+    ts = _parse_ts(rec.get("timestamp"))
+    if ts is None:
+        return None
+    cached = usage.get("cached_input_tokens", 0) or 0
+    return ts, {
+        "input": (usage.get("input_tokens", 0) or 0) - cached,
+        "output": usage.get("output_tokens", 0) or 0,
+        "cache_read": cached,
+        "cache_write": 0,
+    }
+
+
+# 厂家 → (日志根目录, glob 模式, 解析函数)
+SOURCES = {
+    "claude": (lambda: Path.home() / ".claude" / "projects", "**/*.jsonl", _claude_usage),
+    "codex": (lambda: Path.home() / ".codex" / "sessions", "**/rollout-*.jsonl", _codex_usage),
+}
+
+
+# ── 索引 ──────────────────────────────────────────
+
+
+class UsageIndexer:
+    """
+    增量索引：偏移与累计结果一起持久化
+
+    查询读取的是上一次索引完成时发布的结果，首次索引大量历史期间查询也不会被阻塞。
+    """
+
+    def __init__(self, path: Path = INDEX_PATH, history_path: Path = HISTORY_PATH):
+        self.path = path
+        self.history_path = history_path
+        self._scan_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._state: dict | None = None
+        self._published: dict | None = None
+
+    def update(self, progress=None, cancelled=None) -> dict:
+        """
+        读取所有日志文件的新增部分并累计
+
+        Returns:
+            dict: {"files", "bytes_read", "events", "elapsed_ms"}
+        """
+        start = time.perf_counter()
+        with self._scan_lock:
+            state = self._load()
+            history = load_history(self.history_path)
+            stats = {"files": 0, "bytes_read": 0, "events": 0}
+            seen = set()
+            for vendor, (root, pattern, parse) in SOURCES.items():
+                base = root()
+                if not base.is_dir():
+                    continue
+                for path in base.glob(pattern):
+                    if cancelled and cancelled():
+                        break
+                    seen.add(str(path))
+                    read, events = self._index_file(state, vendor, path, parse, history)
+                    stats["files"] += 1
+                    stats["bytes_read"] += read
+                    stats["events"] += events
+                    if progress and read:
+                        progress({"stage": "usage", "file": str(path), "bytes": read})
+            if not (cancelled and cancelled()):
+                # 已删除的日志不再保留偏移（其用量已计入累计结果）
+                for key in [k for k in state["files"] if k not in seen]:
+                    del state["files"][key]
+            state["updated_at"] = time.time()
+            self._save()
+            self._publish(state)
+        stats["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        return stats
+
+    def totals(self, vendor: str | None = None) -> dict:
+        """{vendor: {config_id: {input, output, cache_read, cache_write, requests}}}，不读取日志"""
+        totals = self._snapshot()["totals"]
+        if vendor:
+            totals = {vendor: totals.get(vendor, {})}
+        return json.loads(json.dumps(totals))
+
+    def updated_at(self) -> float | None:
+        return self._snapshot().get("updated_at")
+
+    # ── 内部 ──────────────────────────────
+
+    def _index_file(self, state: dict, vendor: str, path: Path, parse, history: dict) -> tuple[int, int]:
+        try:
+            st = path.stat()
+        except OSError:
+            return 0, 0
+        key = str(path)
+        file_state = state["files"].get(key)
+        # 文件被替换或截断时从头读取
+        if not file_state or file_state.get("ino") != st.st_ino or st.st_size < file_state.get("offset", 0):
+            file_state = {"ino": st.st_ino, "offset": 0}
+        state["files"][key] = file_state
+        offset = file_state["offset"]
+        if st.st_size == offset:
+            return 0, 0
+
+        totals = state["totals"].setdefault(vendor, {})
+        events = 0
+        start_offset = offset
+        try:
+            with open(path, "rb") as f:
+                f.seek(offset)
+                pending = b""
+                while True:
+                    chunk = f.read(READ_CHUNK)
+                    if not chunk:
+                        break
+                    lines = (pending + chunk).split(b"\n")
+                    pending = lines.pop()  # 最后一段可能是正在写入的半行，留到下次
+                    for line in lines:
+                        offset += len(line) + 1
+                        if not line.strip():
+                            continue
+                        try:
+                            rec = json.loads(line)
+                        except ValueError:
+                            continue
+                        parsed = parse(rec, file_state) if isinstance(rec, dict) else None
+                        if not parsed:
+                            continue
+                        ts, usage = parsed
+                        bucket = totals.setdefault(
+                            _attribute(history, vendor, ts), dict.fromkeys(TOKEN_FIELDS, 0)
+                        )
+                        for field, value in usage.items():
+                            bucket[field] += value
+                        bucket["requests"] += 1
+                        events += 1
+        except OSError:
+            pass
+        file_state["offset"] = offset
+        return offset - start_offset, events
+
+    def _read(self) -> dict:
+        try:
+            state = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            state = {}
+        state.setdefault("files", {})
+        state.setdefault("totals", {})
+        return state
+
+    def _load(self) -> dict:
+        """索引用的完整状态（调用方需持有 self._scan_lock）"""
+        if self._state is None:
+            self._state = self._read()
+        return self._state
+
+    def _publish(self, state: dict) -> None:
+        published = {"totals": json.loads(json.dumps(state["totals"])), "updated_at": state.get("updated_at")}
+        with self._lock:
+            self._published = published
+
+    def _snapshot(self) -> dict:
+        with self._lock:
+            if self._published is None:
+                state = self._read()
+                self._published = {"totals": state["totals"], "updated_at": state.get("updated_at")}
+            return self._published
+
+    def _save(self) -> None:
+        try:
+            _atomic_write_text(self.path, json.dumps(self._state, ensure_ascii=False))
+        except OSError as e:
+            print(f"[警告] 写入用量索引失败: {e}")
+
+
+indexer = UsageIndexer()